@@ -0,0 +1,310 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from datetime import datetime, timezone
+
+# --- Path Configuration ---
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(PROJECT_ROOT)
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+RESULTS_DIR = os.path.join(BENCHMARK_DIR, "results")
+STAND_INS_SCRIPT = os.path.join(BENCHMARK_DIR, "stand_ins.py")
+BENCHMARK_GIST_ID = "benchmark"
+
+# Groups of sensors are placed this many degrees apart, far enough that they
+# never see each other as peers (see GRID_SIZE/PEER_RADIUS_M in regional_agent.py).
+GROUP_SPACING_DEG = 0.5
+GROUPS_PER_ROW = 200
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def http_json(url: str, method: str = "GET"):
+    request = urllib.request.Request(url, method=method, data=b"" if method == "POST" else None)
+    with urllib.request.urlopen(request, timeout=5) as response:
+        return json.loads(response.read())
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_ROOT,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def rss_mb() -> float:
+    """Current resident set size of this process."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def cpu_seconds() -> float:
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def start_stand_ins(args) -> tuple:
+    """Starts stand_ins.py in its own process so its CPU is not billed to the pipeline."""
+    port = free_port()
+    process = subprocess.Popen([
+        sys.executable, STAND_INS_SCRIPT, "--port", str(port),
+        "--ipfs-latency-ms", str(args.ipfs_latency_ms), "--gist-latency-ms", str(args.gist_latency_ms),
+        "--ingest-latency-ms", str(args.ingest_latency_ms),
+    ])
+    base_url = f"http://127.0.0.1:{port}"
+    for _ in range(100):
+        try:
+            http_json(f"{base_url}/stats")
+            return process, base_url
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError("Stand-in services did not come up")
+
+def configure_environment(base_url: str, workdir: str, ipfs_backend: str = "web3storage",
+                          ipfs_batch_window: float = 0.0, kg_backend: str = "gist"):
+    """Points every external endpoint and the registry at benchmark-local resources.
+    Must run before any project module reads config.settings."""
+    os.environ.update({
+        "REGISTRY_BACKEND": "sqlite",
+        "REGISTRY_DB_FILE": os.path.join(workdir, "sensor_registry.db"),
+        "SENSOR_REGISTRY_FILE": os.path.join(workdir, "sensor_registry.json"),
+        "WEB3_STORAGE_TOKEN": "benchmark",
+        "WEB3_STORAGE_UPLOAD_URL": f"{base_url}/upload",
+        "GIST_API_BASE_URL": f"{base_url}/gists",
+        "GIST_RAW_BASE_URL": f"{base_url}/raw",
+        "KNOWLEDGE_GRAPH_GIST_ID": BENCHMARK_GIST_ID,
+        "GITHUB_PAT": "benchmark",
+        "INGEST_API_URL": f"{base_url}/ingest",
+        "SLASH_API_URL": f"{base_url}/request-slash",
+        "OUTBOX_DIR": os.path.join(workdir, "outbox"),
+        "NOTARY_STATE_DIR": os.path.join(workdir, "notary_state"),
+        "IPFS_BACKEND": ipfs_backend,
+        "IPFS_LOCAL_STORE_DIR": os.path.join(workdir, "ipfs_store"),
+        "IPFS_BATCH_WINDOW": str(ipfs_batch_window),
+        "KNOWLEDGE_GRAPH_BACKEND": kg_backend,
+        "KNOWLEDGE_GRAPH_DIR": os.path.join(workdir, "knowledge_graph"),
+    })
+
+def register_sensors(agent_count: int, group_size: int, rng: random.Random):
+    """Registers agent_count synthetic sensors, clustered into peer groups of group_size."""
+    from fetch_services.registry_store import SQLiteRegistryStore, REGISTRY_DB_FILE, SENSOR_REGISTRY_FILE
+    store = SQLiteRegistryStore(REGISTRY_DB_FILE, legacy_json=SENSOR_REGISTRY_FILE)
+    devices = []
+    for i in range(agent_count):
+        group = i // group_size
+        lat = -60.0 + (group // GROUPS_PER_ROW) * GROUP_SPACING_DEG + rng.uniform(0, 0.01)
+        lon = -170.0 + (group % GROUPS_PER_ROW) * GROUP_SPACING_DEG + rng.uniform(0, 0.01)
+        devices.append({
+            "mac_address": "02:BE:" + ":".join(f"{(i >> shift) & 0xFF:02X}" for shift in (24, 16, 8, 0)),
+            "name": f"Benchmark Group {group}", "latitude": lat, "longitude": lon,
+            "agent_seed": f"echonet benchmark sensor {i} seed",
+        })
+    store.register_many(devices)
+    return store
+
+
+class PipelineBenchmark:
+    """
+    Runs N regional agents, the Notary and a load driver in one Bureau, with
+    the external services replaced by stand_ins.py, and measures the full path
+    SensorData -> ValidationRequest/Response -> outbox -> Notary, IPFS and
+    /ingest.
+
+    Phases: every sensor first gets one reading (so it has local state to
+    validate its peers with), then load runs for --warmup seconds before the
+    counters are reset, then for --duration seconds of measurement, followed
+    by a short drain so in-flight events can finish.
+    """
+
+    def __init__(self, args, base_url: str):
+        from uagents import Agent, Bureau
+        from fetch_services.agents.schemas import SensorData
+        from fetch_services.agents import notary_agent
+        from fetch_services.agents.regional_agent import RegionalWorker, registry_cache
+        from fetch_services.metrics import pipeline_metrics
+
+        self.args = args
+        self.base_url = base_url
+        self.metrics = pipeline_metrics
+        self.SensorData = SensorData
+        self.rng = random.Random(args.seed)
+
+        store = register_sensors(args.agents, args.group_size, self.rng)
+        store.set_network_service("notary_agent_address", notary_agent.agent.address)
+        registry_cache.refresh(force=True)
+
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        # No endpoints: every agent is local, so nothing is registered on the Almanac.
+        self.bureau = Bureau(port=free_port(), loop=self.loop, log_level=args.log_level)
+        self.workers = [RegionalWorker(mac, cfg, standalone=False) for mac, cfg in registry_cache.sensors().items()]
+        for worker in self.workers:
+            self.bureau.add(worker.agent)
+        self.bureau.add(notary_agent.agent)
+
+        self.driver = Agent(name="benchmark_gateway", seed="echonet_benchmark_gateway_seed")
+        self.driver.on_event("startup")(self._start_driver)
+        self.bureau.add(self.driver)
+        self.result = None
+        self.sent = 0
+
+    async def _start_driver(self, ctx):
+        self.loop.create_task(self._drive_then_stop(ctx))
+
+    async def _drive_then_stop(self, ctx):
+        try:
+            await self.drive(ctx)
+        finally:
+            # Skip the Bureau's graceful shutdown: it marks every agent inactive on
+            # the Almanac one by one, which is slow and irrelevant here.
+            self.loop.stop()
+
+    async def _send_reading(self, ctx, worker):
+        reading = self.SensorData(
+            device_id=worker.mac_address,
+            timestamp=datetime.now(timezone.utc).isoformat(),
+            decibel=self.rng.uniform(20.0, 95.0),
+        )
+        self.sent += 1
+        await ctx.send(str(worker.agent.address), reading)
+
+    async def _load(self, ctx, seconds: float):
+        """Sends readings to random sensors at args.rate (Poisson arrivals) for the given time."""
+        start = self.loop.time()
+        due = start
+        while self.loop.time() - start < seconds:
+            due += self.rng.expovariate(self.args.rate)
+            delay = due - self.loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self.loop.create_task(self._send_reading(ctx, self.rng.choice(self.workers)))
+
+    async def drive(self, ctx):
+        args = self.args
+        print(f"[Benchmark] Priming {len(self.workers)} agents")
+        await asyncio.gather(*(self._send_reading(ctx, worker) for worker in self.workers))
+        await self._load(ctx, args.warmup)
+
+        self.metrics.reset()
+        http_json(f"{self.base_url}/reset", method="POST")
+        sent_before, cpu_before = self.sent, cpu_seconds()
+        print(f"[Benchmark] Measuring {args.rate} events/s for {args.duration}s")
+        await self._load(ctx, args.duration)
+        measured_sent = self.sent - sent_before
+        await asyncio.sleep(args.drain)
+
+        elapsed = args.duration + args.drain
+        summary = self.metrics.summary()
+        stand_ins = http_json(f"{self.base_url}/stats")
+        counters = summary["counters"]
+        self.result = {
+            "benchmark": "pipeline",
+            "git_commit": git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "config": {key: getattr(args, key) for key in (
+                "agents", "group_size", "rate", "duration", "warmup", "drain", "seed", "ipfs_backend", "ipfs_batch_window",
+                "kg_backend",
+                "ipfs_latency_ms", "gist_latency_ms", "ingest_latency_ms")},
+            "throughput": {
+                "events_sent": measured_sent,
+                "consensus_reached": counters.get("consensus_reached", 0),
+                "facts_written": counters.get("facts_written", 0),
+                "ingested": stand_ins["counters"].get("ingested", 0),
+                "offered_events_per_s": measured_sent / args.duration,
+                "completed_events_per_s": counters.get("consensus_reached", 0) / elapsed,
+            },
+            "stages": {**summary["stages"], **stand_ins["stages"]},
+            "counters": counters,
+            "stand_ins": stand_ins["counters"],
+            "resources": {
+                "cpu_s": cpu_seconds() - cpu_before,
+                "cpu_percent": 100 * (cpu_seconds() - cpu_before) / elapsed,
+                "rss_mb": rss_mb(),
+                "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+            },
+        }
+
+    def run(self) -> dict:
+        self.loop.create_task(self.bureau.run_async())
+        self.loop.run_forever()
+        return self.result
+
+
+def print_report(result: dict, baseline: dict = None):
+    throughput = result["throughput"]
+    print(f"\n[Benchmark] {result['git_commit']}: {throughput['completed_events_per_s']:.1f} events/s completed "
+          f"({throughput['offered_events_per_s']:.1f} offered), CPU {result['resources']['cpu_percent']:.0f}%, "
+          f"RSS {result['resources']['rss_mb']:.0f} MB")
+    print(f"{'stage':<22}{'count':>8}{'p50 ms':>10}{'p99 ms':>10}" + ("   p50 / p99 vs baseline" if baseline else ""))
+    for stage, stats in sorted(result["stages"].items()):
+        line = f"{stage:<22}{stats['count']:>8}{stats['p50_ms']:>10.2f}{stats['p99_ms']:>10.2f}"
+        old = (baseline or {}).get("stages", {}).get(stage)
+        if old:
+            line += f"   {_delta(stats['p50_ms'], old['p50_ms'])} / {_delta(stats['p99_ms'], old['p99_ms'])}"
+        print(line)
+    if baseline:
+        old = baseline["throughput"]["completed_events_per_s"]
+        print(f"events/s vs baseline ({baseline['git_commit']}): {_delta(throughput['completed_events_per_s'], old)}")
+
+def _delta(new: float, old: float) -> str:
+    return f"{100 * (new - old) / old:+.1f}%" if old else "n/a"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="End-to-end EchoNet pipeline benchmark")
+    parser.add_argument("--agents", type=int, default=50, help="Regional agents to run")
+    parser.add_argument("--group-size", type=int, default=5, help="Sensors per peer group")
+    parser.add_argument("--rate", type=float, default=20.0, help="Sensor readings per second, across all agents")
+    parser.add_argument("--duration", type=float, default=30.0, help="Measured seconds")
+    parser.add_argument("--warmup", type=float, default=5.0)
+    parser.add_argument("--drain", type=float, default=5.0, help="Seconds to let in-flight events finish")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--ipfs-backend", choices=["web3storage", "local"], default="web3storage",
+                        help="Upload to the /upload stand-in, or to a local content-addressed store")
+    parser.add_argument("--ipfs-batch-window", type=float, default=0.0,
+                        help="Seconds to bundle raw readings per IPFS upload (0 = one upload per event)")
+    parser.add_argument("--kg-backend", choices=["gist", "local"], default="gist",
+                        help="Publish the knowledge graph to the Gist stand-in, or to a local directory")
+    parser.add_argument("--ipfs-latency-ms", type=float, default=0.0)
+    parser.add_argument("--gist-latency-ms", type=float, default=0.0)
+    parser.add_argument("--ingest-latency-ms", type=float, default=0.0)
+    parser.add_argument("--log-level", default="WARNING", help="Agent log level (INFO logs every message)")
+    parser.add_argument("--output", help="Result file (default: benchmarks/results/pipeline-<commit>-<time>.json)")
+    parser.add_argument("--compare", help="A previous result file to compare against")
+    args = parser.parse_args()
+
+    stand_ins_process, base_url = start_stand_ins(args)
+    try:
+        configure_environment(base_url, tempfile.mkdtemp(prefix="echonet-bench-"),
+                              args.ipfs_backend, args.ipfs_batch_window, args.kg_backend)
+        result = PipelineBenchmark(args, base_url).run()
+    finally:
+        stand_ins_process.terminate()
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"pipeline-{result['git_commit']}-{datetime.now().strftime('%Y%m%dT%H%M%S')}.json")
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(result, f, indent=2)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            baseline = json.load(f)
+    print_report(result, baseline)
+    print(f"\n[Benchmark] Results written to {output}")
@@ -0,0 +1,147 @@
+import argparse
+import asyncio
+import hashlib
+import os
+import sys
+import time
+from datetime import datetime
+
+from aiohttp import web
+
+# --- Path Configuration ---
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(PROJECT_ROOT)
+
+from fetch_services.metrics import StageMetrics
+
+
+class StandIns:
+    """
+    Local stand-ins for the external services the pipeline talks to:
+
+    - POST /upload                web3.storage (returns a content hash as CID)
+    - GET/PATCH /gists/{gist_id}  GitHub Gist API (files kept in memory)
+    - GET /raw/{gist_id}/{file}   raw Gist file content, honouring Range
+    - POST /ingest, /ingest/bulk  verification_api/ingestion_api.py
+    - POST /request-slash         payment_services/api.py slashing endpoint
+    - GET /stats                  what the stand-ins saw, for the benchmark report
+
+    Each service can be given an artificial latency to model a remote call.
+    /ingest also measures the sensor-to-ingest latency from the reading's own
+    timestamp, so it must run on the same host as the load driver.
+    """
+
+    def __init__(self, ipfs_latency: float = 0.0, gist_latency: float = 0.0,
+                 ingest_latency: float = 0.0, slash_latency: float = 0.0):
+        self.latency = {"ipfs": ipfs_latency, "gist": gist_latency, "ingest": ingest_latency, "slash": slash_latency}
+        self.metrics = StageMetrics()
+        self.gists = {}  # gist_id -> {filename: content}
+
+    def app(self) -> web.Application:
+        app = web.Application(client_max_size=64 * 1024 * 1024)
+        app.router.add_post("/upload", self.upload)
+        app.router.add_get("/gists/{gist_id}", self.get_gist)
+        app.router.add_patch("/gists/{gist_id}", self.patch_gist)
+        app.router.add_get("/raw/{gist_id}/{filename}", self.get_raw)
+        app.router.add_post("/ingest", self.ingest)
+        app.router.add_post("/ingest/bulk", self.ingest_bulk)
+        app.router.add_post("/request-slash", self.request_slash)
+        app.router.add_get("/stats", self.stats)
+        app.router.add_post("/reset", self.reset)
+        return app
+
+    async def _delay(self, service: str):
+        if self.latency[service] > 0:
+            await asyncio.sleep(self.latency[service])
+
+    async def upload(self, request: web.Request) -> web.Response:
+        body = await request.read()
+        await self._delay("ipfs")
+        self.metrics.incr("ipfs_uploads")
+        self.metrics.incr("ipfs_bytes", len(body))
+        return web.json_response({"cid": "bafy" + hashlib.sha256(body).hexdigest()[:52]})
+
+    async def get_gist(self, request: web.Request) -> web.Response:
+        await self._delay("gist")
+        self.metrics.incr("gist_gets")
+        files = self.gists.get(request.match_info["gist_id"], {})
+        return web.json_response({"files": {name: {"content": content} for name, content in files.items()}})
+
+    async def patch_gist(self, request: web.Request) -> web.Response:
+        payload = await request.json()
+        await self._delay("gist")
+        self.metrics.incr("gist_patches")
+        files = self.gists.setdefault(request.match_info["gist_id"], {})
+        for name, file in payload["files"].items():
+            if file is None:
+                files.pop(name, None)  # the Gist API deletes files set to null
+            else:
+                files[name] = file["content"]
+        return web.json_response({"files": {name: {"content": content} for name, content in files.items()}})
+
+    async def get_raw(self, request: web.Request) -> web.Response:
+        await self._delay("gist")
+        self.metrics.incr("gist_raw_gets")
+        content = self.gists.get(request.match_info["gist_id"], {}).get(request.match_info["filename"])
+        if content is None:
+            raise web.HTTPNotFound()
+        body = content.encode()
+        if request.http_range.start:
+            if request.http_range.start >= len(body):
+                raise web.HTTPRequestRangeNotSatisfiable()
+            return web.Response(body=body[request.http_range.start:], status=206)
+        return web.Response(body=body)
+
+    async def ingest(self, request: web.Request) -> web.Response:
+        packet = await request.json()
+        await self._delay("ingest")
+        self._ingested(packet)
+        return web.json_response({"status": "ACK ✅", "message": "Data ingested successfully."})
+
+    async def ingest_bulk(self, request: web.Request) -> web.Response:
+        packets = await request.json()
+        await self._delay("ingest")
+        self.metrics.incr("ingest_requests")
+        for packet in packets:
+            self._ingested(packet)
+        return web.json_response({"status": "ACK ✅", "message": "Data ingested successfully.", "accepted": len(packets)})
+
+    def _ingested(self, packet: dict):
+        self.metrics.incr("ingested")
+        try:
+            sent_at = datetime.fromisoformat(packet["timestamp"]).timestamp()
+            self.metrics.record("sensor_to_ingest", time.time() - sent_at)
+        except (KeyError, ValueError):
+            pass
+
+    async def request_slash(self, request: web.Request) -> web.Response:
+        data = await request.json()
+        await self._delay("slash")
+        self.metrics.incr("slash_requests")
+        return web.json_response({"status": "success", "message": f"Slash requested for {data.get('mac_address')}",
+                                  "tx_hash": "0x" + "0" * 64})
+
+    async def stats(self, request: web.Request) -> web.Response:
+        summary = self.metrics.summary()
+        summary["gist_size_bytes"] = {gist_id: sum(len(content) for content in files.values())
+                                      for gist_id, files in self.gists.items()}
+        return web.json_response(summary)
+
+    async def reset(self, request: web.Request) -> web.Response:
+        self.metrics.reset()
+        return web.json_response({"status": "reset"})
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stand-ins for the pipeline's external services")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--ipfs-latency-ms", type=float, default=0.0)
+    parser.add_argument("--gist-latency-ms", type=float, default=0.0)
+    parser.add_argument("--ingest-latency-ms", type=float, default=0.0)
+    parser.add_argument("--slash-latency-ms", type=float, default=0.0)
+    args = parser.parse_args()
+
+    stand_ins = StandIns(args.ipfs_latency_ms / 1000, args.gist_latency_ms / 1000,
+                         args.ingest_latency_ms / 1000, args.slash_latency_ms / 1000)
+    print(f"[StandIns] Serving on http://127.0.0.1:{args.port}")
+    web.run_app(stand_ins.app(), host="127.0.0.1", port=args.port, print=None, access_log=None)
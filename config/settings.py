@@ -21,7 +21,113 @@ KNOWLEDGE_GRAPH_GIST_ID=os.getenv("KNOWLEDGE_GRAPH_GIST_ID")
 ASI_API_KEY = os.getenv("ASI_API_KEY")
 AGENTVERSE_API_KEY = os.getenv("AGENTVERSE_API_KEY")
 
+# --- Sensor registry storage ---
+# "sqlite" (default) keeps the registry in a WAL-mode database and exports
+# sensor_registry.json for compatibility; "json" uses the JSON file directly.
+REGISTRY_BACKEND = os.getenv("REGISTRY_BACKEND", "sqlite")
+REGISTRY_DB_FILE = os.getenv("REGISTRY_DB_FILE", os.path.join(PROJECT_ROOT, "sensor_registry.db"))
+SENSOR_REGISTRY_FILE = os.getenv("SENSOR_REGISTRY_FILE", os.path.join(PROJECT_ROOT, "sensor_registry.json"))
 
+# --- Worker hosts ---
+# Number of regional agents run inside one worker host process. Set to 0 to
+# fall back to one regional_agent.py process per registered device.
+WORKER_HOST_CAPACITY = int(os.getenv("WORKER_HOST_CAPACITY", "500"))
+
+# --- MQTT gateway ---
+# "multiplexed" runs one gateway for all sensors (split across GATEWAY_SHARDS
+# processes by MAC hash); "per_device" launches one gateway per sensor.
+GATEWAY_MODE = os.getenv("GATEWAY_MODE", "multiplexed")
+GATEWAY_SHARDS = int(os.getenv("GATEWAY_SHARDS", "1"))
+
+# --- External service endpoints ---
+# Overridable so the pipeline can be pointed at local stand-ins (see benchmarks/).
+WEB3_STORAGE_UPLOAD_URL = os.getenv("WEB3_STORAGE_UPLOAD_URL", "https://api.web3.storage/upload")
+GIST_API_BASE_URL = os.getenv("GIST_API_BASE_URL", "https://api.github.com/gists")
+GIST_RAW_BASE_URL = os.getenv("GIST_RAW_BASE_URL", "https://gist.githubusercontent.com/raw")
+INGEST_API_URL = os.getenv("INGEST_API_URL", "http://localhost:5001/ingest")
+SLASH_API_URL = os.getenv("SLASH_API_URL", "http://127.0.0.1:5002/request-slash")
+
+# --- Ingest delivery ---
+# Enriched packets arriving within INGEST_LINGER seconds are sent as one POST to
+# INGEST_BULK_URL (at most INGEST_BATCH_MAX per request). 0 POSTs each packet
+# to INGEST_API_URL on its own.
+INGEST_BULK_URL = os.getenv("INGEST_BULK_URL", INGEST_API_URL.rstrip("/") + "/bulk")
+INGEST_LINGER = float(os.getenv("INGEST_LINGER", "0.05"))
+INGEST_BATCH_MAX = int(os.getenv("INGEST_BATCH_MAX", "500"))
+
+# --- Ingestion storage (verification_api/ingest_store.py) ---
+# Day-partitioned SQLite databases. Up to INGEST_QUEUE_MAX packets may wait for
+# the writer before the API answers 503; each commit takes up to INGEST_COMMIT_MAX.
+INGEST_DATA_DIR = os.getenv("INGEST_DATA_DIR", os.path.join(PROJECT_ROOT, "ingest_data"))
+INGEST_QUEUE_MAX = int(os.getenv("INGEST_QUEUE_MAX", "100000"))
+INGEST_COMMIT_MAX = int(os.getenv("INGEST_COMMIT_MAX", "5000"))
+INGEST_COMMIT_LINGER = float(os.getenv("INGEST_COMMIT_LINGER", "0.005"))
+
+
+# --- IPFS uploads ---
+# "web3storage" uploads through WEB3_STORAGE_UPLOAD_URL; "local" keeps content
+# in a content-addressed directory instead, for offline tests and benchmarks.
+IPFS_BACKEND = os.getenv("IPFS_BACKEND", "web3storage")
+IPFS_LOCAL_STORE_DIR = os.getenv("IPFS_LOCAL_STORE_DIR", os.path.join(PROJECT_ROOT, "ipfs_store"))
+IPFS_MAX_CONCURRENCY = int(os.getenv("IPFS_MAX_CONCURRENCY", "16"))
+IPFS_TIMEOUT = float(os.getenv("IPFS_TIMEOUT", "10"))
+IPFS_RETRIES = int(os.getenv("IPFS_RETRIES", "3"))
+# Batching mode: seconds to collect raw readings into one NDJSON bundle before
+# uploading it (0 uploads every reading on its own). A bundle is also uploaded
+# early once it holds IPFS_BATCH_MAX_RECORDS records or IPFS_BATCH_MAX_BYTES bytes.
+IPFS_BATCH_WINDOW = float(os.getenv("IPFS_BATCH_WINDOW", "0"))
+IPFS_BATCH_MAX_RECORDS = int(os.getenv("IPFS_BATCH_MAX_RECORDS", "1000"))
+IPFS_BATCH_MAX_BYTES = int(os.getenv("IPFS_BATCH_MAX_BYTES", str(4 * 1024 * 1024)))
+# Identical raw payloads uploaded within IPFS_DEDUP_TTL seconds reuse the first
+# upload's link; the cache holds IPFS_DEDUP_SIZE entries (0 disables it).
+IPFS_DEDUP_SIZE = int(os.getenv("IPFS_DEDUP_SIZE", "10000"))
+IPFS_DEDUP_TTL = float(os.getenv("IPFS_DEDUP_TTL", "3600"))
+
+# --- Pending consensus rounds ---
+# Cap on undecided rounds per regional agent. When it is reached, "evict_oldest"
+# drops the oldest pending round to admit the new event; "reject_new" drops the event.
+MAX_PENDING_ROUNDS = int(os.getenv("MAX_PENDING_ROUNDS", "1000"))
+PENDING_OVERFLOW_POLICY = os.getenv("PENDING_OVERFLOW_POLICY", "evict_oldest")
+
+# --- Post-consensus outbox ---
+# Each regional agent keeps a write-ahead log of validated events here until
+# IPFS, the Notary and the ingest API have all received them.
+OUTBOX_DIR = os.getenv("OUTBOX_DIR", os.path.join(PROJECT_ROOT, "outbox"))
+OUTBOX_WORKERS = int(os.getenv("OUTBOX_WORKERS", "2"))
+# "1" fsyncs every WAL write (survives power loss, not just a process crash).
+OUTBOX_FSYNC = os.getenv("OUTBOX_FSYNC", "0") == "1"
+
+# --- Knowledge graph storage (fetch_services/knowledge_graph.py) ---
+# "local" (default) keeps the graph's segments and manifest in KNOWLEDGE_GRAPH_DIR;
+# "gist" publishes them as the files of the KNOWLEDGE_GRAPH_GIST_ID Gist.
+KNOWLEDGE_GRAPH_BACKEND = os.getenv("KNOWLEDGE_GRAPH_BACKEND", "local")
+KNOWLEDGE_GRAPH_DIR = os.getenv("KNOWLEDGE_GRAPH_DIR", os.path.join(PROJECT_ROOT, "knowledge_graph"))
+# A segment is sealed (and never rewritten) once it holds this many bytes or has
+# been open this many seconds. Keep it under the Gist API's 1 MB inline limit.
+KNOWLEDGE_GRAPH_SEGMENT_MAX_BYTES = int(os.getenv("KNOWLEDGE_GRAPH_SEGMENT_MAX_BYTES", str(512 * 1024)))
+KNOWLEDGE_GRAPH_SEGMENT_MAX_AGE = float(os.getenv("KNOWLEDGE_GRAPH_SEGMENT_MAX_AGE", "3600"))
+# Compaction (fetch_services/kg_compaction.py), run by the Notary every
+# KNOWLEDGE_GRAPH_COMPACT_INTERVAL seconds (0 disables it): noise events older
+# than KNOWLEDGE_GRAPH_RAW_HORIZON seconds become hourly summaries, and hourly
+# summaries older than KNOWLEDGE_GRAPH_HOURLY_HORIZON seconds daily ones.
+KNOWLEDGE_GRAPH_COMPACT_INTERVAL = float(os.getenv("KNOWLEDGE_GRAPH_COMPACT_INTERVAL", "3600"))
+KNOWLEDGE_GRAPH_RAW_HORIZON = float(os.getenv("KNOWLEDGE_GRAPH_RAW_HORIZON", str(7 * 24 * 3600)))
+KNOWLEDGE_GRAPH_HOURLY_HORIZON = float(os.getenv("KNOWLEDGE_GRAPH_HOURLY_HORIZON", str(90 * 24 * 3600)))
+
+# --- Notary ---
+# Local state of the Notary: a snapshot plus an append-only log of accepted facts.
+NOTARY_STATE_DIR = os.getenv("NOTARY_STATE_DIR", os.path.join(PROJECT_ROOT, "notary_state"))
+# Buffered facts are published to the knowledge graph every NOTARY_FLUSH_INTERVAL
+# seconds, or as soon as NOTARY_FLUSH_MAX_FACTS are waiting.
+NOTARY_FLUSH_INTERVAL = float(os.getenv("NOTARY_FLUSH_INTERVAL", "2"))
+NOTARY_FLUSH_MAX_FACTS = int(os.getenv("NOTARY_FLUSH_MAX_FACTS", "500"))
+# Fact dedup: the last NOTARY_DEDUP_WINDOW fact keys are kept exactly; older ones
+# in a Bloom filter of NOTARY_DEDUP_CAPACITY keys at NOTARY_DEDUP_ERROR_RATE.
+NOTARY_DEDUP_WINDOW = int(os.getenv("NOTARY_DEDUP_WINDOW", "100000"))
+NOTARY_DEDUP_CAPACITY = int(os.getenv("NOTARY_DEDUP_CAPACITY", "1000000"))
+NOTARY_DEDUP_ERROR_RATE = float(os.getenv("NOTARY_DEDUP_ERROR_RATE", "1e-6"))
+# Facts between state snapshots; the log is truncated after each one.
+NOTARY_SNAPSHOT_EVERY = int(os.getenv("NOTARY_SNAPSHOT_EVERY", "2000"))
 
 # --- Debug check (optional but recommended) ---
 if not CONTRACT_OWNER_PRIVATE_KEY:
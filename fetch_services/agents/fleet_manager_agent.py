@@ -1,8 +1,7 @@
 import sys
 import os
 import re
-import requests
-from datetime import datetime, time
+from datetime import datetime
 from uuid import uuid4
 from uagents import Agent, Context
 from openai import AsyncOpenAI
@@ -21,7 +20,12 @@ from uagents_core.contrib.protocols.chat import (
 # --- Path and Config ---
 PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 sys.path.append(PROJECT_ROOT)
-from config.settings import ASI_API_KEY, KNOWLEDGE_GRAPH_GIST_ID, AGENTVERSE_API_KEY
+from config.settings import (
+    ASI_API_KEY, KNOWLEDGE_GRAPH_GIST_ID, AGENTVERSE_API_KEY, KNOWLEDGE_GRAPH_BACKEND, KNOWLEDGE_GRAPH_DIR,
+    GIST_RAW_BASE_URL,
+)
+from fetch_services.knowledge_graph import KnowledgeGraphReader
+from fetch_services.kg_compaction import SUMMARY_ATOM, Rollup, is_night, parse_timestamp
 
 # --- ASI:One API Client ---
 if not ASI_API_KEY or "YOUR" in ASI_API_KEY:
@@ -40,20 +44,30 @@ agent = Agent(
 fund_agent_if_low(agent.wallet.address())
 
 # --- Knowledge Base Logic ---
-KNOWLEDGE_GRAPH_RAW_URL = f"https://gist.githubusercontent.com/raw/{KNOWLEDGE_GRAPH_GIST_ID}/knowledge_graph.metta"
+if KNOWLEDGE_GRAPH_BACKEND == "gist":
+    KNOWLEDGE_GRAPH_SOURCE = f"{GIST_RAW_BASE_URL}/{KNOWLEDGE_GRAPH_GIST_ID}"
+else:
+    KNOWLEDGE_GRAPH_SOURCE = KNOWLEDGE_GRAPH_DIR
+# The graph is stored in segments; the reader fetches only what it has not seen.
+kg_reader = KnowledgeGraphReader(KNOWLEDGE_GRAPH_SOURCE)
 LOCATIONS_CACHE = {}
-EVENTS_CACHE = []
+EVENTS_CACHE = []     # recent noise_event atoms
+SUMMARIES_CACHE = []  # hourly/daily noise_summary atoms of compacted history
+# Per-location statistics over both, updated as atoms are loaded, so answering
+# a query costs the number of locations rather than the number of events.
+LOCATION_STATS = {}
 
 def load_knowledge_base():
-    global LOCATIONS_CACHE, EVENTS_CACHE
-    print(f"Loading knowledge base from Gist: {KNOWLEDGE_GRAPH_RAW_URL}")
+    """Adds the atoms published since the last sync to the caches (rebuilding them after a compaction)."""
+    print(f"Syncing knowledge base from: {KNOWLEDGE_GRAPH_SOURCE}")
     try:
-        response = requests.get(KNOWLEDGE_GRAPH_RAW_URL, timeout=10)
-        response.raise_for_status()
-        content = response.text
-        
-        locations = {}
-        events = []
+        content, rebuilt = kg_reader.sync()
+        if rebuilt:
+            for cache in (LOCATIONS_CACHE, EVENTS_CACHE, SUMMARIES_CACHE, LOCATION_STATS):
+                cache.clear()
+
+        locations = LOCATIONS_CACHE
+        events = EVENTS_CACHE
         for line in content.splitlines():
             line = line.strip()
             if not line or line.startswith(";"):
@@ -68,45 +82,46 @@ def load_knowledge_base():
             if event_match:
                 _, loc_id, timestamp, db = event_match.groups()
                 events.append({"loc_id": loc_id, "timestamp": timestamp, "db": float(db)})
-
-        LOCATIONS_CACHE = locations
-        EVENTS_CACHE = events
-        print(f"Loaded {len(LOCATIONS_CACHE)} locations and {len(EVENTS_CACHE)} events.")
+                moment = parse_timestamp(timestamp)
+                LOCATION_STATS.setdefault(loc_id, Rollup()).add(float(db), moment is not None and is_night(moment))
+
+            summary_match = SUMMARY_ATOM.match(line)
+            if summary_match:
+                period, loc_id, start = summary_match.groups()[:3]
+                rollup = Rollup.from_atom(*summary_match.groups()[3:])
+                SUMMARIES_CACHE.append({"period": period, "loc_id": loc_id, "start": start, "count": rollup.count,
+                                        "mean": rollup.mean, "max": rollup.maximum, "leq": rollup.leq})
+                LOCATION_STATS.setdefault(loc_id, Rollup()).merge(rollup)
+
+        print(f"Loaded {len(LOCATIONS_CACHE)} locations, {len(EVENTS_CACHE)} events and {len(SUMMARIES_CACHE)} summaries.")
     except Exception as e:
         print(f"ERROR: Could not load knowledge base: {e}")
 
-def get_average_db(events, loc_id, night_only=False):
-    vals = []
-    for ev in events:
-        if ev["loc_id"] != loc_id:
-            continue
-        if night_only:
-            try:
-                t = datetime.fromisoformat(ev["timestamp"].rstrip('Z')).time()
-                if not (time(22, 0) <= t or t < time(6, 0)):
-                    continue
-            except ValueError:
-                continue
-        vals.append(ev["db"])
-    return sum(vals)/len(vals) if vals else None
+def get_average_db(loc_id, night_only=False):
+    stats = LOCATION_STATS.get(loc_id)
+    if stats is None or not (stats.night_count if night_only else stats.count):
+        return None
+    return stats.night_mean if night_only else stats.mean
 
-def generate_facts_summary(events, locations):
+def generate_facts_summary(locations):
     lines = ["Facts from the sound-sensor network:"]
     if not locations:
         return "No data available."
     for loc_id, loc_data in locations.items():
-        avg_all = get_average_db(events, loc_id)
-        avg_night = get_average_db(events, loc_id, night_only=True)
+        avg_all = get_average_db(loc_id)
+        avg_night = get_average_db(loc_id, night_only=True)
         avg_all_str = f"{avg_all:.1f} dB" if avg_all is not None else "No data"
         avg_night_str = f"{avg_night:.1f} dB" if avg_night is not None else "No data"
-        lines.append(f"- Location '{loc_data['name']}' (ID: {loc_id}): overall {avg_all_str}, night {avg_night_str}.")
+        stats = LOCATION_STATS.get(loc_id)
+        peak_str = f" (Leq {stats.leq:.1f} dB, peak {stats.maximum:.1f} dB)" if stats is not None and stats.count else ""
+        lines.append(f"- Location '{loc_data['name']}' (ID: {loc_id}): overall {avg_all_str}{peak_str}, night {avg_night_str}.")
     return "\n".join(lines)
 
 async def query_llm_with_rag(user_query: str) -> str:
     if not asi_client:
         return "ASI:One LLM not configured. Set the API key."
 
-    facts = generate_facts_summary(EVENTS_CACHE, LOCATIONS_CACHE)
+    facts = generate_facts_summary(LOCATIONS_CACHE)
     prompt = (
         f"You are EchoNet Fleet Manager AI. Answer based ONLY on the facts below. "
         f"If insufficient, say you cannot answer.\n\n"
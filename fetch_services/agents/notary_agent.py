@@ -71,7 +71,7 @@
 #     ctx.logger.info(f"Received fact candidate from worker for device {data.mac_address}")
     
 #     # 1. Look up sensor details from the in-memory registry.
-#     sensor_info = SENSOR_REGISTRY.get(data.mac_address)
+#     sensor_info = registry_cache.get(data.mac_address)
 #     if not sensor_info:
 #         ctx.logger.warning(f"Received fact for unregistered MAC address {data.mac_address}. Discarding.")
 #         return
@@ -105,8 +105,6 @@
 #     agent.run()
 import sys
 import os
-import json
-import requests
 from uagents import Agent, Context
 from datetime import datetime, timezone
 
@@ -118,10 +116,18 @@ sys.path.append(PROJECT_ROOT)
 SENSOR_REGISTRY_FILE = os.path.join(PROJECT_ROOT, "sensor_registry.json")
 
 # Import secrets and configuration for the Gist
-from config.settings import GITHUB_PAT, KNOWLEDGE_GRAPH_GIST_ID
+from config.settings import (
+    GITHUB_PAT, KNOWLEDGE_GRAPH_GIST_ID, GIST_API_BASE_URL, NOTARY_STATE_DIR, KNOWLEDGE_GRAPH_COMPACT_INTERVAL,
+)
 
 # Import the schema for the incoming message
 from fetch_services.agents.schemas import FactCandidate
+from fetch_services.registry_cache import get_registry_cache
+from fetch_services.metrics import pipeline_metrics
+from fetch_services.knowledge_graph import KnowledgeGraphWriter, open_graph_store
+from fetch_services.fact_index import FactIndex
+from fetch_services.notary_state import NotaryState
+from fetch_services.kg_compaction import GraphCompactor
 
 # --- Agent Definition ---
 NOTARY_SEED = "notary_agent_super_secret_seed_phrase_for_echonet"
@@ -134,73 +140,59 @@ agent = Agent(
 )
 
 # --- State and Gist Helpers ---
-SENSOR_REGISTRY = {}
-WRITTEN_LOCATIONS = set()
-EVENT_COUNTER = 0
-GIST_API_URL = f"https://api.github.com/gists/{KNOWLEDGE_GRAPH_GIST_ID}"
+# Shared in-memory registry view; picks up newly registered sensors without a restart.
+registry_cache = get_registry_cache()
+# Event counter, written locations and the fact dedup index, persisted across
+# restarts as a snapshot plus an append-only log (see notary_state.py).
+NOTARY_STATE = NotaryState(NOTARY_STATE_DIR)
+GIST_API_URL = f"{GIST_API_BASE_URL}/{KNOWLEDGE_GRAPH_GIST_ID}"
 GIST_HEADERS = {"Authorization": f"token {GITHUB_PAT}", "Accept": "application/vnd.github.v3+json"}
 
-def update_knowledge_graph_gist(new_content: str, ctx: Context):
-    """
-    Atomically updates the public knowledge graph Gist by fetching its
-    current content, appending the new atoms, and patching it.
-    """
-    try:
-        # Step 1: Get the current content of the Gist file.
-        response = requests.get(GIST_API_URL, headers=GIST_HEADERS, timeout=10)
-        response.raise_for_status()
-        # We assume the Gist has a file named 'knowledge_graph.metta'
-        current_content = response.json()['files']['knowledge_graph.metta']['content']
-        
-        # Step 2: Append the new atoms to the current content.
-        updated_content = current_content + new_content
-        
-        # Step 3: Send a PATCH request to update the Gist.
-        payload = {"files": {"knowledge_graph.metta": {"content": updated_content}}}
-        patch_response = requests.patch(GIST_API_URL, headers=GIST_HEADERS, json=payload, timeout=10)
-        patch_response.raise_for_status()
-        
-        ctx.logger.info("Successfully updated public knowledge graph Gist.")
-    except requests.exceptions.RequestException as e:
-        ctx.logger.error(f"Failed to update knowledge graph Gist: {e}")
-    except KeyError:
-        ctx.logger.error("Gist does not contain a 'knowledge_graph.metta' file. Please check your Gist setup.")
+KG_HEADER = "; EchoNet Shared Knowledge Graph\n; Managed by the Notary Agent.\n"
+
+# Facts are buffered and published in batches, as segments of the graph in a
+# local directory or the Gist (see knowledge_graph.py); the state log keeps
+# them until then.
+kg_writer = KnowledgeGraphWriter(open_graph_store(gist_url=GIST_API_URL, gist_headers=GIST_HEADERS),
+                                 on_flush=NOTARY_STATE.published)
 
 
 @agent.on_event("startup")
 async def startup(ctx: Context):
     """
-    On startup, the Notary loads the local sensor registry and initializes the
-    public knowledge base Gist, ensuring it starts from a clean slate.
+    On startup, the Notary loads the local sensor registry, restores its state
+    and resumes appending to the public knowledge graph.
     """
-    global SENSOR_REGISTRY, WRITTEN_LOCATIONS, EVENT_COUNTER
     ctx.logger.info(f"Notary Agent starting up. Address: {agent.address}")
-    try:
-        with open(SENSOR_REGISTRY_FILE, 'r') as f:
-            SENSOR_REGISTRY = json.load(f)
-        ctx.logger.info(f"Successfully loaded sensor registry with {len(SENSOR_REGISTRY)} devices.")
-    except (FileNotFoundError, json.JSONDecodeError):
+    registry_cache.refresh(force=True)
+    if registry_cache.snapshot():
+        ctx.logger.info(f"Successfully loaded sensor registry with {len(registry_cache.sensors())} devices.")
+    else:
         ctx.logger.warning("Local sensor registry not found or is empty.")
 
-    # Initialize the public Gist with a header
-    initial_content = "; EchoNet Shared Knowledge Graph\n; Managed by the Notary Agent.\n"
-    update_knowledge_graph_gist(initial_content, ctx)
-    
-    WRITTEN_LOCATIONS = set()
-    EVENT_COUNTER = 0
-    ctx.logger.info("Public knowledge base Gist initialized.")
+    # History is kept across restarts; the header is only written to a new graph.
+    unpublished = NOTARY_STATE.load()
+    recovered = await kg_writer.start(pending=unpublished, initial_content=KG_HEADER)
+    if recovered:
+        ctx.logger.info(f"Recovered {recovered} unpublished facts from the state log.")
+    ctx.logger.info(f"Public knowledge base resumed at event {NOTARY_STATE.event_counter}.")
 
 @agent.on_message(model=FactCandidate, replies=set())
 async def add_fact_to_kb(ctx: Context, sender: str, msg: FactCandidate):
     """
-    Receives a validated fact and writes it to the PUBLIC knowledge graph Gist.
+    Receives a validated fact and queues it for the PUBLIC knowledge graph.
     """
-    global WRITTEN_LOCATIONS, EVENT_COUNTER
-    
     data = msg.validated_event
     ctx.logger.info(f"Received fact candidate from worker for device {data.mac_address}")
-    
-    sensor_info = SENSOR_REGISTRY.get(data.mac_address)
+
+    # Deliveries are at-least-once, so the same reading can arrive more than once.
+    fact_key = FactIndex.fact_key(data.mac_address, data.timestamp)
+    if fact_key in NOTARY_STATE.fact_index:
+        pipeline_metrics.incr("facts_duplicate")
+        ctx.logger.info(f"Duplicate fact for {data.mac_address} at {data.timestamp}. Discarding.")
+        return
+
+    sensor_info = registry_cache.get(data.mac_address)
     if not sensor_info:
         ctx.logger.warning(f"Received fact for unregistered MAC address {data.mac_address}. Discarding.")
         return
@@ -209,21 +201,39 @@ async def add_fact_to_kb(ctx: Context, sender: str, msg: FactCandidate):
     new_atoms_to_write = ""
     
     # Location Atom Logic: Add the location atom only if it's new.
-    # To be robust, we need to check the Gist content itself. For this prototype,
-    # the in-memory WRITTEN_LOCATIONS is a good-enough approximation.
-    if loc_id not in WRITTEN_LOCATIONS:
+    # The persisted location set mirrors the location atoms already in the graph.
+    if loc_id not in NOTARY_STATE.locations:
         new_atoms_to_write += f"\n; --- Location Definition: {sensor_info['name']} ---\n"
         new_atoms_to_write += f"(location {loc_id} \"{sensor_info['name']}\" {sensor_info['latitude']} {sensor_info['longitude']})\n"
-        WRITTEN_LOCATIONS.add(loc_id)
 
-    # Noise Event Atom Logic: Always add a new event.
-    EVENT_COUNTER += 1
-    event_id = f"N{str(EVENT_COUNTER).zfill(3)}"
+    # Noise Event Atom Logic: Add one event per distinct reading.
+    event_id = NOTARY_STATE.next_event_id()
     iso_timestamp = datetime.fromtimestamp(data.timestamp, tz=timezone.utc).isoformat()
     new_atoms_to_write += f"(noise_event {event_id} {loc_id} \"{iso_timestamp}\" {data.sound_level_db})\n"
-    
-    # Update the public Gist with the new atoms
-    update_knowledge_graph_gist(new_atoms_to_write, ctx)
+
+    # Log the fact first (this is what survives a crash), then buffer the atoms
+    # for the writer's next batch.
+    NOTARY_STATE.record(fact_key, loc_id, new_atoms_to_write)
+    kg_writer.append(new_atoms_to_write)
+
+async def compact_knowledge_graph(ctx: Context):
+    """Rolls old noise events into summaries so the graph stays proportional to the retained data."""
+    try:
+        stats = await kg_writer.compact(GraphCompactor())
+    except Exception as e:
+        ctx.logger.error(f"Knowledge graph compaction failed: {e}")
+        return
+    if stats:
+        ctx.logger.info(f"Compacted the knowledge graph: {stats}")
+
+if KNOWLEDGE_GRAPH_COMPACT_INTERVAL > 0:
+    agent.on_interval(period=KNOWLEDGE_GRAPH_COMPACT_INTERVAL)(compact_knowledge_graph)
+
+@agent.on_event("shutdown")
+async def shutdown(ctx: Context):
+    """Publishes whatever is still buffered and snapshots the state before the agent stops."""
+    await kg_writer.close()
+    NOTARY_STATE.close()
 
 if __name__ == "__main__":
     print(f"Starting Notary Agent...")
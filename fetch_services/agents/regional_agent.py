@@ -8,65 +8,65 @@ SENSOR_REGISTRY_FILE = os.path.join(PROJECT_ROOT, "sensor_registry.json")
 import asyncio
 import hashlib
 import json
+from collections import Counter
 from datetime import datetime, timezone, timedelta
-import math
-import random
-import time
 import requests
 import numpy as np
 
-from uagents import Agent, Context, Protocol, Model
-from uagents.crypto import Identity
+from uagents import Agent, Context, Protocol
+from uagents_core.types import DeliveryStatus
 from cosmpy.crypto.keypairs import PublicKey, PrivateKey
 from mnemonic import Mnemonic
 
 # Corrected imports for the new architecture
-from fetch_services.agents.schemas import SensorData, ValidationRequest, ValidationResponse, FactCandidate, ValidatedSensorData
+from fetch_services.agents.schemas import SensorData, ValidationRequest, ValidationResponse, FactCandidate, ValidatedSensorData, EnrichedData
 from fetch_services.agents.ml_model import run_inference
 from fetch_services.ipfs_service import IPFSService
 from fetch_services.consensus.consensus_logic import SmartConsensus
+from fetch_services.consensus.quorum import (
+    QuorumRound, PendingRounds, QUORUM_RATIO, REACHED, FAILED, TIMED_OUT, EVICTED,
+)
+from fetch_services.timer_wheel import TimerWheel
+from fetch_services.registry_cache import get_registry_cache
+from fetch_services.spatial_index import PeerIndex
+from fetch_services.metrics import pipeline_metrics
+from fetch_services.outbox import Outbox, Sink
+from fetch_services.ingest_client import IngestClient
+
+try:
+    from config.settings import (
+        SLASH_API_URL, OUTBOX_DIR, OUTBOX_WORKERS, OUTBOX_FSYNC, MAX_PENDING_ROUNDS, PENDING_OVERFLOW_POLICY,
+    )
+except ImportError:
+    SLASH_API_URL = "http://127.0.0.1:5002/request-slash"
+    OUTBOX_DIR = os.path.join(PROJECT_ROOT, "outbox")
+    OUTBOX_WORKERS = 2
+    OUTBOX_FSYNC = False
+    MAX_PENDING_ROUNDS = 1000
+    PENDING_OVERFLOW_POLICY = "evict_oldest"
 
 # The Notary Agent's address will be loaded dynamically from the registry
 NOTARY_AGENT_ADDRESS = None
 
-def read_registry():
-    """Safely reads the shared sensor registry file."""
-    time.sleep(0.2) # Mitigate race conditions on startup
-    with open(SENSOR_REGISTRY_FILE, 'r') as f:
-        return json.load(f)
-
-# --- Agent & Peer Configuration ---
-if len(sys.argv) < 2:
-    print(f"Usage: python {sys.argv[0]} <mac_address>")
-    sys.exit(1)
-
-MAC_ADDRESS = sys.argv[1]
-ALL_CONFIGS = read_registry()
-CONFIG = ALL_CONFIGS[MAC_ADDRESS]
-AGENT_NAME = CONFIG['agent_name']
-
-# --- Agent Setup ---
-seed_bytes = Mnemonic("english").to_seed(CONFIG["agent_seed"])
-private_key_bytes = seed_bytes[:32]
-private_key = PrivateKey(private_key_bytes)
-public_key = private_key.public_key
-
-agent = Agent(
-    name=AGENT_NAME, port=CONFIG["agent_port"], seed=CONFIG["agent_seed"],
-    endpoint=[f"http://127.0.0.1:{CONFIG['agent_port']}/submit"],
-)
+# Shared in-memory view of the registry; only re-read when the file changes.
+registry_cache = get_registry_cache()
 
-# --- State & Helpers ---
-LOCAL_SENSOR_STATE = {}
-SENSOR_FAILURE_COUNTS = {} 
+# --- Shared State & Services ---
+# Everything in this section is shared by all workers running in the same
+# process (see worker_host.py), so a host with many agents still keeps a
+# single registry view, peer index, consensus engine and IPFS client.
 FAILURE_THRESHOLD = 5 
-PENDING_LOCK = asyncio.Lock()
-pending_events = {}
 VALIDATION_TIMEOUT = timedelta(seconds=15)
 GRID_SIZE = 0.1
+# Peers just across a grid boundary still take part in validation if they are this close.
+PEER_RADIUS_M = 5000
+peer_index = PeerIndex(registry_cache, grid_size=GRID_SIZE)
 ipfs_service = IPFSService()
-smart_consensus = SmartConsensus()
-QUORUM_RATIO = 0.45 
+# Pooled connections to the ingestion API; packets from all workers share its bulk POSTs.
+ingest_client = IngestClient()
+smart_consensus = SmartConsensus(registry_cache)
+# One wheel (and one background task) times out the rounds of every worker in the process.
+round_expiry = TimerWheel()
 
 def export_public_key_hex(pubkey: PublicKey) -> str:
     """Safely exports a cosmpy PublicKey to a hex string."""
@@ -88,7 +88,7 @@ def cleanup_sensor_and_agent(mac_address: str):
     print(f"--> Requesting on-chain stake slash from the API server...")
     try:
         # NOTE: This is a synchronous call for simplicity in this function.
-        response = requests.post("http://127.0.0.1:5002/request-slash", json={"mac_address": mac_address}, timeout=20)
+        response = requests.post(SLASH_API_URL, json={"mac_address": mac_address}, timeout=20)
         response.raise_for_status()
         api_ack = response.json()
         print(f"--> API Acknowledged Slash Request: {api_ack.get('message')} (Tx: {api_ack.get('tx_hash')})")
@@ -97,178 +97,252 @@ def cleanup_sensor_and_agent(mac_address: str):
         # Even if the on-chain call fails, we proceed with the off-chain removal to protect the network.
 
 def get_local_peer_group(event_location: dict) -> set:
-    """Calculates the local peer group based on the shared JSON config."""
-    local_peers = set()
-    all_configs = read_registry() 
-    event_grid_id = (math.floor(event_location["latitude"] / GRID_SIZE), math.floor(event_location["longitude"] / GRID_SIZE))
-    for mac, cfg in all_configs.items():
-        if not mac.startswith('_'): 
-            peer_grid_id = (math.floor(cfg["latitude"] / GRID_SIZE), math.floor(cfg["longitude"] / GRID_SIZE))
-            if peer_grid_id == event_grid_id:
-                peer_address = str(Identity.from_seed(cfg["agent_seed"], 0).address)
-                local_peers.add(peer_address)
-    return local_peers
-
-
-
-async def final_actions_after_consensus(ctx: Context, event_info: dict, location: dict):
     """
-    Performs all three data forwarding actions after a successful consensus.
-    1. Uploads raw data to IPFS.
-    2. Forwards a fact to the Notary Agent.
-    3. Forwards an enriched packet to the external API.
+    Calculates the local peer group from the spatial index: every peer in the
+    event's grid cell, plus peers in neighbouring cells within PEER_RADIUS_M.
     """
-    global NOTARY_AGENT_ADDRESS
-    raw_data = event_info["raw_data"]
+    registry_cache.refresh()  # applies any new registrations to the index
+    return peer_index.peers_in_cell(event_location) | peer_index.peers_within(event_location, PEER_RADIUS_M)
 
-    # 1. Upload the original raw data to IPFS for an auditable record
-    ipfs_link = await ipfs_service.upload_json(raw_data)
-    ctx.logger.info(f"Consensus reached. Raw data stored on IPFS: {ipfs_link}")
 
-    # 2. Forward Fact to Notary Agent
-    if NOTARY_AGENT_ADDRESS is None:
-        registry = read_registry()
-        NOTARY_AGENT_ADDRESS = registry.get("_network_services", {}).get("notary_agent_address")
-    
-    if NOTARY_AGENT_ADDRESS:
-        # --- FIX: Use the correct 'location' parameter that was passed to the function ---
-        
-        # a. Create the location dictionary with "lat" and "lon" keys
-        formatted_location = {
-            "lat": location["latitude"],
-            "lon": location["longitude"]
-        }
 
-        # b. Create the inner ValidatedSensorData object with the correct field names
-        validated_data = ValidatedSensorData(
-            mac_address=raw_data['device_id'],
-            timestamp=datetime.fromisoformat(raw_data['timestamp']).timestamp(),
-            sound_level_db=raw_data['decibel'],
-            location=formatted_location
-        )
-        
-        
-        # c. Wrap it in the FactCandidate model
-        fact = FactCandidate(validated_event=validated_data)
-        
-        # d. Send the final, correctly formatted message to the Notary
-        await ctx.send(NOTARY_AGENT_ADDRESS, fact)
-        ctx.logger.info(f"Fact candidate sent to Notary Agent.")
-    else:
-        ctx.logger.error("Could not find Notary Agent address in registry.")
+# --- Post-consensus Side Effects ---
+# Decided events are handed to the worker's Outbox, which delivers them to
+# three sinks: the raw-data upload to IPFS and the Notary fact run in parallel,
+# the enriched packet for the external API follows the upload, as it carries
+# the IPFS link. The helpers below build the messages from the outbox payload.
 
-    # 3. Forward Enriched Packet to External API (async version, using EnrichedData schema)
-    validator_pub_keys = [res.public_key for res in event_info["responses"] if res.validated]
+def build_fact(event: dict) -> FactCandidate:
+    """Builds the Notary's FactCandidate for a validated event."""
+    raw_data = event["raw_data"]
+    validated_data = ValidatedSensorData(
+        mac_address=raw_data['device_id'],
+        timestamp=datetime.fromisoformat(raw_data['timestamp']).timestamp(),
+        sound_level_db=raw_data['decibel'],
+        location={"lat": event["location"]["latitude"], "lon": event["location"]["longitude"]},
+    )
+    return FactCandidate(validated_event=validated_data)
 
-    enriched_payload = EnrichedData(
+def build_enriched_data(event: dict, ipfs_link: str) -> EnrichedData:
+    """Builds the packet forwarded to the external API for a validated event."""
+    raw_data = event["raw_data"]
+    return EnrichedData(
         device_id=raw_data['device_id'],
-        event=event_info["predicted_class"],
+        event=event["predicted_class"],
         decibel=raw_data['decibel'],
         timestamp=raw_data['timestamp'],   # ISO string, matches schema
-        location=location,                 # keep as {"latitude": ..., "longitude": ...}
-        confidence=event_info["confidence"],
+        location=event["location"],        # keep as {"latitude": ..., "longitude": ...}
+        confidence=event["confidence"],
         validated=True,
-        orchestrator_address=str(ctx.address),
-        validator_addresses=validator_pub_keys,
+        orchestrator_address=event["orchestrator_address"],
+        validator_addresses=event["validators"],
         raw_data_ipfs_link=ipfs_link
     )
 
-    url = "http://localhost:5001/ingest"  # <-- update if needed
-    ctx.logger.info("🚀 SENDING ENRICHED PACKET TO EXTERNAL API 🚀")
-    try:
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, json=enriched_payload.dict(), timeout=10) as resp:
-                try:
-                    resp_json = await resp.json()
-                except Exception:
-                    resp_text = await resp.text()
-                    resp_json = {"status_text": resp_text}
-                ctx.logger.info(f"API Response status={resp.status}, body={resp_json}")
-    except asyncio.CancelledError:
-        raise
-    except Exception as e:
-        ctx.logger.error(f"Failed to send enriched packet to {url}: {e}")
-
-
-# --- Protocols & Message Handlers ---
-validation_protocol = Protocol("WorkerAgentValidation")
-
-@validation_protocol.on_message(model=SensorData, replies=set())
-async def handle_sensor_data(ctx: Context, sender: str, msg: SensorData):
-    """Handles this agent's own sensor data and orchestrates consensus."""
-    global LOCAL_SENSOR_STATE
-    LOCAL_SENSOR_STATE = msg.dict()
+async def upload_raw_data(records: list) -> list:
+    """Outbox sink: uploads each event's original raw data to IPFS and returns the links."""
+    async def upload(record):
+        with pipeline_metrics.timer("ipfs_upload"):
+            link = await ipfs_service.upload_json(record["payload"]["raw_data"])
+        if link.startswith("upload_failed"):
+            raise RuntimeError(link)
+        return link
+    return await asyncio.gather(*(upload(record) for record in records), return_exceptions=True)
+
+async def post_enriched_data(records: list) -> list:
+    """Outbox sink: forwards each event, with its IPFS link, to the external API."""
+    packets = [build_enriched_data(record["payload"], record["results"]["ipfs"]).dict() for record in records]
+    await ingest_client.send_many(packets)
+    return [None] * len(records)
+
+
+# --- Worker ---
+class RegionalWorker:
+    """
+    One logical regional agent: the identity, keypair and consensus state for
+    a single registered MAC address.
+
+    Run standalone, a worker owns its own Agent, port and endpoint. Inside a
+    worker host, the Agent is created without a port or endpoint and is added
+    to a shared Bureau instead, so many workers can share one process.
+    """
+
+    def __init__(self, mac_address: str, config: dict, standalone: bool = True):
+        self.mac_address = mac_address
+        self.config = config
+        self.name = config['agent_name']
+
+        # --- Agent Setup ---
+        seed_bytes = Mnemonic("english").to_seed(config["agent_seed"])
+        private_key_bytes = seed_bytes[:32]
+        self.private_key = PrivateKey(private_key_bytes)
+        self.public_key = self.private_key.public_key
+        self.public_key_hex = export_public_key_hex(self.public_key)
+
+        if standalone:
+            self.agent = Agent(
+                name=self.name, port=config["agent_port"], seed=config["agent_seed"],
+                endpoint=[f"http://127.0.0.1:{config['agent_port']}/submit"],
+            )
+        else:
+            self.agent = Agent(name=self.name, seed=config["agent_seed"])
+
+        # --- Per-worker State ---
+        self.local_sensor_state = {}
+        self.sensor_failure_counts = {}
+        self.pending_events = PendingRounds()
+        self.outcomes = Counter()  # reached / failed / timed_out / evicted / rejected
+
+        # --- Post-consensus Outbox ---
+        # One write-ahead log per worker; started with the agent (see _start_outbox).
+        self.ctx = None
+        self.outbox = Outbox(
+            os.path.join(OUTBOX_DIR, f"{mac_address.replace(':', '').lower()}.jsonl"),
+            sinks=[
+                # Uploads within a batch run concurrently, and in IPFS batching mode they share one bundle.
+                Sink("ipfs", upload_raw_data, batch_size=64),
+                Sink("notary", self.send_facts),
+                Sink("ingest", post_enriched_data, after="ipfs", batch_size=64),
+            ],
+            workers=OUTBOX_WORKERS, fsync=OUTBOX_FSYNC,
+        )
+
+        self.agent.on_event("startup")(self._start_outbox)
+        self.agent.include(self._build_protocol())
+
+    async def _start_outbox(self, ctx: Context):
+        """Keeps the startup context for outbox sends and resumes undelivered events."""
+        self.ctx = ctx
+        recovered = self.outbox.start()
+        if recovered:
+            ctx.logger.info(f"Resuming delivery of {recovered} event(s) from the outbox.")
+
+    async def send_facts(self, records: list) -> list:
+        """Outbox sink: forwards each validated event to the Notary Agent as a FactCandidate."""
+        global NOTARY_AGENT_ADDRESS
+        if NOTARY_AGENT_ADDRESS is None:
+            NOTARY_AGENT_ADDRESS = registry_cache.network_services().get("notary_agent_address")
+        if not NOTARY_AGENT_ADDRESS:
+            raise RuntimeError("Could not find Notary Agent address in registry.")
+        results = []
+        for record in records:
+            with pipeline_metrics.timer("notary_send"):
+                status = await self.ctx.send(NOTARY_AGENT_ADDRESS, build_fact(record["payload"]))
+            # ctx.send does not raise when the Notary is unreachable; it reports it in the MsgStatus.
+            if getattr(status, "status", None) == DeliveryStatus.FAILED:
+                results.append(ConnectionError(f"Notary did not receive the fact: {status.detail}"))
+            else:
+                results.append(None)
+        return results
+
+    # --- Protocols & Message Handlers ---
+    def _build_protocol(self) -> Protocol:
+        """Creates this worker's protocol, with handlers bound to this worker's state."""
+        validation_protocol = Protocol("WorkerAgentValidation")
+        validation_protocol.on_message(model=SensorData, replies=set())(self.handle_sensor_data)
+        validation_protocol.on_message(model=ValidationRequest, replies=set())(self.handle_validation_request)
+        validation_protocol.on_message(model=ValidationResponse, replies=set())(self.handle_validation_response)
+        return validation_protocol
+
+    async def handle_sensor_data(self, ctx: Context, sender: str, msg: SensorData):
+        """Handles this agent's own sensor data and orchestrates consensus."""
+        with pipeline_metrics.timer("sensor_data"):
+            await self._start_consensus(ctx, msg)
+
+    async def _start_consensus(self, ctx: Context, msg: SensorData):
+        self.local_sensor_state = msg.dict()
     
-    sensor_mac = msg.device_id
-    all_configs = read_registry()
-    if sensor_mac not in all_configs: return
+        sensor_mac = msg.device_id
+        sensor_config = registry_cache.get(sensor_mac)
+        if sensor_config is None: return
         
-    registered_location = {
-        "latitude": all_configs[sensor_mac]["latitude"],
-        "longitude": all_configs[sensor_mac]["longitude"]
-    }
+        registered_location = {
+            "latitude": sensor_config["latitude"],
+            "longitude": sensor_config["longitude"]
+        }
     
-    # AI model is run, but IPFS upload is now deferred until after consensus.
-    predicted_class, confidence = run_inference(np.array([]))
+        # AI model is run, but IPFS upload is now deferred until after consensus.
+        predicted_class, confidence = run_inference(np.array([]))
     
-    event_id = hashlib.sha256(f"{msg.device_id}-{msg.timestamp}".encode()).hexdigest()
-    event_local_group = get_local_peer_group(registered_location)
-
-    async with PENDING_LOCK:
-        pending_events[event_id] = {
-            "raw_data": msg.dict(), "responses": [], "timestamp": datetime.now(timezone.utc),
-            "predicted_class": predicted_class, "confidence": confidence
+        event_id = hashlib.sha256(f"{msg.device_id}-{msg.timestamp}".encode()).hexdigest()
+        event_local_group = get_local_peer_group(registered_location)
+
+        # The voters are fixed now: later registry changes do not move the goalposts of this round.
+        own_address = str(self.agent.address)
+        peer_addresses = [peer for peer in event_local_group if peer != own_address]
+        voters = {peer_index.public_key_of(peer) for peer in peer_addresses} - {None, self.public_key_hex}
+        if not voters:
+            ctx.logger.warning(f"No peers to validate event {event_id}; it cannot reach consensus.")
+            return
+
+        if event_id not in self.pending_events and len(self.pending_events) >= MAX_PENDING_ROUNDS:
+            if PENDING_OVERFLOW_POLICY == "reject_new":
+                self._record_outcome("rejected")
+                ctx.logger.warning(f"{len(self.pending_events)} rounds in flight; dropping event {event_id}.")
+                return
+            self._close_round(self.pending_events.oldest(), EVICTED)
+        round_ = QuorumRound(event_id, voters, data={
+            "raw_data": msg.dict(), "timestamp": datetime.now(timezone.utc),
+            "predicted_class": predicted_class, "confidence": confidence,
+            "location": registered_location,
+        }, ratio=QUORUM_RATIO)
+        if self.pending_events.put(round_) is not round_:
+            # A re-delivered reading: the round already under way keeps its votes and timer.
+            ctx.logger.info(f"Event {event_id} is already being validated; ignoring the duplicate.")
+            return
+        round_expiry.schedule(VALIDATION_TIMEOUT.total_seconds(), (self.mac_address, event_id), self._expire_round)
+        pipeline_metrics.incr("events_started")
+
+        request_data = {
+            "event_id": event_id, "location": registered_location,
+            "sound_class": predicted_class, "decibel": msg.decibel
         }
-
-    request_data = {
-        "event_id": event_id, "location": registered_location,
-        "sound_class": predicted_class, "decibel": msg.decibel
-    }
-    digest = get_digest(request_data)
-    signature_bytes = private_key.sign(digest)
-    validation_request = ValidationRequest(
-        **request_data,
-        public_key=export_public_key_hex(public_key),
-        signature=signature_bytes.hex(),
-    )
+        digest = get_digest(request_data)
+        signature_bytes = self.private_key.sign(digest)
+        validation_request = ValidationRequest(
+            **request_data,
+            public_key=self.public_key_hex,
+            signature=signature_bytes.hex(),
+        )
     
-    for peer_address in event_local_group:
-        if peer_address != str(agent.address):
+        for peer_address in peer_addresses:
             await ctx.send(peer_address, validation_request)
 
-@validation_protocol.on_message(model=ValidationRequest, replies=set())
-async def handle_validation_request(ctx: Context, sender: str, msg: ValidationRequest):
-    """Handles validation requests from peers using REAL local sensor data."""
-    is_plausible = False
-    if not LOCAL_SENSOR_STATE:
-        ctx.logger.warning("Validation request received, but no local sensor data available.")
-    else:
-        is_plausible = smart_consensus.validate_event(
-            request_data=msg.dict(),
-            peer_sensor_data=LOCAL_SENSOR_STATE,
-            peer_agent_config=CONFIG
-        )
+    async def handle_validation_request(self, ctx: Context, sender: str, msg: ValidationRequest):
+        """Handles validation requests from peers using REAL local sensor data."""
+        with pipeline_metrics.timer("validation_request"):
+            await self._answer_validation_request(ctx, sender, msg)
+
+    async def _answer_validation_request(self, ctx: Context, sender: str, msg: ValidationRequest):
+        is_plausible = False
+        if not self.local_sensor_state:
+            ctx.logger.warning("Validation request received, but no local sensor data available.")
+        else:
+            is_plausible = smart_consensus.validate_event(
+                request_data=msg.dict(),
+                peer_sensor_data=self.local_sensor_state,
+                peer_agent_config=self.config
+            )
     
-    response_data = {"event_id": msg.event_id, "validated": is_plausible}
-    digest = get_digest(response_data)
-    signature_bytes = private_key.sign(digest)
-    validation_response = ValidationResponse(
-        **response_data,
-        public_key=export_public_key_hex(public_key),
-        signature=signature_bytes.hex(),
-    )
-    await ctx.send(sender, validation_response)
+        response_data = {"event_id": msg.event_id, "validated": is_plausible}
+        digest = get_digest(response_data)
+        signature_bytes = self.private_key.sign(digest)
+        validation_response = ValidationResponse(
+            **response_data,
+            public_key=self.public_key_hex,
+            signature=signature_bytes.hex(),
+        )
+        await ctx.send(sender, validation_response)
+
+    async def handle_validation_response(self, ctx: Context, sender: str, msg: ValidationResponse):
+        """Counts one peer's vote, and on consensus, triggers all final actions."""
+        event_id = msg.event_id
+
+        round_ = self.pending_events.get(event_id)
+        # Unknown or decided rounds, outsiders and repeated votes are dropped
+        # before paying for signature verification.
+        if round_ is None or not round_.expects(msg.public_key): return
 
-@validation_protocol.on_message(model=ValidationResponse, replies=set())
-async def handle_validation_response(ctx: Context, sender: str, msg: ValidationResponse):
-    """Collects peer responses, and on consensus, triggers all final actions."""
-    event_id = msg.event_id
-    
-    async with PENDING_LOCK:
-        if event_id not in pending_events: return
-        
-        event = pending_events[event_id]
-        
         response_digest = get_digest({"event_id": msg.event_id, "validated": msg.validated})
         try:
             sender_pub_key = PublicKey(bytes.fromhex(msg.public_key))
@@ -278,30 +352,61 @@ async def handle_validation_response(ctx: Context, sender: str, msg: ValidationR
         except Exception as e:
             ctx.logger.error(f"Signature verification failed for response from {sender}: {e}"); return
 
-        event["responses"].append(msg)
-        
-        raw_data = event["raw_data"]
-        registered_location = read_registry()[raw_data['device_id']]
-        local_group = get_local_peer_group(registered_location)
-        
-        num_peers_in_group = len(local_group) - 1
-        if num_peers_in_group <= 0: return
-
-        positive_responses = sum(1 for res in event["responses"] if res.validated)
-        
-        if positive_responses >= math.ceil(num_peers_in_group * QUORUM_RATIO):
-            ctx.logger.info(f"CONSENSUS REACHED for event {event_id}. Triggering final actions.")
-            await final_actions_after_consensus(ctx, event, registered_location)
-            del pending_events[event_id]
-        
-        elif len(event["responses"]) >= num_peers_in_group:
-            ctx.logger.warning(f"CONSENSUS FAILED for event {event_id}.")
+        outcome = round_.add_vote(msg.public_key, msg.validated)
+        if outcome in (REACHED, FAILED):
+            # Decided: late votes now find no round, and its timer is no longer needed.
+            self.pending_events.pop(event_id)
+            round_expiry.cancel((self.mac_address, event_id))
+            self._record_outcome(outcome)
+
+        # Side effects run off this handler: the outbox persists the event
+        # and delivers it in the background.
+        if outcome == REACHED:
+            ctx.logger.info(f"CONSENSUS REACHED for event {event_id}. Queued for delivery.")
+            pipeline_metrics.record("consensus", round_.elapsed())
+            event = round_.data
+            self.outbox.put({
+                "raw_data": event["raw_data"],
+                "predicted_class": event["predicted_class"],
+                "confidence": event["confidence"],
+                "location": event["location"],
+                "validators": round_.approvers,
+                "orchestrator_address": str(ctx.agent.address),
+            })
+
+        elif outcome == FAILED:
+            ctx.logger.warning(f"CONSENSUS FAILED for event {event_id} ({round_.yes} yes, {round_.no} no, {round_.required} needed).")
             # ... failure cleanup logic would go here
-            del pending_events[event_id]
+
+    # --- Round expiry ---
+    def _record_outcome(self, outcome: str):
+        self.outcomes[outcome] += 1
+        pipeline_metrics.incr(f"consensus_{outcome}")
+
+    def _close_round(self, event_id: str, outcome: str):
+        """Drops an undecided round and counts why (see self.outcomes and the consensus_* metrics)."""
+        round_ = self.pending_events.pop(event_id, None)
+        round_expiry.cancel((self.mac_address, event_id))
+        if round_ is not None and round_.close(outcome):
+            self._record_outcome(outcome)
+
+    def _expire_round(self, key: tuple):
+        """Timer wheel callback, VALIDATION_TIMEOUT after a round was opened."""
+        self._close_round(key[1], TIMED_OUT)
 
 # --- Main Execution ---
 if __name__ == "__main__":
-    agent.include(validation_protocol)
-    print(f"[{AGENT_NAME}] Starting worker agent for MAC {MAC_ADDRESS} at {agent.address}")
-    agent.run()
-
+    # --- Agent & Peer Configuration ---
+    if len(sys.argv) < 2:
+        print(f"Usage: python {sys.argv[0]} <mac_address>")
+        sys.exit(1)
+
+    MAC_ADDRESS = sys.argv[1]
+    CONFIG = registry_cache.get(MAC_ADDRESS)
+    if CONFIG is None:
+        print(f"Error: Could not find configuration for MAC address {MAC_ADDRESS}")
+        sys.exit(1)
+
+    worker = RegionalWorker(MAC_ADDRESS, CONFIG)
+    print(f"[{worker.name}] Starting worker agent for MAC {MAC_ADDRESS} at {worker.agent.address}")
+    worker.agent.run()
@@ -0,0 +1,127 @@
+import sys
+import os
+import re
+# --- Path Configuration ---
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(PROJECT_ROOT)
+
+import asyncio
+from importlib.metadata import version
+
+from uagents import Bureau, Context
+
+from fetch_services.agents.regional_agent import RegionalWorker, registry_cache
+from fetch_services.registry_store import host_port
+
+# How often the host checks the registry for devices newly assigned to it.
+HOST_RELOAD_INTERVAL = 2.0
+# uagents releases whose Bureau internals LateAgentStarter was checked against: [first, last).
+LATE_START_UAGENTS_VERSIONS = ((0, 22), (0, 27))
+
+
+def _release(package: str) -> tuple:
+    """The (major, minor) version of an installed package."""
+    return tuple(int(part) for part in re.findall(r"\d+", version(package))[:2])
+
+
+class LateAgentStarter:
+    """
+    Starts an agent on a Bureau that is already running.
+
+    A Bureau only starts the agents it has when run() is called, and uagents
+    has no public API for a late arrival. This repeats Bureau.run_async()'s
+    per-agent steps instead, which touch its private registration policy, so
+    it only does so on uagents releases it was checked against. On any other
+    release 'supported' is False and the host leaves later devices for its
+    next start.
+    """
+
+    def __init__(self, bureau: Bureau):
+        self.bureau = bureau
+        first, last = LATE_START_UAGENTS_VERSIONS
+        self.supported = first <= _release("uagents") < last and hasattr(bureau, "_registration_policy")
+
+    def start(self, agent):
+        agent.setup()
+        self.bureau._registration_policy.add_agent(agent.info, agent._identity)
+
+
+class WorkerHost:
+    """
+    Runs many regional agents inside one asyncio process.
+
+    Every device assigned to this host in the registry (its 'host_id') gets its
+    own RegionalWorker, with its own identity and keypair, and all of them are
+    served by a single uagents Bureau on one port. The registry view, peer
+    index, consensus engine and IPFS client are module-level in
+    regional_agent.py and therefore shared by every worker in the host.
+    Messages between two workers of the same host are delivered in-process.
+    """
+
+    def __init__(self, host_id: str):
+        self.host_id = host_id
+        self.port = host_port(host_id)
+        self.bureau = Bureau(port=self.port, endpoint=[f"http://127.0.0.1:{self.port}/submit"])
+        self.late_starter = LateAgentStarter(self.bureau)
+        self.workers = {}
+        self._deferred = set()  # devices assigned while running that this uagents release cannot hot-start
+        self._registry_changed = False
+        registry_cache.subscribe(self._on_registry_change)
+        for mac, cfg in self.assigned_devices().items():
+            self.add_worker(mac, cfg)
+
+    def _on_registry_change(self, old, new):
+        self._registry_changed = True
+
+    def assigned_devices(self) -> dict:
+        """Returns the registry entries currently assigned to this host."""
+        return {mac: cfg for mac, cfg in registry_cache.sensors().items() if cfg.get("host_id") == self.host_id}
+
+    def add_worker(self, mac_address: str, config: dict, running: bool = False) -> RegionalWorker:
+        """Creates a worker for one device and adds it to the bureau; starts it too if the bureau is running."""
+        worker = RegionalWorker(mac_address, config, standalone=False)
+        self.workers[mac_address] = worker
+        self.bureau.add(worker.agent)
+        if running:
+            self.late_starter.start(worker.agent)
+        return worker
+
+    async def watch_assignments(self, ctx: Context):
+        """Picks up devices that the registration API assigns to this host while it runs."""
+        while True:
+            await asyncio.sleep(HOST_RELOAD_INTERVAL)
+            registry_cache.refresh()
+            if not self._registry_changed:
+                continue
+            self._registry_changed = False
+            for mac, cfg in self.assigned_devices().items():
+                if mac in self.workers or mac in self._deferred:
+                    continue
+                if not self.late_starter.supported:
+                    self._deferred.add(mac)
+                    ctx.logger.warning(f"[{self.host_id}] MAC {mac} will be hosted from the next "
+                                       f"host start: uagents {version('uagents')} cannot add agents to a running bureau.")
+                    continue
+                worker = self.add_worker(mac, cfg, running=True)
+                ctx.logger.info(f"[{self.host_id}] Hosting {worker.name} for MAC {mac} at {worker.agent.address}")
+
+    def run(self):
+        if not self.workers:
+            print(f"[{self.host_id}] No devices are assigned to this host.")
+            return
+        # The watcher starts with the first worker, on the bureau's own event loop.
+        @next(iter(self.workers.values())).agent.on_event("startup")
+        async def start_host(ctx: Context):
+            ctx.logger.info(f"[{self.host_id}] Worker host running {len(self.workers)} agent(s) on port {self.port}")
+            asyncio.create_task(self.watch_assignments(ctx))
+
+        self.bureau.run()
+
+
+# --- Main Execution ---
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print(f"Usage: python {sys.argv[0]} <host_id>")
+        sys.exit(1)
+
+    WorkerHost(sys.argv[1]).run()
@@ -1,15 +1,24 @@
 import math
+from typing import NamedTuple
+
+import numpy as np
+
+from fetch_services.consensus.distance_table import PairwiseDistanceTable
 
 # --- Tunable Parameters ---
 REFERENCE_DISTANCE = 1.0  # Reference point for inverse-square law
 NOISE_FLOOR_THRESHOLD = 20
 CALIBRATION_MARGIN = 5
 ATTENUATION_COEFFICIENT = 0.02  # fixed for all environments
+EARTH_RADIUS_M = 6371e3
+# The network currently accepts every event: implausible readings are
+# reported ("Accept 0") but still count as a positive vote.
+ACCEPT_IMPLAUSIBLE = True
 
 
 def haversine_distance(lat1, lon1, lat2, lon2):
     """Calculate the great-circle distance in meters between two points on the earth."""
-    R = 6371e3  # Radius of Earth in meters
+    R = EARTH_RADIUS_M  # Radius of Earth in meters
     phi1 = math.radians(lat1)
     phi2 = math.radians(lat2)
     delta_phi = math.radians(lat2 - lat1)
@@ -35,11 +44,87 @@ def expected_decibel_at_distance(source_db, distance):
     return source_db - spreading_loss - absorption_loss
 
 
+def haversine_distances(lat1, lon1, lat2, lon2) -> np.ndarray:
+    """Vectorized haversine_distance: broadcasts over arrays of coordinates (degrees) and returns meters."""
+    phi1 = np.radians(lat1)
+    phi2 = np.radians(lat2)
+    delta_phi = phi2 - phi1
+    delta_lambda = np.radians(np.subtract(lon2, lon1))
+
+    a = np.sin(delta_phi / 2) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin(delta_lambda / 2) ** 2
+    return EARTH_RADIUS_M * 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+
+def path_losses(distance) -> np.ndarray:
+    """Spreading + absorption loss in dB at each distance; what expected_decibel_at_distance subtracts."""
+    distance = np.maximum(distance, REFERENCE_DISTANCE)  # avoid log(0)
+    spreading_loss = 20 * np.log10(distance / REFERENCE_DISTANCE)
+    absorption_loss = ATTENUATION_COEFFICIENT * (distance - REFERENCE_DISTANCE)
+    return spreading_loss + absorption_loss
+
+
+def expected_decibels_at_distances(source_db, distance) -> np.ndarray:
+    """Vectorized expected_decibel_at_distance."""
+    return np.asarray(source_db, dtype=float) - path_losses(distance)
+
+
+def judge_readings(peer_db, expected_db) -> tuple:
+    """
+    The acceptance rules, in one place for validate_batch and validate_event.
+    Works on scalars and arrays alike.
+
+    Returns:
+        (below_noise_floor, plausible, accepted) boolean masks.
+    """
+    peer_db = np.asarray(peer_db, dtype=float)
+    # 1. Temporal check: a quiet peer cannot contradict the event.
+    below_noise_floor = peer_db < NOISE_FLOOR_THRESHOLD
+    # 2. Physics check: the peer should not hear much more than the model predicts.
+    plausible = below_noise_floor | (peer_db <= expected_db + CALIBRATION_MARGIN)
+    accepted = plausible | ACCEPT_IMPLAUSIBLE
+    return below_noise_floor, plausible, accepted
+
+
+class BatchValidation(NamedTuple):
+    """Per-pair results of SmartConsensus.validate_batch; every field is an array of the batch length."""
+    distance: np.ndarray           # orchestrator -> peer distance in meters
+    expected_db: np.ndarray        # level the peer should hear if the event is real
+    below_noise_floor: np.ndarray  # peer reading under NOISE_FLOOR_THRESHOLD (temporal check)
+    plausible: np.ndarray          # reading consistent with the physics model
+    accepted: np.ndarray           # the peer's vote
+
+
 class SmartConsensus:
     """
     Smart, cross-sensor validation with temporal, physics, and consensus checks.
     """
 
+    def __init__(self, registry_cache=None, verbose: bool = False):
+        # Per-peer logging is off by default: validate_event sits on the hot path.
+        self.verbose = verbose
+        # With a registry, distances and losses between registered sensors come
+        # from cached per-neighbourhood tables instead of being recomputed.
+        self.distance_table = None
+        if registry_cache is not None:
+            self.distance_table = PairwiseDistanceTable(registry_cache, haversine_distances, path_losses)
+
+    def validate_batch(self, request_lat, request_lon, request_db, peer_lat, peer_lon, peer_db) -> BatchValidation:
+        """
+        Validates many (request, peer reading) pairs in one NumPy pass.
+
+        Args:
+            request_lat, request_lon, request_db: Orchestrator location and reported level, one per pair.
+            peer_lat, peer_lon, peer_db: The peer's registered location and its own reading, one per pair.
+            Scalars broadcast, e.g. one request against an array of peers.
+
+        Returns:
+            A BatchValidation with distances, expected levels and the plausible/accepted masks.
+        """
+        distance = haversine_distances(request_lat, request_lon, peer_lat, peer_lon)
+        expected_db = expected_decibels_at_distances(request_db, distance)
+        below_noise_floor, plausible, accepted = judge_readings(peer_db, expected_db)
+        return BatchValidation(distance, expected_db, below_noise_floor, plausible, accepted)
+
     def validate_event(
         self,
         request_data: dict,       # Incoming validation request from orchestrator
@@ -49,39 +134,30 @@ class SmartConsensus:
         """
         Validate event with a single peer (temporal + physics check).
         """
-        agent_name = peer_agent_config.get('name', 'PeerAgent')
-        print(f"[{agent_name}] Validating...")
-
-        # 1. Temporal Check
-        if peer_sensor_data['decibel'] < NOISE_FLOOR_THRESHOLD:
-            print(f"  - Accept 0 {peer_sensor_data['decibel']} dB < noise floor {NOISE_FLOOR_THRESHOLD}")
-            return True
-
-        # 2. Physics Check
         orchestrator_location = request_data['location']
+        lat1, lon1 = orchestrator_location['latitude'], orchestrator_location['longitude']
+        lat2, lon2 = peer_agent_config["latitude"], peer_agent_config["longitude"]
 
-        # ✅ fixed: peer config uses flat latitude/longitude
-        peer_location = {
-            "latitude": peer_agent_config["latitude"],
-            "longitude": peer_agent_config["longitude"]
-        }
-
-        distance = haversine_distance(
-            orchestrator_location['latitude'], orchestrator_location['longitude'],
-            peer_location['latitude'], peer_location['longitude']
-        )
-
-        expected_db = expected_decibel_at_distance(
-            request_data['decibel'], distance
-        )
-
-        if peer_sensor_data['decibel'] > expected_db + CALIBRATION_MARGIN:
-            print(f"  - Accept 0: {peer_sensor_data['decibel']} dB at {distance:.1f}m "
-                  f"> expected {expected_db:.1f} dB")
-            return True
-
-        print(f"  - ACCEPT: {peer_sensor_data['decibel']} dB plausible at {distance:.1f}m")
-        return True
+        cached = self.distance_table.lookup(lat1, lon1, lat2, lon2) if self.distance_table else None
+        if cached is not None:
+            distance, loss = cached
+            expected_db = request_data['decibel'] - loss
+        else:
+            distance = haversine_distance(lat1, lon1, lat2, lon2)
+            expected_db = expected_decibel_at_distance(request_data['decibel'], distance)
+
+        peer_db = peer_sensor_data['decibel']
+        below_noise_floor, plausible, accepted = judge_readings(peer_db, expected_db)
+
+        if self.verbose:
+            agent_name = peer_agent_config.get('name', 'PeerAgent')
+            if below_noise_floor:
+                print(f"[{agent_name}] Accept 0 {peer_db} dB < noise floor {NOISE_FLOOR_THRESHOLD}")
+            elif not plausible:
+                print(f"[{agent_name}] Accept 0: {peer_db} dB at {distance:.1f}m > expected {expected_db:.1f} dB")
+            else:
+                print(f"[{agent_name}] ACCEPT: {peer_db} dB plausible at {distance:.1f}m")
+        return bool(accepted)
 
     def consensus_validation(
         self,
@@ -95,21 +171,19 @@ class SmartConsensus:
         Returns:
             bool: True if consensus validates the event, False otherwise.
         """
-        total_weight = 0.0
-        accept_weight = 0.0
-
-        for peer_sensor_data, peer_agent_config in peer_reports:
-            # Ensure peer has latitude/longitude
-            if "latitude" not in peer_agent_config or "longitude" not in peer_agent_config:
-                continue  # or log a warning
-
-            total_weight += 1
-
-            # ✅ call validate_event so weights get updated
-            if self.validate_event(request_data, peer_sensor_data, peer_agent_config):
-                accept_weight += 1
-
-        consensus_score = accept_weight / total_weight if total_weight > 0 else 0
+        # Peers without a registered location cannot be checked and carry no weight.
+        reports = [(data, cfg) for data, cfg in peer_reports if "latitude" in cfg and "longitude" in cfg]
+
+        consensus_score = 0.0
+        if reports:
+            location = request_data['location']
+            result = self.validate_batch(
+                location['latitude'], location['longitude'], request_data['decibel'],
+                np.fromiter((cfg["latitude"] for _, cfg in reports), float, len(reports)),
+                np.fromiter((cfg["longitude"] for _, cfg in reports), float, len(reports)),
+                np.fromiter((data["decibel"] for data, _ in reports), float, len(reports)),
+            )
+            consensus_score = float(result.accepted.mean())
         print(f"\nConsensus Score: {consensus_score:.2f} (threshold={threshold})")
 
         if consensus_score >= threshold:
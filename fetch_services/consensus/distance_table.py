@@ -0,0 +1,157 @@
+import math
+import threading
+from collections import defaultdict
+
+import numpy as np
+
+# --- Tunable Parameters ---
+GRID_SIZE = 0.1  # Cell size in degrees; matches the peer index in regional_agent.py
+TABLE_RING = 1   # Neighbourhood = the (2*ring+1)^2 block of cells around a sensor's cell
+
+
+class NeighbourhoodTable:
+    """Distances and path losses from every sensor location in one cell to every location around it."""
+
+    __slots__ = ("rows", "cols", "distance", "loss")
+
+    def __init__(self, row_coords: list, col_coords: list, distance_fn, loss_fn):
+        self.rows = {coord: i for i, coord in enumerate(row_coords)}
+        self.cols = {coord: j for j, coord in enumerate(col_coords)}
+        row_lat, row_lon = np.array(row_coords, dtype=float).reshape(-1, 2).T
+        col_lat, col_lon = np.array(col_coords, dtype=float).reshape(-1, 2).T
+        self.distance = distance_fn(row_lat[:, None], row_lon[:, None], col_lat[None, :], col_lon[None, :])
+        # Everything expected_decibel_at_distance subtracts from the source level.
+        self.loss = loss_fn(self.distance)
+
+    def row(self, origin: tuple):
+        """Returns (cols, distances, losses) for one origin, as plain Python lists for fast scalar access."""
+        i = self.rows[origin]
+        return self.cols, self.distance[i].tolist(), self.loss[i].tolist()
+
+
+class PairwiseDistanceTable:
+    """
+    Cached orchestrator -> peer distances and attenuation for registered sensors.
+
+    Sensor locations practically never change, so for every grid cell the
+    distances from each location in the cell to each location in its
+    neighbourhood are computed once, as one NumPy matrix, together with the
+    spreading + absorption loss at that distance. A validation then costs two
+    dict lookups and a subtraction (source_db - loss) instead of a haversine
+    and a log10.
+
+    Tables are built lazily per cell and dropped only when a registry change
+    touches a cell in their neighbourhood. Locations that are not registered
+    (e.g. a replayed historical reading) simply miss and are computed directly.
+    """
+
+    def __init__(self, registry_cache, distance_fn, loss_fn, grid_size: float = GRID_SIZE, ring: int = TABLE_RING):
+        self.grid_size = grid_size
+        self.ring = ring
+        self._distance_fn = distance_fn
+        self._loss_fn = loss_fn
+        self._lock = threading.Lock()
+        self._members = defaultdict(set)  # cell -> {(lat, lon)} of registered sensors
+        self._refcount = defaultdict(int) # (lat, lon) -> sensors at that exact location
+        self._tables = {}                 # cell -> NeighbourhoodTable
+        self._origins = {}                # (lat, lon) -> NeighbourhoodTable.row(), the lookup fast path
+        self.hits = 0
+        self.misses = 0
+        for cfg in registry_cache.sensors().values():
+            self._add(cfg)
+        registry_cache.subscribe(self._on_registry_change)
+
+    def cell_of(self, latitude: float, longitude: float) -> tuple:
+        return (math.floor(latitude / self.grid_size), math.floor(longitude / self.grid_size))
+
+    # --- Maintenance ---
+    @staticmethod
+    def _coord(cfg: dict) -> tuple:
+        return (float(cfg["latitude"]), float(cfg["longitude"]))
+
+    def _add(self, cfg: dict) -> tuple:
+        coord = self._coord(cfg)
+        self._refcount[coord] += 1
+        cell = self.cell_of(*coord)
+        self._members[cell].add(coord)
+        return cell
+
+    def _remove(self, cfg: dict) -> tuple:
+        coord = self._coord(cfg)
+        cell = self.cell_of(*coord)
+        self._refcount[coord] -= 1
+        if self._refcount[coord] <= 0:
+            del self._refcount[coord]
+            self._members[cell].discard(coord)
+            if not self._members[cell]:
+                del self._members[cell]
+        return cell
+
+    def _on_registry_change(self, old: dict, new: dict):
+        """Updates cell membership and drops only the tables whose neighbourhood changed."""
+        dirty = set()
+        with self._lock:
+            for mac, cfg in new.items():
+                if mac.startswith('_'):
+                    continue
+                previous = old.get(mac)
+                if previous is not None and self._coord(previous) == self._coord(cfg):
+                    continue
+                if previous is not None:
+                    dirty.add(self._remove(previous))
+                dirty.add(self._add(cfg))
+            for mac, cfg in old.items():
+                if not mac.startswith('_') and mac not in new:
+                    dirty.add(self._remove(cfg))
+            for row, col in dirty:
+                for d_row in range(-self.ring, self.ring + 1):
+                    for d_col in range(-self.ring, self.ring + 1):
+                        self._tables.pop((row + d_row, col + d_col), None)
+            if dirty:
+                self._origins = {}
+
+    def _table_for(self, cell: tuple):
+        table = self._tables.get(cell)
+        if table is None:
+            with self._lock:
+                rows = sorted(self._members.get(cell, ()))
+                if not rows:
+                    return None
+                row, col = cell
+                cols = sorted(coord
+                              for d_row in range(-self.ring, self.ring + 1)
+                              for d_col in range(-self.ring, self.ring + 1)
+                              for coord in self._members.get((row + d_row, col + d_col), ()))
+                table = NeighbourhoodTable(rows, cols, self._distance_fn, self._loss_fn)
+                self._tables[cell] = table
+        return table
+
+    # --- Lookups ---
+    def lookup(self, lat1: float, lon1: float, lat2: float, lon2: float):
+        """
+        Returns:
+            (distance_m, loss_db) for two registered locations in the same
+            neighbourhood, or None if the pair is not covered by a table.
+        """
+        row = self._origins.get((lat1, lon1))
+        if row is None:
+            origin = (float(lat1), float(lon1))
+            cell = self.cell_of(*origin)
+            table = self._table_for(cell)
+            if table is None or origin not in table.rows:
+                self.misses += 1
+                return None
+            row = table.row(origin)
+            with self._lock:
+                if self._tables.get(cell) is table:  # not invalidated in the meantime
+                    self._origins[origin] = row
+        cols, distances, losses = row
+        j = cols.get((lat2, lon2))
+        if j is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return distances[j], losses[j]
+
+    def stats(self) -> dict:
+        return {"tables": len(self._tables), "locations": len(self._refcount), "hits": self.hits, "misses": self.misses}
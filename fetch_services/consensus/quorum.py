@@ -0,0 +1,131 @@
+import math
+import time
+
+# --- Round outcomes ---
+PENDING = "pending"
+REACHED = "reached"
+FAILED = "failed"
+TIMED_OUT = "timed_out"  # not enough votes before the validation timeout
+EVICTED = "evicted"      # dropped to make room under the in-flight cap
+
+# Share of the expected voters whose approval validates an event.
+QUORUM_RATIO = 0.45
+
+
+class QuorumRound:
+    """
+    The vote count of one pending consensus event.
+
+    The set of expected voters (peer public keys) is fixed when the round is
+    created, so a response is an O(1) update: votes from keys outside the set
+    and repeated votes are ignored, and the round decides as soon as quorum is
+    reached, or as soon as it can no longer be reached with the votes left.
+
+    Args:
+        event_id: The event being validated.
+        voters: Public keys (hex) of the peers asked to validate it.
+        data: Whatever the orchestrator needs once the round is decided.
+        ratio: Share of voters that must approve.
+    """
+
+    __slots__ = ("event_id", "voters", "required", "data", "started", "yes", "no", "voted", "approvers", "outcome")
+
+    def __init__(self, event_id: str, voters, data=None, ratio: float = QUORUM_RATIO):
+        self.event_id = event_id
+        self.voters = frozenset(voters)
+        self.required = math.ceil(len(self.voters) * ratio)
+        self.data = data
+        self.started = time.perf_counter()
+        self.yes = 0
+        self.no = 0
+        self.voted = set()
+        self.approvers = []  # public keys of the approving peers, in arrival order
+        self.outcome = PENDING
+
+    def expects(self, public_key: str) -> bool:
+        """True if a vote from public_key would still count."""
+        return self.outcome == PENDING and public_key in self.voters and public_key not in self.voted
+
+    def add_vote(self, public_key: str, approve: bool) -> str:
+        """
+        Records one vote and returns the round's outcome afterwards. Only the
+        vote that decides the round returns REACHED or FAILED; votes arriving
+        after that (or not expected at all) return PENDING and change nothing.
+        """
+        if not self.expects(public_key):
+            return PENDING
+        self.voted.add(public_key)
+        if approve:
+            self.yes += 1
+            self.approvers.append(public_key)
+        else:
+            self.no += 1
+
+        if self.yes >= self.required:
+            self.outcome = REACHED
+        elif self.yes + self.remaining() < self.required:
+            self.outcome = FAILED
+        return self.outcome
+
+    def close(self, outcome: str = TIMED_OUT) -> bool:
+        """Ends a round that is still pending without a decision. Returns False if it was already decided."""
+        if self.outcome != PENDING:
+            return False
+        self.outcome = outcome
+        return True
+
+    def remaining(self) -> int:
+        """Votes still expected."""
+        return len(self.voters) - len(self.voted)
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+
+# --- Pending round store ---
+PENDING_SHARDS = 16
+
+
+class PendingRounds:
+    """
+    The undecided rounds of one worker, split into shards by event_id.
+
+    No locks are needed: the check-verify-vote sequence of a round never
+    awaits, so on one event loop it runs to completion before any other
+    handler or timer callback touches the store. Callers take a decided round
+    out of the store before doing any I/O (IPFS, Notary, ingest).
+    """
+
+    def __init__(self, shards: int = PENDING_SHARDS):
+        self._shards = [dict() for _ in range(shards)]
+
+    def _index(self, event_id: str) -> int:
+        # Event ids are hex SHA-256 digests; their prefix is already uniform.
+        try:
+            return int(event_id[:8], 16) % len(self._shards)
+        except ValueError:
+            return hash(event_id) % len(self._shards)
+
+    def __len__(self) -> int:
+        return sum(len(shard) for shard in self._shards)
+
+    def __contains__(self, event_id: str) -> bool:
+        return event_id in self._shards[self._index(event_id)]
+
+    def get(self, event_id: str):
+        return self._shards[self._index(event_id)].get(event_id)
+
+    def put(self, round_: QuorumRound) -> QuorumRound:
+        """
+        Stores a new round. If one is already pending for the same event_id
+        (a re-delivered event), it is kept with its votes and returned instead.
+        """
+        return self._shards[self._index(round_.event_id)].setdefault(round_.event_id, round_)
+
+    def pop(self, event_id: str, default=None):
+        return self._shards[self._index(event_id)].pop(event_id, default)
+
+    def oldest(self):
+        """Returns the event_id of the longest-pending round, or None."""
+        heads = [next(iter(shard.values())) for shard in self._shards if shard]
+        return min(heads, key=lambda r: r.started).event_id if heads else None
@@ -0,0 +1,132 @@
+import base64
+import hashlib
+import math
+import struct
+from collections import OrderedDict
+
+try:
+    from config.settings import NOTARY_DEDUP_WINDOW, NOTARY_DEDUP_CAPACITY, NOTARY_DEDUP_ERROR_RATE
+except ImportError:
+    NOTARY_DEDUP_WINDOW = 100000
+    NOTARY_DEDUP_CAPACITY = 1000000
+    NOTARY_DEDUP_ERROR_RATE = 1e-6
+
+
+class BloomFilter:
+    """
+    A fixed-size Bloom filter over string keys, sized for capacity keys at
+    error_rate false positives. Bit positions come from double hashing of one
+    BLAKE2b digest per key.
+    """
+
+    def __init__(self, capacity: int, error_rate: float, bits: bytearray = None, count: int = 0):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bits if bits is not None else bytearray((self.size + 7) // 8)
+        self.count = count
+
+    def _positions(self, key: str):
+        h1, h2 = struct.unpack("<QQ", hashlib.blake2b(key.encode(), digest_size=16).digest())
+        h2 |= 1
+        size = self.size
+        return [(h1 + i * h2) % size for i in range(self.hashes)]
+
+    def add(self, key: str):
+        bits = self.bits
+        for position in self._positions(key):
+            bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        bits = self.bits
+        for position in self._positions(key):
+            if not bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+    @property
+    def nbytes(self) -> int:
+        return (self.size + 7) // 8
+
+    def to_dict(self, include_bits: bool = True) -> dict:
+        state = {"capacity": self.capacity, "error_rate": self.error_rate, "count": self.count}
+        if include_bits:
+            state["bits"] = base64.b64encode(bytes(self.bits)).decode("ascii")
+        return state
+
+    @classmethod
+    def from_dict(cls, state: dict, bits: bytearray = None) -> "BloomFilter":
+        """bits, if given, replaces the state's own (for filters stored outside the dict)."""
+        if bits is None:
+            bits = bytearray(base64.b64decode(state["bits"]))
+        return cls(state["capacity"], state["error_rate"], bits, state["count"])
+
+
+class FactIndex:
+    """
+    Remembers which facts the Notary has already accepted.
+
+    The most recent window keys are kept exactly, in insertion order, so a
+    repeat of a recent fact (retries and duplicate deliveries arrive within
+    seconds) is always recognised. Keys only move to a Bloom filter when they
+    fall out of the window, so adding a key is usually a dict insert: a repeat
+    of an old fact is still recognised, at the cost of wrongly rejecting a
+    new fact with probability error_rate. Once a filter holds
+    capacity keys it becomes the previous generation and a fresh one takes
+    over, so memory stays bounded and keys are remembered for at least
+    window + capacity more facts.
+    """
+
+    def __init__(self, window: int = NOTARY_DEDUP_WINDOW, capacity: int = NOTARY_DEDUP_CAPACITY,
+                 error_rate: float = NOTARY_DEDUP_ERROR_RATE):
+        self.window = window
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.recent = OrderedDict()
+        self.current = BloomFilter(capacity, error_rate)
+        self.previous = None
+
+    @staticmethod
+    def fact_key(mac_address: str, timestamp: float) -> str:
+        """The identity of a fact: one reading per device and timestamp."""
+        return f"{mac_address}|{timestamp!r}"
+
+    def __contains__(self, key: str) -> bool:
+        if key in self.recent:
+            return True
+        return key in self.current or (self.previous is not None and key in self.previous)
+
+    def add(self, key: str):
+        self.recent[key] = None
+        if len(self.recent) > self.window:
+            expired, _ = self.recent.popitem(last=False)
+            if self.current.count >= self.capacity:
+                self.previous, self.current = self.current, BloomFilter(self.capacity, self.error_rate)
+            self.current.add(expired)
+
+    def filters(self) -> list:
+        """The Bloom filter generations, current first."""
+        return [self.current] if self.previous is None else [self.current, self.previous]
+
+    def to_dict(self, include_bits: bool = True) -> dict:
+        """
+        Args:
+            include_bits: False leaves the filters' bits out, for callers that
+                store filters() separately as raw bytes.
+        """
+        return {"window": self.window, "recent": list(self.recent),
+                "current": self.current.to_dict(include_bits),
+                "previous": self.previous.to_dict(include_bits) if self.previous is not None else None}
+
+    @classmethod
+    def from_dict(cls, state: dict, bits: list = None) -> "FactIndex":
+        """bits, if given, holds the bits of each of filters() in order."""
+        bits = bits or [None, None]
+        current = BloomFilter.from_dict(state["current"], bits[0])
+        index = cls(state["window"], current.capacity, current.error_rate)
+        index.recent = OrderedDict.fromkeys(state["recent"])
+        index.current = current
+        index.previous = BloomFilter.from_dict(state["previous"], bits[1]) if state["previous"] else None
+        return index
@@ -0,0 +1,110 @@
+import asyncio
+
+import aiohttp
+
+from fetch_services.metrics import pipeline_metrics
+
+try:
+    from config.settings import INGEST_API_URL, INGEST_BULK_URL, INGEST_LINGER, INGEST_BATCH_MAX
+except ImportError:
+    INGEST_API_URL = "http://localhost:5001/ingest"
+    INGEST_BULK_URL = "http://localhost:5001/ingest/bulk"
+    INGEST_LINGER = 0.05
+    INGEST_BATCH_MAX = 500
+
+# --- Tunable Parameters ---
+INGEST_MAX_CONNECTIONS = 8
+INGEST_TIMEOUT = 10.0
+
+
+class IngestClient:
+    """
+    A long-lived client for the ingestion API.
+
+    All packets go through one pooled aiohttp session. With a linger above
+    zero, packets sent within linger seconds of each other (from any worker in
+    the process) are coalesced into one POST of a JSON array to the bulk
+    endpoint, sent early once max_batch packets are waiting. With linger=0
+    every packet is POSTed to the single-packet endpoint on its own.
+
+    send_many() returns once its packets have been accepted and raises if the
+    request carrying them failed, so callers such as the outbox can retry.
+    """
+
+    def __init__(self, url: str = INGEST_API_URL, bulk_url: str = INGEST_BULK_URL,
+                 linger: float = INGEST_LINGER, max_batch: int = INGEST_BATCH_MAX,
+                 max_connections: int = INGEST_MAX_CONNECTIONS, timeout: float = INGEST_TIMEOUT):
+        self.url = url
+        self.bulk_url = bulk_url
+        self.linger = linger
+        self.max_batch = max(1, max_batch)
+        self.max_connections = max_connections
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self._session = None
+        self._batch = []          # packets waiting for the next bulk POST
+        self._batch_sent = None   # future resolved when they have been accepted
+        self._linger_timer = None
+        self._posts = set()       # bulk POSTs in progress
+
+    def _ensure_session(self) -> aiohttp.ClientSession:
+        # Created on first use so that it belongs to the running event loop.
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.max_connections)
+            self._session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+        return self._session
+
+    async def send_many(self, packets: list):
+        """Delivers EnrichedData packets (as dicts). Raises if any of them was not accepted."""
+        if not packets:
+            return
+        if self.linger <= 0:
+            await asyncio.gather(*(self._post(self.url, packet) for packet in packets))
+            return
+
+        loop = asyncio.get_running_loop()
+        waiting = []  # the batches these packets went into; more than one if they did not fit
+        while packets:
+            if self._batch_sent is None:
+                self._batch_sent = loop.create_future()
+                self._linger_timer = loop.call_later(self.linger, self._flush)
+            room = self.max_batch - len(self._batch)
+            self._batch.extend(packets[:room])
+            packets = packets[room:]
+            waiting.append(self._batch_sent)
+            if len(self._batch) >= self.max_batch:
+                self._flush()
+        # shield(): one caller giving up must not fail the POST other callers are waiting for.
+        await asyncio.shield(asyncio.gather(*waiting))
+
+    def _flush(self):
+        """Closes the waiting batch and starts its POST."""
+        if self._batch_sent is None:
+            return
+        self._linger_timer.cancel()
+        batch, batch_sent = self._batch, self._batch_sent
+        self._batch, self._batch_sent, self._linger_timer = [], None, None
+        task = asyncio.get_running_loop().create_task(self._post_batch(batch, batch_sent))
+        self._posts.add(task)
+        task.add_done_callback(self._posts.discard)
+
+    async def _post_batch(self, batch: list, batch_sent: asyncio.Future):
+        try:
+            await self._post(self.bulk_url, batch)
+            batch_sent.set_result(None)
+        except Exception as e:
+            batch_sent.set_exception(e)
+            batch_sent.exception()  # retrieved here, so a batch nobody awaits any more is not reported
+
+    async def _post(self, url: str, body):
+        with pipeline_metrics.timer("ingest_post"):
+            async with self._ensure_session().post(url, json=body) as response:
+                response.raise_for_status()
+
+    async def close(self):
+        """Sends any waiting batch and closes the pooled connections."""
+        self._flush()
+        if self._posts:
+            await asyncio.gather(*self._posts, return_exceptions=True)
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
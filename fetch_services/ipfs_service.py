@@ -1,24 +1,229 @@
-import requests
+import asyncio
+import base64
+import hashlib
 import json
+import os
+import random
+import tempfile
+import time
+from collections import OrderedDict
+
+import aiohttp
+
+from fetch_services.metrics import pipeline_metrics
 
 # You will need to get a free API token from https://web3.storage/
 # and add it to your config.py file.
 try:
-    from config.settings import WEB3_STORAGE_TOKEN
+    from config.settings import (
+        WEB3_STORAGE_TOKEN, WEB3_STORAGE_UPLOAD_URL, IPFS_BACKEND, IPFS_LOCAL_STORE_DIR,
+        IPFS_MAX_CONCURRENCY, IPFS_TIMEOUT, IPFS_RETRIES,
+        IPFS_BATCH_WINDOW, IPFS_BATCH_MAX_RECORDS, IPFS_BATCH_MAX_BYTES,
+        IPFS_DEDUP_SIZE, IPFS_DEDUP_TTL,
+    )
 except ImportError:
     WEB3_STORAGE_TOKEN = "YOUR_WEB3_STORAGE_API_TOKEN"
+    WEB3_STORAGE_UPLOAD_URL = "https://api.web3.storage/upload"
+    IPFS_BACKEND = "web3storage"
+    IPFS_LOCAL_STORE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "ipfs_store")
+    IPFS_MAX_CONCURRENCY = 16
+    IPFS_TIMEOUT = 10.0
+    IPFS_RETRIES = 3
+    IPFS_BATCH_WINDOW = 0.0
+    IPFS_BATCH_MAX_RECORDS = 1000
+    IPFS_BATCH_MAX_BYTES = 4 * 1024 * 1024
+    IPFS_DEDUP_SIZE = 10000
+    IPFS_DEDUP_TTL = 3600.0
+
+IPFS_GATEWAY = "https://w3s.link/ipfs"
+# Status codes worth another attempt; anything else is the request's fault.
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+RETRY_BACKOFF = 0.5  # First retry delay in seconds, doubled per attempt
+
+
+def compute_cid(content: bytes) -> str:
+    """
+    The CIDv1 (raw codec, sha2-256, base32) of a block of bytes, as IPFS
+    would address the same bytes stored as a single raw block.
+    """
+    digest = hashlib.sha256(content).digest()
+    cid_bytes = bytes([0x01, 0x55, 0x12, 0x20]) + digest  # version, raw, sha2-256, 32-byte digest
+    return "b" + base64.b32encode(cid_bytes).decode("ascii").lower().rstrip("=")
+
+
+def canonical_json(data: dict) -> bytes:
+    """A stable encoding of a JSON document: equal dicts always give equal bytes."""
+    return json.dumps(data, sort_keys=True, separators=(",", ":")).encode()
+
+
+def parse_bundle_link(link: str) -> tuple:
+    """
+    Splits a link returned in batching mode into (cid, line). line is the
+    1-based line of the record in the newline-delimited JSON bundle, or None
+    for a link to a standalone document.
+    """
+    path, _, fragment = link.partition("#L")
+    cid = path.rsplit("/", 1)[-1]
+    return cid, int(fragment) if fragment else None
 
 
+def bundle_record(content: bytes, line: int) -> dict:
+    """Returns one record of a downloaded NDJSON bundle."""
+    return json.loads(content.split(b"\n")[line - 1])
+
+
+class Web3StorageBackend:
+    """
+    Uploads to web3.storage over one pooled aiohttp session.
+
+    At most max_concurrency uploads are in flight at once (further calls wait
+    for a slot), each attempt is bounded by timeout seconds, and connection
+    errors, timeouts and 408/429/5xx responses are retried with exponential
+    backoff up to retries extra attempts.
+    """
+
+    def __init__(self, token: str, upload_url: str, max_concurrency: int = IPFS_MAX_CONCURRENCY,
+                 timeout: float = IPFS_TIMEOUT, retries: int = IPFS_RETRIES):
+        self.token = token
+        self.upload_url = upload_url
+        self.max_concurrency = max_concurrency
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.retries = retries
+        self._session = None
+        self._slots = None
+
+    def _ensure_session(self):
+        # Created on first use so that they belong to the running event loop.
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.max_concurrency)
+            self._session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+            self._slots = asyncio.Semaphore(self.max_concurrency)
+
+    async def put(self, content: bytes, content_type: str = "application/json") -> str:
+        """Uploads content and returns its CID. Raises once the retries are used up."""
+        self._ensure_session()
+        headers = {"Authorization": f"Bearer {self.token}", "Content-Type": content_type}
+        for attempt in range(self.retries + 1):
+            try:
+                async with self._slots:
+                    async with self._session.post(self.upload_url, headers=headers, data=content) as response:
+                        if response.status in RETRYABLE_STATUS and attempt < self.retries:
+                            raise aiohttp.ClientResponseError(
+                                response.request_info, response.history, status=response.status)
+                        response.raise_for_status()
+                        result = await response.json(content_type=None)
+                cid = result.get("cid")
+                if not cid:
+                    raise ValueError("no_cid")
+                return cid
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                retryable = not isinstance(e, aiohttp.ClientResponseError) or e.status in RETRYABLE_STATUS
+                if not retryable or attempt == self.retries:
+                    raise
+                await asyncio.sleep(RETRY_BACKOFF * 2 ** attempt * random.uniform(0.5, 1.0))
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+
+class LocalContentStore:
+    """
+    A content-addressed store on the local filesystem, standing in for IPFS in
+    tests, benchmarks and offline deployments.
+
+    Content is written once under root/<last two CID chars>/<cid>; putting the
+    same bytes again is a no-op and returns the same CID. File I/O runs in a
+    thread so it never blocks the event loop.
+    """
+
+    def __init__(self, root: str = IPFS_LOCAL_STORE_DIR):
+        self.root = root
+
+    def path_of(self, cid: str) -> str:
+        return os.path.join(self.root, cid[-2:], cid)
+
+    def _write(self, cid: str, content: bytes):
+        path = self.path_of(cid)
+        if os.path.exists(path):
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # A temp file of its own per write: threads of one process may store the same CID at once.
+        with tempfile.NamedTemporaryFile(dir=os.path.dirname(path), prefix=f"{cid}.", suffix=".tmp", delete=False) as f:
+            f.write(content)
+        try:
+            os.replace(f.name, path)
+        except OSError:
+            os.unlink(f.name)
+            raise
+
+    async def put(self, content: bytes, content_type: str = "application/json") -> str:
+        cid = compute_cid(content)
+        await asyncio.to_thread(self._write, cid, content)
+        return cid
+
+    def get(self, cid: str) -> bytes:
+        """Returns stored content, or None if the CID is unknown."""
+        try:
+            with open(self.path_of(cid), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    async def close(self):
+        pass
+
 
 class IPFSService:
     """
     A service class to handle uploading data to decentralized storage via IPFS.
-    This implementation uses the web3.storage gateway.
+
+    IPFS_BACKEND selects web3.storage ("web3storage", the default) or the
+    local content-addressed store ("local"). Either way upload_json() is fully
+    asynchronous and never blocks the event loop.
+
+    With a batch_window above zero, the service runs in batching mode: records
+    are collected into one newline-delimited JSON bundle, which is uploaded
+    when the window closes or the bundle reaches batch_max_records or
+    batch_max_bytes. Each caller then gets a link to its own line of the
+    bundle ("<gateway>/<bundle cid>#L<line>", see parse_bundle_link), so one
+    upload covers every event of the window.
+
+    Uploads are deduplicated by the SHA-256 of the canonical JSON: repeat
+    content within dedup_ttl seconds gets the link of its first upload from an
+    LRU cache of dedup_size entries, and concurrent uploads of the same content
+    share one request.
     """
 
-    def __init__(self):
+    def __init__(self, backend=None, batch_window: float = IPFS_BATCH_WINDOW,
+                 batch_max_records: int = IPFS_BATCH_MAX_RECORDS, batch_max_bytes: int = IPFS_BATCH_MAX_BYTES,
+                 dedup_size: int = IPFS_DEDUP_SIZE, dedup_ttl: float = IPFS_DEDUP_TTL):
         self.token = WEB3_STORAGE_TOKEN
-        self.upload_url = "https://api.web3.storage/upload"
+        self.upload_url = WEB3_STORAGE_UPLOAD_URL
+        if backend is None:
+            if IPFS_BACKEND == "local":
+                backend = LocalContentStore(IPFS_LOCAL_STORE_DIR)
+            elif self.token and "YOUR" not in self.token:
+                backend = Web3StorageBackend(self.token, self.upload_url)
+        self.backend = backend
+
+        # --- Batching Mode ---
+        self.batch_window = batch_window
+        self.batch_max_records = batch_max_records
+        self.batch_max_bytes = batch_max_bytes
+        self._bundle = []        # encoded NDJSON lines of the open bundle
+        self._bundle_bytes = 0
+        self._bundle_cid = None  # future resolved with the open bundle's CID
+        self._flush_timer = None
+        self._flushes = set()    # bundle uploads in progress
+        self.bundles_uploaded = 0
+
+        # --- Deduplication ---
+        self.dedup_size = dedup_size
+        self.dedup_ttl = dedup_ttl
+        self._links = OrderedDict()  # content hash -> (link, expires at), least recently used first
+        self._in_flight = {}         # content hash -> upload task
 
     async def upload_json(self, data: dict) -> str:
         """
@@ -28,31 +233,97 @@ class IPFSService:
             data: The dictionary to upload.
 
         Returns:
-            The IPFS CID (Content Identifier) string, or an error message.
+            The gateway link of the content (of its bundle line in batching
+            mode), or an error message.
         """
-        if not self.token or "YOUR" in self.token:
+        if self.backend is None:
             print("WARNING: WEB3_STORAGE_TOKEN is not configured. Cannot upload to IPFS.")
             return "ipfs_not_configured"
-            
-        headers = {
-            "Authorization": f"Bearer {self.token}",
-            "Content-Type": "application/json"
-        }
-        
-        # The web3.storage API expects the file content directly in the body.
-        payload = json.dumps(data)
-        
+
+        encoded = canonical_json(data)
+        if self.dedup_size <= 0:
+            return await self._upload(encoded)
+
+        key = hashlib.sha256(encoded).hexdigest()
+        cached = self._links.get(key)
+        if cached is not None:
+            link, expires = cached
+            if expires > time.monotonic():
+                self._links.move_to_end(key)
+                pipeline_metrics.incr("ipfs_dedup_hits")
+                return link
+            del self._links[key]
+
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.get_running_loop().create_task(self._upload(encoded))
+            self._in_flight[key] = task
+            task.add_done_callback(lambda done: self._remember(key, done))
+        else:
+            pipeline_metrics.incr("ipfs_coalesced")
+        # shield(): one caller giving up must not cancel the upload the others are waiting for.
+        return await asyncio.shield(task)
+
+    async def _upload(self, encoded: bytes) -> str:
         try:
-            # Using requests for simplicity as it's a synchronous call.
-            # For a highly concurrent system, an async library like httpx would be better.
-            response = requests.post(self.upload_url, headers=headers, data=payload)
-            response.raise_for_status()  # This will raise an exception for HTTP errors
-            result = response.json()
-            cid = result.get("cid")
-            if cid:
-                return f"https://w3s.link/ipfs/{cid}"
-            else:
-                return "upload_failed_no_cid"
-        except requests.exceptions.RequestException as e:
+            if self.batch_window > 0:
+                cid, line = await self._add_to_bundle(encoded)
+                return f"{IPFS_GATEWAY}/{cid}#L{line}"
+            cid = await self.backend.put(encoded)
+            return f"{IPFS_GATEWAY}/{cid}"
+        except Exception as e:
             print(f"IPFS upload failed: {e}")
             return f"upload_failed_{e}"
+
+    def _remember(self, key: str, task: asyncio.Task):
+        """Caches the link of a finished upload; failures are not cached, so a repeat retries."""
+        self._in_flight.pop(key, None)
+        if task.cancelled() or task.exception() is not None or task.result().startswith("upload_failed"):
+            return
+        self._links[key] = (task.result(), time.monotonic() + self.dedup_ttl)
+        self._links.move_to_end(key)
+        while len(self._links) > self.dedup_size:
+            self._links.popitem(last=False)
+
+    # --- Batching Mode ---
+    async def _add_to_bundle(self, encoded: bytes) -> tuple:
+        loop = asyncio.get_running_loop()
+        if self._bundle_cid is None:
+            self._bundle_cid = loop.create_future()
+            self._flush_timer = loop.call_later(self.batch_window, self._flush_bundle)
+        self._bundle.append(encoded)
+        self._bundle_bytes += len(encoded) + 1
+        line, bundle_cid = len(self._bundle), self._bundle_cid
+        if len(self._bundle) >= self.batch_max_records or self._bundle_bytes >= self.batch_max_bytes:
+            self._flush_bundle()
+        # shield(): a cancelled caller must not cancel the CID every other caller is waiting for.
+        return await asyncio.shield(bundle_cid), line
+
+    def _flush_bundle(self):
+        """Closes the open bundle and starts its upload."""
+        if self._bundle_cid is None:
+            return
+        self._flush_timer.cancel()
+        content = b"\n".join(self._bundle) + b"\n"
+        bundle_cid = self._bundle_cid
+        self._bundle, self._bundle_bytes, self._bundle_cid, self._flush_timer = [], 0, None, None
+        task = asyncio.get_running_loop().create_task(self._upload_bundle(content, bundle_cid))
+        self._flushes.add(task)
+        task.add_done_callback(self._flushes.discard)
+
+    async def _upload_bundle(self, content: bytes, bundle_cid: asyncio.Future):
+        try:
+            cid = await self.backend.put(content, content_type="application/x-ndjson")
+            self.bundles_uploaded += 1
+            bundle_cid.set_result(cid)
+        except Exception as e:
+            bundle_cid.set_exception(e)
+            bundle_cid.exception()  # retrieved here, so a bundle nobody awaits any more is not reported
+
+    async def close(self):
+        """Uploads any open bundle and releases the backend's pooled connections."""
+        self._flush_bundle()
+        if self._flushes:
+            await asyncio.gather(*self._flushes, return_exceptions=True)
+        if self.backend is not None:
+            await self.backend.close()
@@ -0,0 +1,212 @@
+import sys
+import os
+import re
+import math
+import time
+import asyncio
+from datetime import datetime, timezone
+
+# --- Path Configuration ---
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(PROJECT_ROOT)
+
+from fetch_services.knowledge_graph import KnowledgeGraphWriter, open_graph_store
+
+try:
+    from config.settings import KNOWLEDGE_GRAPH_RAW_HORIZON, KNOWLEDGE_GRAPH_HOURLY_HORIZON
+except ImportError:
+    KNOWLEDGE_GRAPH_RAW_HORIZON = 7 * 24 * 3600.0
+    KNOWLEDGE_GRAPH_HOURLY_HORIZON = 90 * 24 * 3600.0
+
+# --- Atoms ---
+LOCATION_ATOM = re.compile(r'\(location (\S+) ')
+EVENT_ATOM = re.compile(r'\(noise_event (\S+) (\S+) "([^"]+)" (\d+\.?\d*)\)')
+# (noise_summary <hour|day> <loc_id> "<period start>" <count> <total> <max> <energy> <night count> <night total>)
+# The fields are the sums of a Rollup, written exactly, so summaries merge without rounding errors.
+SUMMARY_ATOM = re.compile(r'\(noise_summary (hour|day) (\S+) "([^"]+)" (\d+) (\S+) (\S+) (\S+) (\d+) (\S+)\)')
+
+
+def parse_timestamp(timestamp: str):
+    """A noise_event timestamp as an aware UTC datetime, or None if it cannot be read."""
+    try:
+        moment = datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.astimezone(timezone.utc)
+
+
+def is_night(moment: datetime) -> bool:
+    """Night is 22:00-06:00, as in the fleet manager's night averages."""
+    return moment.hour >= 22 or moment.hour < 6
+
+
+class Rollup:
+    """
+    Summary statistics of the noise events of one location over one period.
+
+    Every field is a count, sum or maximum, so rollups of adjacent periods (or
+    of late events for a period already summarised) merge exactly. Leq, the
+    equivalent continuous level, is kept as the sum of linear energies.
+    Summary atoms carry these fields, not the derived means, so a rollup read
+    back from one is the rollup that was written.
+    """
+
+    __slots__ = ("count", "total", "maximum", "energy", "night_count", "night_total")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.maximum = 0.0
+        self.energy = 0.0
+        self.night_count = 0
+        self.night_total = 0.0
+
+    def add(self, db: float, night: bool):
+        self.count += 1
+        self.total += db
+        self.maximum = max(self.maximum, db)
+        self.energy += 10 ** (db / 10)
+        if night:
+            self.night_count += 1
+            self.night_total += db
+
+    def merge(self, other: "Rollup"):
+        self.count += other.count
+        self.total += other.total
+        self.maximum = max(self.maximum, other.maximum)
+        self.energy += other.energy
+        self.night_count += other.night_count
+        self.night_total += other.night_total
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    @property
+    def leq(self) -> float:
+        return 10 * math.log10(self.energy / self.count) if self.count else 0.0
+
+    @property
+    def night_mean(self) -> float:
+        return self.night_total / self.night_count if self.night_count else 0.0
+
+    @classmethod
+    def from_atom(cls, count, total, maximum, energy, night_count, night_total) -> "Rollup":
+        """Reads a summary atom back from its count to night total fields (SUMMARY_ATOM groups 4-9)."""
+        rollup = cls()
+        rollup.count = int(count)
+        rollup.total = float(total)
+        rollup.maximum = float(maximum)
+        rollup.energy = float(energy)
+        rollup.night_count = int(night_count)
+        rollup.night_total = float(night_total)
+        return rollup
+
+    def atom(self, period: str, loc_id: str, start: datetime) -> str:
+        # repr() is the shortest text that reads back as the same float.
+        return (f"(noise_summary {period} {loc_id} \"{start.isoformat()}\" {self.count} {self.total!r} "
+                f"{self.maximum!r} {self.energy!r} {self.night_count} {self.night_total!r})")
+
+
+class GraphCompactor:
+    """
+    Rewrites knowledge-graph text so it grows with the retained data, not the history.
+
+    - Repeated noise_event atoms (the same location, timestamp and level under
+      different IDs) are kept once, as are repeated location definitions.
+    - Noise events older than raw_horizon seconds are rolled up into one
+      hourly noise_summary per location; hourly summaries older than
+      hourly_horizon seconds are merged into daily ones.
+    - Recent noise events are kept as they are, with their IDs.
+
+    Calling a compactor on a graph's text returns (compacted text, stats).
+    Compacting already compacted text is safe: summaries of the same period
+    are merged, so late events only ever add to them. Facts the Notary
+    published twice are its dedup index's concern (see fact_index.py); the
+    compactor only merges atoms that are repeated in the text it is given.
+    """
+
+    def __init__(self, raw_horizon: float = KNOWLEDGE_GRAPH_RAW_HORIZON,
+                 hourly_horizon: float = KNOWLEDGE_GRAPH_HOURLY_HORIZON):
+        self.raw_horizon = raw_horizon
+        self.hourly_horizon = hourly_horizon
+
+    def __call__(self, text: str, now: float = None) -> tuple:
+        now = time.time() if now is None else now
+        raw_cutoff = now - self.raw_horizon
+        hourly_cutoff = now - self.hourly_horizon
+
+        header, locations, other, retained = [], {}, [], []
+        rollups = {}  # (period, loc_id, period start) -> Rollup
+        seen_events = set()
+        stats = {"events": 0, "duplicates": 0, "rolled_up": 0}
+
+        for line in text.splitlines():
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith(";"):
+                if not (locations or other or retained or rollups):
+                    header.append(line)  # the graph's own header; later comments are decoration
+                continue
+            event = EVENT_ATOM.match(line)
+            if event:
+                _, loc_id, timestamp, db = event.groups()
+                if (loc_id, timestamp, db) in seen_events:
+                    stats["duplicates"] += 1
+                    continue
+                seen_events.add((loc_id, timestamp, db))
+                stats["events"] += 1
+                moment = parse_timestamp(timestamp)
+                if moment is None or moment.timestamp() >= raw_cutoff:
+                    retained.append(line)
+                    continue
+                hour = moment.replace(minute=0, second=0, microsecond=0)
+                rollups.setdefault(("hour", loc_id, hour), Rollup()).add(float(db), is_night(moment))
+                stats["rolled_up"] += 1
+                continue
+            summary = SUMMARY_ATOM.match(line)
+            start = parse_timestamp(summary.group(3)) if summary else None
+            if start is not None:
+                period, loc_id = summary.group(1), summary.group(2)
+                rollups.setdefault((period, loc_id, start), Rollup()).merge(Rollup.from_atom(*summary.groups()[3:]))
+                continue
+            location = LOCATION_ATOM.match(line)
+            if location:
+                locations[location.group(1)] = line  # the latest definition wins
+                continue
+            other.append(line)  # atoms this compactor does not know are kept verbatim
+
+        for period, loc_id, start in list(rollups):
+            if period == "hour" and start.timestamp() < hourly_cutoff:
+                day = start.replace(hour=0)
+                rollups.setdefault(("day", loc_id, day), Rollup()).merge(rollups.pop((period, loc_id, start)))
+
+        ordered = sorted(rollups.items(), key=lambda item: (item[0][2], item[0][0], item[0][1]))
+        summaries = [rollup.atom(period, loc_id, start) for (period, loc_id, start), rollup in ordered]
+        stats.update(retained=len(retained), summaries=len(summaries))
+        lines = header + list(locations.values()) + other + summaries + retained
+        return "".join(line + "\n" for line in lines), stats
+
+
+# --- Standalone Compaction ---
+# The Notary compacts its graph every KNOWLEDGE_GRAPH_COMPACT_INTERVAL seconds.
+# Run this instead only while the Notary is stopped: the Notary owns the
+# manifest and would otherwise overwrite the compacted one with its own copy.
+async def main():
+    from config.settings import GIST_API_BASE_URL, KNOWLEDGE_GRAPH_GIST_ID, GITHUB_PAT
+
+    gist_headers = {"Authorization": f"token {GITHUB_PAT}", "Accept": "application/vnd.github.v3+json"}
+    writer = KnowledgeGraphWriter(open_graph_store(gist_url=f"{GIST_API_BASE_URL}/{KNOWLEDGE_GRAPH_GIST_ID}",
+                                                   gist_headers=gist_headers))
+    try:
+        stats = await writer.compact(GraphCompactor())
+    finally:
+        await writer.store.close()
+    print(f"[Compaction] {stats}" if stats else "[Compaction] No sealed segments to compact.")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
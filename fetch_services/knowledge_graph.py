@@ -0,0 +1,542 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+
+import aiohttp
+import requests
+
+from fetch_services.metrics import pipeline_metrics
+
+# --- Path Configuration ---
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+try:
+    from config.settings import (
+        NOTARY_FLUSH_INTERVAL, NOTARY_FLUSH_MAX_FACTS, KNOWLEDGE_GRAPH_BACKEND, KNOWLEDGE_GRAPH_DIR,
+        KNOWLEDGE_GRAPH_SEGMENT_MAX_BYTES, KNOWLEDGE_GRAPH_SEGMENT_MAX_AGE,
+    )
+except ImportError:
+    NOTARY_FLUSH_INTERVAL = 2.0
+    NOTARY_FLUSH_MAX_FACTS = 500
+    KNOWLEDGE_GRAPH_BACKEND = "local"
+    KNOWLEDGE_GRAPH_DIR = os.path.join(PROJECT_ROOT, "knowledge_graph")
+    KNOWLEDGE_GRAPH_SEGMENT_MAX_BYTES = 512 * 1024
+    KNOWLEDGE_GRAPH_SEGMENT_MAX_AGE = 3600.0
+
+KG_FILENAME = "knowledge_graph.metta"   # the single-file graph used before segments
+MANIFEST_FILENAME = "manifest.json"
+SEGMENT_FILENAME = "segment-{index:06d}.metta"
+COMPACTED_FILENAME = "compacted-{generation:06d}-{part:03d}.metta"
+MANIFEST_VERSION = 1
+FLUSH_RETRY_MAX = 60.0  # Longest wait between failed flushes, in seconds
+
+
+# --- Storage Backends ---
+# A graph store holds named text files. write() replaces several files at once
+# (None deletes one); the manifest is always among them and is written last.
+class LocalGraphStore:
+    """Graph files in a local directory; the default stand-in for the Gist."""
+
+    def __init__(self, root: str = KNOWLEDGE_GRAPH_DIR):
+        self.root = root
+
+    async def read(self, name: str):
+        """The file's content, or None if it does not exist."""
+        return await asyncio.to_thread(self._read, name)
+
+    async def read_many(self, names: list) -> dict:
+        """The content of each named file (None for missing ones), by name."""
+        return await asyncio.to_thread(lambda: {name: self._read(name) for name in names})
+
+    async def write(self, files: dict):
+        await asyncio.to_thread(self._write, files)
+
+    async def close(self):
+        pass
+
+    def _read(self, name: str):
+        try:
+            with open(os.path.join(self.root, name), "r", encoding="utf-8") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def _write(self, files: dict):
+        os.makedirs(self.root, exist_ok=True)
+        # Each file is replaced atomically; the manifest goes after the files it
+        # lists and before the deletions, so it never lists content that is not there.
+        order = {MANIFEST_FILENAME: 1}
+        for name in sorted(files, key=lambda name: 2 if files[name] is None else order.get(name, 0)):
+            path = os.path.join(self.root, name)
+            if files[name] is None:
+                if os.path.exists(path):
+                    os.remove(path)
+                continue
+            with open(path + ".tmp", "w", encoding="utf-8") as f:
+                f.write(files[name])
+            os.replace(path + ".tmp", path)
+
+
+class GistStore:
+    """The files of a GitHub Gist, read and replaced over a pooled aiohttp session."""
+
+    def __init__(self, url: str, headers: dict, timeout: float = 10.0):
+        self.url = url
+        self.headers = headers
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self._session = None
+
+    def _ensure_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(headers=self.headers, timeout=self.timeout)
+        return self._session
+
+    async def read(self, name: str):
+        return (await self.read_many([name]))[name]
+
+    async def read_many(self, names: list) -> dict:
+        """
+        The content of each named file (None for missing ones), by name.
+
+        The Gist API returns every file of the Gist in one response, so all of
+        them are read from a single GET; only files too large to be inlined
+        are fetched again from their raw_url.
+        """
+        async with self._ensure_session().get(self.url) as response:
+            response.raise_for_status()
+            gist = await response.json(content_type=None)
+        files = gist.get("files", {})
+        contents = {}
+        for name in names:
+            file = files.get(name)
+            if file is not None and file.get("truncated"):
+                # The API inlines at most 1 MB of each file; the rest is behind raw_url.
+                async with self._ensure_session().get(file["raw_url"]) as response:
+                    response.raise_for_status()
+                    contents[name] = await response.text()
+            else:
+                contents[name] = file["content"] if file is not None else None
+        return contents
+
+    async def write(self, files: dict):
+        # One PATCH replaces every file together, so readers never see a manifest
+        # ahead of its segments.
+        payload = {"files": {name: {"content": content} if content is not None else None
+                             for name, content in files.items()}}
+        async with self._ensure_session().patch(self.url, json=payload) as response:
+            response.raise_for_status()
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+
+def open_graph_store(backend: str = KNOWLEDGE_GRAPH_BACKEND, gist_url: str = None, gist_headers: dict = None):
+    """Returns the graph store selected by KNOWLEDGE_GRAPH_BACKEND ('local' or 'gist')."""
+    if backend == "gist":
+        return GistStore(gist_url, gist_headers)
+    return LocalGraphStore(KNOWLEDGE_GRAPH_DIR)
+
+
+class KnowledgeGraphWriter:
+    """
+    Write-behind buffer between the Notary and the public knowledge graph.
+
+    append() only records a fact's atoms: they go to an in-memory buffer and,
+    with a spool_path, to a local spool file so they survive a crash (callers
+    that keep their own log, like the Notary's state, pass the recovered atoms
+    to start() instead). A background task then publishes the whole buffer in
+    one write every interval seconds, or as soon as max_facts are waiting.
+
+    The graph is stored as segments plus a manifest listing them. Facts are
+    appended to the newest ("head") segment, which the writer keeps in memory,
+    so a flush writes the head and the manifest and nothing else. Once the head
+    reaches segment_max_bytes or has been open segment_max_age seconds, it is
+    sealed by the flush that crosses the limit and never changes again; the
+    next flush opens a new one. A store that still holds the single-file
+    graph gets it listed as the first, sealed, segment.
+
+    compact() replaces every sealed segment with a compacted rewrite of them
+    (see kg_compaction.py) and bumps the manifest's generation, which tells
+    readers to start over.
+
+    After a crash the recovered atoms are buffered again on start(). If the
+    last segment already ends with the oldest of them (the crash came between
+    the write and clearing the spool), those are not published a second time;
+    facts buffered after that write still are.
+
+    on_flush(count), if given, is called whenever the oldest count buffered
+    facts have been published.
+    """
+
+    def __init__(self, store, spool_path: str = None, interval: float = NOTARY_FLUSH_INTERVAL,
+                 max_facts: int = NOTARY_FLUSH_MAX_FACTS, segment_max_bytes: int = KNOWLEDGE_GRAPH_SEGMENT_MAX_BYTES,
+                 segment_max_age: float = KNOWLEDGE_GRAPH_SEGMENT_MAX_AGE, on_flush=None):
+        self.store = store
+        self.spool_path = spool_path
+        self.interval = interval
+        self.max_facts = max_facts
+        self.segment_max_bytes = segment_max_bytes
+        self.segment_max_age = segment_max_age
+        self.on_flush = on_flush
+        self.initial_content = ""
+        self.manifest = None  # the published manifest, as of the last read or flush
+        self.head = None      # content of the open segment (None when the last one is sealed)
+        self._pending = []    # atoms of each buffered fact, oldest first
+        self._dirty = False   # the manifest changed locally and must be written
+        self._lock = asyncio.Lock()  # serialises flushes and compaction, which both replace the manifest
+        self._spool = None
+        self._full = None
+        self._task = None
+
+    def __len__(self) -> int:
+        """Facts waiting to be published."""
+        return len(self._pending)
+
+    # --- Lifecycle ---
+    async def start(self, pending: list = None, initial_content: str = "") -> int:
+        """
+        Recovers unpublished facts and starts the flush task on the running loop.
+
+        Args:
+            pending: Atoms of unpublished facts, oldest first, when there is
+                no spool_path.
+            initial_content: The start of the first segment of a new graph.
+
+        Returns:
+            The number of facts recovered.
+        """
+        if self.spool_path is not None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.spool_path)), exist_ok=True)
+            pending = self._read_spool()
+        self._pending = list(pending or [])
+        self.initial_content = initial_content
+        recovered = len(self._pending)
+        try:
+            await self._load_manifest()
+        except Exception as e:
+            print(f"[KnowledgeGraph] Could not read the graph yet ({e}); retrying on the next flush.")
+        self._rewrite_spool()
+
+        self._full = asyncio.Event()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        return recovered
+
+    async def close(self):
+        """Stops the flush task after one last flush; unpublished facts stay in the spool (or the caller's log)."""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        try:
+            await self.flush()
+        except Exception as e:
+            print(f"[KnowledgeGraph] Final flush failed ({e}); {len(self._pending)} facts kept in the spool.")
+        if self._spool is not None:
+            self._spool.close()
+            self._spool = None
+        await self.store.close()
+
+    # --- Buffering ---
+    def append(self, atoms: str):
+        """Buffers the atoms of one fact (durably, with a spool) for the next flush."""
+        if self._spool is not None:
+            self._spool.write(json.dumps(atoms) + "\n")
+            self._spool.flush()
+        self._pending.append(atoms)
+        if len(self._pending) >= self.max_facts:
+            self._full.set()
+
+    def _read_spool(self) -> list:
+        if self.spool_path is None or not os.path.exists(self.spool_path):
+            return []
+        pending = []
+        with open(self.spool_path, "r") as f:
+            for line in f:
+                try:
+                    pending.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue  # a line torn by a crash mid-write
+        return pending
+
+    def _rewrite_spool(self):
+        """Replaces the spool with just the facts still pending."""
+        if self.spool_path is None:
+            return
+        if self._spool is not None:
+            self._spool.close()
+        temp_path = self.spool_path + ".tmp"
+        with open(temp_path, "w") as f:
+            for atoms in self._pending:
+                f.write(json.dumps(atoms) + "\n")
+        os.replace(temp_path, self.spool_path)
+        self._spool = open(self.spool_path, "a")
+
+    # --- Segments ---
+    async def _load_manifest(self):
+        """Reads the manifest and the last segment, recognising facts published just before a crash."""
+        raw = await self.store.read(MANIFEST_FILENAME)
+        if raw is not None:
+            manifest = json.loads(raw)
+        else:
+            manifest = {"version": MANIFEST_VERSION, "segments": []}
+            legacy = await self.store.read(KG_FILENAME)
+            if legacy and legacy.strip():
+                manifest["segments"].append(self._legacy_segment(legacy))
+                self._dirty = True
+        last_content = None
+        if manifest["segments"]:
+            last = manifest["segments"][-1]
+            last_content = await self.store.read(last["name"]) or ""
+            self.head = None if last["sealed"] else last_content
+        self.manifest = manifest
+
+        published = self._published_prefix(last_content) if last_content else 0
+        if published:
+            last = manifest["segments"][-1]
+            if last["bytes"] != len(last_content.encode()):
+                # The segment was written but not the manifest (a local store crash between the two).
+                last.update(facts=last["facts"] + published, bytes=len(last_content.encode()))
+                self._dirty = True
+            self._published(published)
+
+    def _published_prefix(self, content: str) -> int:
+        """
+        How many of the oldest recovered facts content already ends with.
+
+        Facts appended while the last flush was being written were not part of
+        it, so only a prefix of the recovered facts may have been published;
+        the rest are still pending.
+        """
+        for count in range(len(self._pending), 0, -1):
+            if content.endswith(self._pending[count - 1]) and content.endswith("".join(self._pending[:count])):
+                return count
+        return 0
+
+    @staticmethod
+    def _legacy_segment(content: str) -> dict:
+        now = time.time()
+        return {"name": KG_FILENAME, "sealed": True, "first_fact": 0,
+                "facts": sum(1 for line in content.splitlines() if line.startswith("(noise_event ")),
+                "bytes": len(content.encode()), "sha256": hashlib.sha256(content.encode()).hexdigest(),
+                "opened_at": now, "updated_at": now}
+
+    def _open_segment(self, segments: list, now: float) -> tuple:
+        """The head segment's manifest entry and content, opening a new segment if the last one is sealed."""
+        if segments and not segments[-1]["sealed"]:
+            return dict(segments[-1]), self.head
+        first_fact = segments[-1]["first_fact"] + segments[-1]["facts"] if segments else 0
+        index = self.manifest.get("next_segment", len(segments))
+        entry = {"name": SEGMENT_FILENAME.format(index=index), "sealed": False,
+                 "first_fact": first_fact, "facts": 0, "bytes": 0, "opened_at": now, "updated_at": now}
+        return entry, (self.initial_content if not segments else "")
+
+    async def compact(self, rewrite):
+        """
+        Replaces the sealed segments with a compacted version of their content.
+
+        The head segment is left alone, so facts keep flowing into it. The
+        compacted text is split into sealed segments of at most
+        segment_max_bytes, which all cover the fact range of the segments
+        they replace.
+
+        Args:
+            rewrite: Called in a worker thread with the text of the sealed
+                segments, in order; returns (compacted text, stats), like
+                kg_compaction.GraphCompactor.
+
+        Returns:
+            rewrite's stats, or None if no segment was sealed yet. Nothing is
+            written if the rewrite leaves the content as it was.
+        """
+        async with self._lock:
+            if self.manifest is None:
+                await self._load_manifest()
+            segments = self.manifest["segments"]
+            sealed = [segment for segment in segments if segment["sealed"]]
+            if not sealed:
+                return None
+            contents = await self.store.read_many([segment["name"] for segment in sealed])
+            texts = [contents[segment["name"]] or "" for segment in sealed]
+            original = "".join(texts)
+            content, stats = await asyncio.to_thread(rewrite, original)
+            if content == original:
+                return dict(stats, segments_in=len(sealed), unchanged=True)  # readers need not start over
+
+            generation = self.manifest.get("generation", 0) + 1
+            first_fact = sealed[0]["first_fact"]
+            facts = sealed[-1]["first_fact"] + sealed[-1]["facts"] - first_fact
+            now = time.time()
+            files, compacted = {}, []
+            for part, chunk in enumerate(self._split(content)):
+                encoded = chunk.encode()
+                name = COMPACTED_FILENAME.format(generation=generation, part=part)
+                compacted.append({"name": name, "sealed": True, "compacted": True, "first_fact": first_fact,
+                                  "facts": facts, "bytes": len(encoded), "sha256": hashlib.sha256(encoded).hexdigest(),
+                                  "opened_at": now, "updated_at": now})
+                files[name] = chunk
+            manifest = dict(self.manifest, version=MANIFEST_VERSION, generation=generation,
+                            next_segment=self.manifest.get("next_segment", len(segments)),
+                            segments=compacted + segments[len(sealed):])
+            files[MANIFEST_FILENAME] = json.dumps(manifest, indent=1)
+            for segment in sealed:
+                files.setdefault(segment["name"], None)
+            await self.store.write(files)
+            self.manifest = manifest
+        stats.update(segments_in=len(sealed), segments_out=len(compacted), bytes_in=sum(s["bytes"] for s in sealed),
+                     bytes_out=sum(s["bytes"] for s in compacted), generation=generation)
+        pipeline_metrics.incr("kg_compactions")
+        return stats
+
+    def _split(self, content: str) -> list:
+        """Cuts content at line boundaries into chunks of at most segment_max_bytes (at least one chunk)."""
+        chunks, current, size = [], [], 0
+        for line in content.splitlines(keepends=True):
+            length = len(line.encode())
+            if current and size + length > self.segment_max_bytes:
+                chunks.append("".join(current))
+                current, size = [], 0
+            current.append(line)
+            size += length
+        chunks.append("".join(current))
+        return chunks
+
+    # --- Publishing ---
+    def _published(self, count: int):
+        del self._pending[:count]
+        self._rewrite_spool()
+        if self.on_flush is not None and count:
+            self.on_flush(count)
+
+    async def flush(self) -> int:
+        """Publishes every buffered fact in one write. Returns how many were published."""
+        if not self._pending and not self._dirty:
+            return 0
+        async with self._lock:
+            return await self._flush()
+
+    async def _flush(self) -> int:
+        if self.manifest is None:
+            await self._load_manifest()
+            if not self._pending and not self._dirty:
+                return 0
+        batch = len(self._pending)  # facts appended while the write is in flight wait for the next flush
+        segments = list(self.manifest["segments"])
+        next_segment = self.manifest.get("next_segment", len(segments))
+        files = {}
+        if batch:
+            now = time.time()
+            entry, content = self._open_segment(segments, now)
+            content += "".join(self._pending[:batch])
+            encoded = content.encode()
+            entry.update(facts=entry["facts"] + batch, bytes=len(encoded), updated_at=now)
+            if len(encoded) >= self.segment_max_bytes or now - entry["opened_at"] >= self.segment_max_age:
+                entry.update(sealed=True, sha256=hashlib.sha256(encoded).hexdigest())
+            if segments and segments[-1]["name"] == entry["name"]:
+                segments[-1] = entry
+            else:
+                segments.append(entry)
+                next_segment += 1
+            files[entry["name"]] = content
+        manifest = dict(self.manifest, version=MANIFEST_VERSION, next_segment=next_segment, segments=segments)
+        files[MANIFEST_FILENAME] = json.dumps(manifest, indent=1)
+
+        with pipeline_metrics.timer("notary_gist_update"):
+            await self.store.write(files)
+        self.manifest, self._dirty = manifest, False
+        if batch:
+            self.head = None if entry["sealed"] else content
+            if entry["sealed"]:
+                pipeline_metrics.incr("kg_segments_sealed")
+        self._published(batch)
+        pipeline_metrics.incr("facts_written", batch)
+        return batch
+
+    async def _run(self):
+        retry_delay = self.interval
+        while True:
+            try:
+                await asyncio.wait_for(self._full.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._full.clear()
+            try:
+                await self.flush()
+                retry_delay = self.interval
+            except Exception as e:
+                print(f"[KnowledgeGraph] Flush of {len(self._pending)} facts failed: {e}")
+                await asyncio.sleep(retry_delay)
+                retry_delay = min(retry_delay * 2, FLUSH_RETRY_MAX)
+
+
+# --- Reading ---
+class KnowledgeGraphReader:
+    """
+    Follows a segmented knowledge graph from the reader's side.
+
+    Each sync() reads the manifest and returns only the text the reader has
+    not seen yet: whole segments it has never read, plus whatever was
+    appended to the head since the last sync. Sealed segments never change,
+    so once read they are never fetched again (and any HTTP cache may keep
+    them forever). When the graph has been compacted since the last sync
+    (the manifest's generation changed), sync() reads it from the start and
+    says so, and the caller should drop what it built from earlier syncs. A
+    graph without a manifest is read as the single legacy file.
+
+    The source is either a local directory (the LocalGraphStore root) or the
+    base URL the graph's files are served from (e.g. a Gist's raw URL).
+    """
+
+    def __init__(self, source: str, timeout: float = 10.0):
+        self.source = source
+        self.remote = source.startswith(("http://", "https://"))
+        self.timeout = timeout
+        self.seen = {}  # segment name -> bytes already read
+        self.generation = None
+        self._session = requests.Session() if self.remote else None
+
+    def sync(self) -> tuple:
+        """
+        Returns:
+            (text, rebuilt): the graph text added since the last sync, in graph
+            order, and whether it is instead the whole graph after a compaction.
+        """
+        raw = self._fetch(MANIFEST_FILENAME)
+        manifest = json.loads(raw) if raw is not None else {"segments": [{"name": KG_FILENAME, "bytes": None}]}
+        generation = manifest.get("generation", 0)
+        rebuilt = self.generation is not None and generation != self.generation
+        seen, new_text = ({} if rebuilt else dict(self.seen)), []
+        segments = manifest["segments"]
+        for segment in segments:
+            offset = seen.get(segment["name"], 0)
+            if segment["bytes"] is not None and offset >= segment["bytes"]:
+                continue
+            text = self._fetch(segment["name"], offset) or ""
+            seen[segment["name"]] = offset + len(text.encode())
+            new_text.append(text)
+        self.seen, self.generation = seen, generation  # only once every fetch succeeded, so a failed sync is retried in full
+        return "".join(new_text), rebuilt
+
+    def _fetch(self, name: str, offset: int = 0):
+        """The file's content from byte offset on, or None if it does not exist."""
+        if not self.remote:
+            try:
+                with open(os.path.join(self.source, name), "rb") as f:
+                    f.seek(offset)
+                    return f.read().decode("utf-8")
+            except FileNotFoundError:
+                return None
+        headers = {"Range": f"bytes={offset}-"} if offset else {}
+        response = self._session.get(f"{self.source.rstrip('/')}/{name}", headers=headers, timeout=self.timeout)
+        if response.status_code == 404:
+            return None
+        if response.status_code == 416:
+            return ""  # nothing past offset
+        response.raise_for_status()
+        body = response.content
+        if offset and response.status_code != 206:
+            body = body[offset:]  # the server ignored the Range header
+        return body.decode("utf-8")
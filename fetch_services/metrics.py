@@ -0,0 +1,85 @@
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+# Latency samples kept per stage; older samples are discarded first.
+MAX_SAMPLES_PER_STAGE = 100000
+
+
+def percentile(sorted_values: list, q: float) -> float:
+    """Nearest-rank percentile of an already sorted list (q in 0..100)."""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, round(q / 100.0 * (len(sorted_values) - 1))))
+    return sorted_values[rank]
+
+
+class StageMetrics:
+    """
+    Per-stage latency samples and counters for the validation pipeline.
+
+    Recording is a perf_counter() difference appended to a bounded deque, so it
+    is cheap enough to leave on in production; the benchmark suite reads the
+    same numbers through summary(). Stages are free-form names such as
+    'ipfs_upload' or 'outbox_delivery'.
+    """
+
+    def __init__(self, max_samples: int = MAX_SAMPLES_PER_STAGE):
+        self.max_samples = max_samples
+        self._lock = threading.Lock()
+        self._samples = {}
+        self._counters = {}
+        self._started = time.monotonic()
+
+    def record(self, stage: str, seconds: float):
+        with self._lock:
+            samples = self._samples.get(stage)
+            if samples is None:
+                samples = self._samples[stage] = deque(maxlen=self.max_samples)
+            samples.append(seconds)
+
+    def incr(self, counter: str, by: int = 1):
+        with self._lock:
+            self._counters[counter] = self._counters.get(counter, 0) + by
+
+    @contextmanager
+    def timer(self, stage: str):
+        """Times the enclosed block (including awaits) as one sample of stage."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start)
+
+    def reset(self):
+        """Drops all samples and counters, e.g. at the end of a warm-up phase."""
+        with self._lock:
+            self._samples.clear()
+            self._counters.clear()
+            self._started = time.monotonic()
+
+    def summary(self) -> dict:
+        """
+        Returns:
+            {"elapsed_s", "counters", "stages": {stage: {count, mean_ms, p50_ms, p90_ms, p99_ms, max_ms}}}
+        """
+        with self._lock:
+            samples = {stage: sorted(values) for stage, values in self._samples.items()}
+            counters = dict(self._counters)
+            elapsed = time.monotonic() - self._started
+        stages = {}
+        for stage, values in samples.items():
+            stages[stage] = {
+                "count": len(values),
+                "mean_ms": 1000 * sum(values) / len(values) if values else 0.0,
+                "p50_ms": 1000 * percentile(values, 50),
+                "p90_ms": 1000 * percentile(values, 90),
+                "p99_ms": 1000 * percentile(values, 99),
+                "max_ms": 1000 * values[-1] if values else 0.0,
+            }
+        return {"elapsed_s": elapsed, "counters": counters, "stages": stages}
+
+
+# Process-wide instance shared by every agent in the process.
+pipeline_metrics = StageMetrics()
@@ -0,0 +1,172 @@
+import json
+import os
+import time
+
+from fetch_services.fact_index import BloomFilter, FactIndex
+
+try:
+    from config.settings import NOTARY_SNAPSHOT_EVERY
+except ImportError:
+    NOTARY_SNAPSHOT_EVERY = 2000
+
+SNAPSHOT_FILE = "snapshot.json"
+BLOOM_FILE = "snapshot-{seq}.bloom"  # the dedup filters' raw bits, next to the snapshot taken at seq
+LOG_FILE = "facts.jsonl"
+SNAPSHOT_VERSION = 1
+
+
+class NotaryState:
+    """
+    The Notary's durable state: the event counter, the locations already
+    defined in the knowledge graph and the fact dedup index, plus the atoms of
+    facts accepted but not yet published.
+
+    Every accepted fact is one line appended to an append-only log (with its
+    atoms), and every publication of the knowledge graph appends a short
+    marker. Every snapshot_every facts the whole state is written to a
+    snapshot and the log is cut down to the still-unpublished facts. A restart
+    therefore reads one snapshot and at most snapshot_every log lines, however
+    large the graph has grown, and event IDs continue where they left off.
+    The dedup index's Bloom filters (megabytes of bits) are kept out of the
+    JSON in a raw sidecar file, so loading them is a single read.
+    """
+
+    def __init__(self, state_dir: str, snapshot_every: int = NOTARY_SNAPSHOT_EVERY):
+        self.state_dir = state_dir
+        self.snapshot_every = snapshot_every
+        self.snapshot_path = os.path.join(state_dir, SNAPSHOT_FILE)
+        self.log_path = os.path.join(state_dir, LOG_FILE)
+
+        self.event_counter = 0
+        self.locations = set()
+        self.fact_index = FactIndex()
+        self.seq = 0             # sequence number of the last accepted fact
+        self.published_seq = 0   # ...and of the last one published
+        self._unpublished = []   # (seq, atoms), oldest first
+        self._since_snapshot = 0
+        self._log = None
+
+    # --- Recovery ---
+    def load(self) -> list:
+        """
+        Restores the state from the snapshot and the log.
+
+        Returns:
+            The atoms of the facts that were accepted but not yet published, oldest first.
+        """
+        started = time.perf_counter()
+        os.makedirs(self.state_dir, exist_ok=True)
+        snapshot_seq = 0
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, "r") as f:
+                snapshot = json.load(f)
+            snapshot_seq = self.seq = snapshot["seq"]
+            self.published_seq = snapshot["published_seq"]
+            self.event_counter = snapshot["event_counter"]
+            self.locations = set(snapshot["locations"])
+            self.fact_index = FactIndex.from_dict(snapshot["fact_index"], self._read_bloom(snapshot))
+
+        accepted = []
+        if os.path.exists(self.log_path):
+            with open(self.log_path, "r") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # a line torn by a crash mid-write
+                    if "published" in entry:
+                        self.published_seq = max(self.published_seq, entry["published"])
+                        continue
+                    if entry["seq"] > snapshot_seq:
+                        self._apply(entry)
+                        self._since_snapshot += 1
+                    accepted.append((entry["seq"], entry["atoms"]))
+        self._unpublished = [(seq, atoms) for seq, atoms in accepted if seq > self.published_seq]
+
+        self._log = open(self.log_path, "a")
+        print(f"[NotaryState] Restored {self.event_counter} events, {len(self.locations)} locations and "
+              f"{len(self._unpublished)} unpublished facts in {(time.perf_counter() - started) * 1000:.1f} ms")
+        return [atoms for _, atoms in self._unpublished]
+
+    def _apply(self, entry: dict):
+        self.seq = entry["seq"]
+        self.event_counter = entry["event"]
+        self.fact_index.add(entry["key"])
+        self.locations.add(entry["loc"])
+
+    def _read_bloom(self, snapshot: dict) -> list:
+        """Splits the snapshot's bloom file into the bits of each filter."""
+        index = snapshot["fact_index"]
+        with open(os.path.join(self.state_dir, snapshot["bloom_file"]), "rb") as f:
+            data = f.read()
+        bits, offset = [], 0
+        for state in (index["current"], index["previous"]):
+            if state is None:
+                break
+            size = BloomFilter(state["capacity"], state["error_rate"], bits=bytearray()).nbytes
+            bits.append(bytearray(data[offset:offset + size]))
+            offset += size
+        return bits
+
+    # --- Updates ---
+    def next_event_id(self) -> str:
+        return f"N{str(self.event_counter + 1).zfill(3)}"
+
+    def record(self, fact_key: str, loc_id: str, atoms: str):
+        """Durably records an accepted fact; event_id must have come from next_event_id()."""
+        entry = {"seq": self.seq + 1, "event": self.event_counter + 1, "key": fact_key, "loc": loc_id, "atoms": atoms}
+        self._append(entry)
+        self._apply(entry)
+        self._unpublished.append((entry["seq"], atoms))
+        self._since_snapshot += 1
+
+    def published(self, count: int):
+        """Marks the oldest count unpublished facts as published (KnowledgeGraphWriter.on_flush)."""
+        self.published_seq = self._unpublished[count - 1][0]
+        del self._unpublished[:count]
+        self._append({"published": self.published_seq})
+        if self._since_snapshot >= self.snapshot_every:
+            self.snapshot()
+
+    def _append(self, entry: dict):
+        self._log.write(json.dumps(entry) + "\n")
+        self._log.flush()
+
+    # --- Snapshots ---
+    def snapshot(self):
+        """Writes the whole state atomically and truncates the log to the unpublished facts."""
+        # The bloom file is named after the snapshot that refers to it, so a crash
+        # between the two writes leaves the previous pair intact.
+        bloom_file = BLOOM_FILE.format(seq=self.seq)
+        self._write_atomically(os.path.join(self.state_dir, bloom_file),
+                               b"".join(bytes(f.bits) for f in self.fact_index.filters()))
+        snapshot = {
+            "version": SNAPSHOT_VERSION, "seq": self.seq, "published_seq": self.published_seq,
+            "event_counter": self.event_counter, "locations": sorted(self.locations),
+            "fact_index": self.fact_index.to_dict(include_bits=False), "bloom_file": bloom_file,
+        }
+        self._write_atomically(self.snapshot_path, json.dumps(snapshot))
+        for name in os.listdir(self.state_dir):
+            if name.endswith(".bloom") and name != bloom_file:
+                os.remove(os.path.join(self.state_dir, name))
+        # The snapshot covers every logged fact; only unpublished atoms are still needed.
+        pending = "".join(json.dumps({"seq": seq, "atoms": atoms}) + "\n" for seq, atoms in self._unpublished)
+        self._log.close()
+        self._write_atomically(self.log_path, pending)
+        self._log = open(self.log_path, "a")
+        self._since_snapshot = 0
+
+    @staticmethod
+    def _write_atomically(path: str, content):
+        temp_path = path + ".tmp"
+        with open(temp_path, "wb" if isinstance(content, bytes) else "w") as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+
+    def close(self):
+        if self._log is not None:
+            self.snapshot()
+            self._log.close()
+            self._log = None
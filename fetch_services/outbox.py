@@ -0,0 +1,242 @@
+import asyncio
+import json
+import os
+import random
+import time
+import uuid
+
+from fetch_services.metrics import pipeline_metrics
+
+# --- Tunable Parameters ---
+OUTBOX_WORKERS = 2          # Concurrent workers per sink
+OUTBOX_COMPACT_EVERY = 500  # Delivered records between WAL rewrites
+
+
+class Sink:
+    """
+    One downstream destination of an Outbox.
+
+    Args:
+        name: Identifies the sink in the WAL, metrics and logs.
+        handler: async handler(records) -> list with one result per record.
+            Each record is a dict with the original "payload" and the
+            "results" of the sinks it has already been delivered to. A result
+            that is an Exception fails only that record; raising fails the
+            whole batch. Results must be JSON-serializable (None is fine).
+        after: Name of a sink whose result this one needs. Records reach this
+            sink only once that sink has delivered them.
+        batch_size: Most records handed to one handler call.
+        max_attempts: Attempts per record in quick succession; after that the
+            record is retried every max_backoff seconds until it is delivered.
+        backoff: First retry delay in seconds, doubled per attempt up to max_backoff (with jitter).
+    """
+
+    def __init__(self, name: str, handler, after: str = None, batch_size: int = 1,
+                 max_attempts: int = 5, backoff: float = 0.5, max_backoff: float = 30.0):
+        self.name = name
+        self.handler = handler
+        self.after = after
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+
+class Outbox:
+    """
+    A durable queue between consensus and its side effects.
+
+    put() appends the payload to a JSON-lines write-ahead log and returns at
+    once; a pool of workers per sink then delivers it, all sinks in parallel
+    except where one declares it needs another's result. Every delivery is
+    logged as well, so on start() the WAL is replayed and anything not yet
+    delivered to every sink is queued again. Delivery is therefore
+    at-least-once: a crash between a delivery and its log line repeats it.
+
+    The WAL is rewritten with only the undelivered records every
+    OUTBOX_COMPACT_EVERY deliveries, so it stays small in steady state.
+    """
+
+    def __init__(self, path: str, sinks: list, workers: int = OUTBOX_WORKERS, fsync: bool = False):
+        self.path = path
+        self.sinks = {sink.name: sink for sink in sinks}
+        self.workers = workers
+        # flush() alone survives a process crash; fsync also survives power loss, at a cost per event.
+        self.fsync = fsync
+        self._records = {}  # id -> {"id", "payload", "results", "pending", "queued", "started"}
+        self._queues = {}
+        self._tasks = []
+        self._wal = None
+        self._delivered_since_compact = 0
+
+    def __len__(self) -> int:
+        """Records not yet delivered to every sink."""
+        return len(self._records)
+
+    # --- Lifecycle ---
+    def start(self) -> int:
+        """
+        Replays the WAL and starts the workers on the running event loop.
+
+        Returns:
+            The number of undelivered records, from a previous run or put() before start().
+        """
+        if self._wal is None:
+            self._open()
+        self._queues = {name: asyncio.Queue() for name in self.sinks}
+        for record in self._records.values():
+            record["queued"].clear()
+            self._dispatch(record)
+
+        loop = asyncio.get_running_loop()
+        for sink in self.sinks.values():
+            for _ in range(self.workers):
+                self._tasks.append(loop.create_task(self._work(sink)))
+        return len(self._records)
+
+    async def stop(self):
+        """Cancels the workers and closes the WAL; undelivered records are kept for the next start()."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queues = {}  # retries still scheduled find the outbox stopped and do nothing
+        if self._wal is not None:
+            self._wal.close()
+            self._wal = None
+
+    def put(self, payload: dict) -> str:
+        """
+        Durably records a JSON-serializable payload for delivery to every sink.
+        Records put before start() are logged and delivered once it runs.
+
+        Returns:
+            The record id.
+        """
+        if self._wal is None:
+            self._open()
+        record_id = uuid.uuid4().hex
+        self._append({"op": "put", "id": record_id, "payload": payload})
+        record = self._new_record(record_id, payload)
+        self._records[record_id] = record
+        self._dispatch(record)
+        return record_id
+
+    # --- Write-ahead log ---
+    def _new_record(self, record_id: str, payload: dict) -> dict:
+        return {"id": record_id, "payload": payload, "results": {}, "pending": set(self.sinks),
+                "queued": set(), "started": time.perf_counter()}
+
+    def _open(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._replay()
+        self._compact()
+
+    def _append(self, entry: dict):
+        self._wal.write(json.dumps(entry) + "\n")
+        self._wal.flush()
+        if self.fsync:
+            os.fsync(self._wal.fileno())
+
+    def _replay(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "r") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # a line torn by a crash mid-write
+                if entry["op"] == "put":
+                    self._records[entry["id"]] = self._new_record(entry["id"], entry["payload"])
+                elif entry["op"] == "done" and entry["id"] in self._records:
+                    record = self._records[entry["id"]]
+                    record["results"][entry["sink"]] = entry.get("result")
+                    record["pending"].discard(entry["sink"])
+        for record_id in [r["id"] for r in self._records.values() if not r["pending"]]:
+            del self._records[record_id]
+
+    def _compact(self):
+        """Rewrites the WAL with only the records that are still undelivered somewhere."""
+        if self._wal is not None:
+            self._wal.close()
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w") as f:
+            for record in self._records.values():
+                f.write(json.dumps({"op": "put", "id": record["id"], "payload": record["payload"]}) + "\n")
+                for sink_name, result in record["results"].items():
+                    f.write(json.dumps({"op": "done", "id": record["id"], "sink": sink_name, "result": result}) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.path)
+        self._wal = open(self.path, "a")
+        self._delivered_since_compact = 0
+
+    # --- Delivery ---
+    def _dispatch(self, record: dict):
+        """Queues a record for every sink it is now ready for."""
+        if not self._queues or record["id"] not in self._records:
+            return  # not started (start() dispatches every undelivered record), or already delivered
+        for sink_name in record["pending"] - record["queued"]:
+            after = self.sinks[sink_name].after
+            if after is None or after in record["results"]:
+                record["queued"].add(sink_name)
+                self._queues[sink_name].put_nowait(record)
+
+    async def _work(self, sink: Sink):
+        queue = self._queues[sink.name]
+        while True:
+            batch = [await queue.get()]
+            while len(batch) < sink.batch_size and not queue.empty():
+                batch.append(queue.get_nowait())
+            await self._deliver(sink, batch)
+
+    async def _deliver(self, sink: Sink, batch: list):
+        """
+        Hands a batch to a sink, retrying failed records with exponential backoff.
+        Records still failing after max_attempts are queued again max_backoff
+        seconds later, without holding up this worker in the meantime.
+        """
+        for attempt in range(1, sink.max_attempts + 1):
+            try:
+                results = await sink.handler(batch)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                results = [e] * len(batch)
+
+            failed = []
+            for record, result in zip(batch, results):
+                if isinstance(result, Exception):
+                    failed.append((record, result))
+                else:
+                    self._delivered(sink, record, result)
+            if not failed:
+                return
+            batch = [record for record, _ in failed]
+            if attempt < sink.max_attempts:
+                pipeline_metrics.incr(f"outbox_{sink.name}_retries", len(failed))
+                delay = min(sink.max_backoff, sink.backoff * 2 ** (attempt - 1))
+                await asyncio.sleep(delay * random.uniform(0.5, 1.0))
+
+        loop = asyncio.get_running_loop()
+        for record, error in failed:
+            pipeline_metrics.incr(f"outbox_{sink.name}_deferred")
+            print(f"[Outbox] {record['id']} still failing for '{sink.name}' after {sink.max_attempts} attempts "
+                  f"({error}); retrying in up to {sink.max_backoff:g}s.")
+            record["queued"].discard(sink.name)
+            loop.call_later(sink.max_backoff * random.uniform(0.5, 1.0), self._dispatch, record)
+
+    def _delivered(self, sink: Sink, record: dict, result):
+        record["results"][sink.name] = result
+        record["pending"].discard(sink.name)
+        self._append({"op": "done", "id": record["id"], "sink": sink.name, "result": result})
+        if record["pending"]:
+            self._dispatch(record)
+            return
+
+        del self._records[record["id"]]
+        pipeline_metrics.record("outbox_delivery", time.perf_counter() - record["started"])
+        self._delivered_since_compact += 1
+        if self._delivered_since_compact >= OUTBOX_COMPACT_EVERY:
+            self._compact()
@@ -0,0 +1,187 @@
+import os
+import json
+import time
+import threading
+from types import MappingProxyType
+
+from fetch_services.registry_store import (
+    REGISTRY_BACKEND, REGISTRY_DB_FILE, SENSOR_REGISTRY_FILE, SQLiteRegistryStore,
+)
+
+# How often (in seconds) the file is stat()-ed for changes. Lookups between
+# two checks are served straight from memory.
+REGISTRY_CHECK_INTERVAL = 1.0
+
+
+class RegistryCache:
+    """
+    An in-memory, read-only view of the shared sensor registry.
+
+    The registry file is parsed once and only re-parsed when its
+    (inode, mtime, size) signature changes, so handlers get dictionary
+    lookups instead of disk I/O on every message. Each reload swaps in a
+    brand new snapshot, so a caller holding a snapshot always sees a
+    consistent registry even while a newer one is being loaded.
+    """
+
+    def __init__(self, path: str = SENSOR_REGISTRY_FILE, check_interval: float = REGISTRY_CHECK_INTERVAL):
+        self.path = path
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._signature = None
+        self._last_check = 0.0
+        self._snapshot = MappingProxyType({})
+        self._listeners = []
+        self.refresh(force=True)
+
+    def _stat_signature(self):
+        """Returns a cheap fingerprint of the registry file, or None if it is missing."""
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+    def _load(self, signature, previous) -> dict:
+        """Loads the registry content matching signature."""
+        if signature is None:
+            return {}
+        with open(self.path, 'r') as f:
+            return json.load(f)
+
+    def refresh(self, force: bool = False) -> bool:
+        """
+        Reloads the registry if the file changed since the last load.
+
+        Returns:
+            True if a new snapshot was installed, False otherwise.
+        """
+        now = time.monotonic()
+        if not force and now - self._last_check < self.check_interval:
+            return False
+
+        with self._lock:
+            self._last_check = now
+            signature = self._stat_signature()
+            if signature == self._signature and not force:
+                return False
+
+            previous = self._snapshot
+            try:
+                data = self._load(signature, previous)
+            except (OSError, ValueError) as e:
+                # A writer may be mid-way through the file. Keep serving the
+                # previous snapshot and retry on the next check.
+                print(f"[RegistryCache] Could not reload {self.path}: {e}")
+                return False
+
+            self._snapshot = MappingProxyType(data)
+            self._signature = signature
+
+        for callback in list(self._listeners):
+            callback(previous, self._snapshot)
+        return True
+
+    def subscribe(self, callback):
+        """Registers callback(old_snapshot, new_snapshot), invoked after every reload."""
+        self._listeners.append(callback)
+
+    def snapshot(self):
+        """Returns the current registry snapshot (a read-only mapping)."""
+        self.refresh()
+        return self._snapshot
+
+    def get(self, mac_address: str, default=None):
+        """O(1) lookup of a single registry entry."""
+        return self.snapshot().get(mac_address, default)
+
+    def __contains__(self, mac_address: str) -> bool:
+        return mac_address in self.snapshot()
+
+    def sensors(self) -> dict:
+        """Returns only the device entries, without the '_'-prefixed service entries."""
+        return {k: v for k, v in self.snapshot().items() if not k.startswith('_')}
+
+    def network_services(self) -> dict:
+        """Returns the '_network_services' entry of the registry."""
+        return self.snapshot().get("_network_services", {})
+
+
+class StoreRegistryCache(RegistryCache):
+    """
+    RegistryCache backed by a SQLiteRegistryStore.
+
+    The change signature is the store's revision counter, and a reload only
+    fetches the rows committed since the last revision seen, so keeping up
+    with new registrations costs O(changes) rather than O(registry).
+    """
+
+    def __init__(self, store: SQLiteRegistryStore, check_interval: float = REGISTRY_CHECK_INTERVAL):
+        self.store = store
+        self._revision = 0
+        super().__init__(store.path, check_interval)
+
+    def _stat_signature(self):
+        return self.store.revision()
+
+    def _load(self, signature, previous) -> dict:
+        revision, changes, services = self.store.changes_since(self._revision)
+        data = dict(previous)
+        data.update(changes)
+        if services is not None:
+            data["_network_services"] = services
+        self._revision = revision
+        return data
+
+
+# --- Shared instances ---
+# One cache per registry source per process, so every module shares the same snapshot.
+_CACHES = {}
+_CACHES_LOCK = threading.Lock()
+
+def get_registry_cache(path: str = None) -> RegistryCache:
+    """
+    Returns the process-wide RegistryCache. Without a path, the source is chosen
+    by REGISTRY_BACKEND; with a path, that JSON file is watched directly.
+    """
+    if path is None and REGISTRY_BACKEND == "sqlite":
+        key = os.path.abspath(REGISTRY_DB_FILE)
+        factory = lambda: StoreRegistryCache(SQLiteRegistryStore(key, legacy_json=SENSOR_REGISTRY_FILE))
+    else:
+        key = os.path.abspath(path or SENSOR_REGISTRY_FILE)
+        factory = lambda: RegistryCache(key)
+    with _CACHES_LOCK:
+        if key not in _CACHES:
+            _CACHES[key] = factory()
+        return _CACHES[key]
+
+
+# --- Derived identities ---
+# Deriving an agent address from its seed is expensive key derivation, and a
+# seed never changes for a registered device, so each result is cached.
+_ADDRESS_CACHE = {}
+
+def agent_address(agent_seed: str) -> str:
+    """Returns the uAgents address for a seed, deriving it only once per process."""
+    address = _ADDRESS_CACHE.get(agent_seed)
+    if address is None:
+        from uagents.crypto import Identity
+        address = str(Identity.from_seed(agent_seed, 0).address)
+        _ADDRESS_CACHE[agent_seed] = address
+    return address
+
+_PUBLIC_KEY_CACHE = {}
+
+def agent_public_key(agent_seed: str) -> str:
+    """
+    Returns the hex public key a worker signs its validation messages with
+    (see RegionalWorker), deriving it only once per process.
+    """
+    public_key = _PUBLIC_KEY_CACHE.get(agent_seed)
+    if public_key is None:
+        from cosmpy.crypto.keypairs import PrivateKey
+        from mnemonic import Mnemonic
+        private_key = PrivateKey(Mnemonic("english").to_seed(agent_seed)[:32])
+        public_key = private_key.public_key._verifying_key.to_string().hex()
+        _PUBLIC_KEY_CACHE[agent_seed] = public_key
+    return public_key
@@ -0,0 +1,474 @@
+import os
+import json
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+
+# --- Path Configuration ---
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+try:
+    from config.settings import REGISTRY_BACKEND, REGISTRY_DB_FILE, SENSOR_REGISTRY_FILE, WORKER_HOST_CAPACITY
+except ImportError:
+    REGISTRY_BACKEND = "sqlite"
+    REGISTRY_DB_FILE = os.path.join(PROJECT_ROOT, "sensor_registry.db")
+    SENSOR_REGISTRY_FILE = os.path.join(PROJECT_ROOT, "sensor_registry.json")
+    WORKER_HOST_CAPACITY = 500
+
+# Worker agents are given ports from this base upwards, one per registered device.
+AGENT_BASE_PORT = 8010
+# Worker hosts (many agents per process) are given one port each from this base.
+WORKER_HOST_BASE_PORT = 8200
+
+
+class DuplicateDeviceError(ValueError):
+    """Raised when a MAC address that is already registered is registered again."""
+
+
+def format_loc_id(number: int) -> str:
+    return f"LOC{str(number).zfill(3)}"  # e.g., LOC001, LOC002
+
+
+def format_host_id(number: int) -> str:
+    return f"host_{number}"  # e.g., host_1, host_2
+
+
+def host_port(host_id: str) -> int:
+    """Returns the Bureau port of a worker host."""
+    return WORKER_HOST_BASE_PORT + int(host_id.rsplit('_', 1)[1]) - 1
+
+
+class RegistryStore(ABC):
+    """
+    Interface shared by all registry backends.
+
+    Entries are exposed in the same shape as the legacy sensor_registry.json:
+    a dict keyed by MAC address, plus a '_network_services' entry. A backend
+    must implement every abstract method before it can be instantiated.
+    """
+
+    @abstractmethod
+    def get(self, mac_address: str):
+        """Returns the entry of one device, or None if it is not registered."""
+
+    @abstractmethod
+    def find_loc_id(self, location_name: str):
+        """Returns the loc_id of a named location, or None if it has none yet."""
+
+    @abstractmethod
+    def register_sensor(self, mac_address: str, location_name: str, latitude: float, longitude: float, agent_seed: str) -> dict:
+        """Registers one device and returns its entry; raises DuplicateDeviceError if it exists."""
+
+    def register_many(self, devices: list) -> list:
+        """
+        Registers a batch of devices, each a dict with mac_address, name,
+        latitude, longitude and agent_seed. Returns one (entry, error) pair per
+        device; duplicates are reported as errors and do not abort the batch.
+        """
+        results = []
+        for device in devices:
+            try:
+                entry = self.register_sensor(device["mac_address"], device["name"],
+                                             device["latitude"], device["longitude"], device["agent_seed"])
+                results.append((entry, None))
+            except DuplicateDeviceError:
+                results.append((None, "This device (MAC address) is already registered."))
+        return results
+
+    @abstractmethod
+    def snapshot(self) -> dict:
+        """Returns the whole registry in the legacy JSON shape."""
+
+    @abstractmethod
+    def revision(self) -> int:
+        """Returns a number that changes whenever the registry does."""
+
+    def export_json(self, path: str = SENSOR_REGISTRY_FILE):
+        """Atomically writes the whole registry to path in the legacy JSON format."""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.snapshot(), f, indent=4)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+
+class SQLiteRegistryStore(RegistryStore):
+    """
+    Registry backend on SQLite in WAL mode.
+
+    WAL lets any number of reader processes query the registry while a
+    registration is being committed, and every registration is a single
+    short transaction, so concurrent /register calls can no longer lose
+    each other's writes. loc_id and agent ports come from monotonic
+    counters stored in the same transaction as the device row.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS locations (
+            loc_id TEXT PRIMARY KEY,
+            name   TEXT NOT NULL UNIQUE
+        );
+        CREATE TABLE IF NOT EXISTS sensors (
+            mac_address TEXT PRIMARY KEY,
+            loc_id      TEXT NOT NULL REFERENCES locations(loc_id),
+            latitude    REAL NOT NULL,
+            longitude   REAL NOT NULL,
+            agent_name  TEXT NOT NULL,
+            agent_seed  TEXT NOT NULL,
+            agent_port  INTEGER NOT NULL,
+            rev         INTEGER NOT NULL,
+            host_id     TEXT
+        );
+        CREATE INDEX IF NOT EXISTS idx_sensors_loc_id ON sensors(loc_id);
+        CREATE INDEX IF NOT EXISTS idx_sensors_rev ON sensors(rev);
+        CREATE TABLE IF NOT EXISTS services (
+            key   TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS counters (
+            name  TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        );
+    """
+
+    def __init__(self, path: str = REGISTRY_DB_FILE, legacy_json: str = SENSOR_REGISTRY_FILE,
+                 host_capacity: int = WORKER_HOST_CAPACITY):
+        self.path = path
+        # Devices per worker host; 0 keeps the legacy one-process-per-device layout.
+        self.host_capacity = host_capacity
+        self._local = threading.local()
+        conn = self._conn()
+        conn.executescript(self.SCHEMA)
+        # Databases created before worker hosts existed lack the host_id column.
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(sensors)")}
+        if "host_id" not in columns:
+            conn.execute("ALTER TABLE sensors ADD COLUMN host_id TEXT")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_sensors_host_id ON sensors(host_id)")
+        for name in ("revision", "next_loc", "next_agent", "current_host"):
+            conn.execute("INSERT OR IGNORE INTO counters(name, value) VALUES (?, 0)", (name,))
+        if legacy_json and self.revision() == 0 and os.path.exists(legacy_json):
+            self.import_json(legacy_json)
+
+    def _conn(self) -> sqlite3.Connection:
+        """Returns this thread's connection, opening it on first use."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _transaction(self):
+        """Opens a write transaction; BEGIN IMMEDIATE serialises writers up front."""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        return conn
+
+    @staticmethod
+    def _bump(conn, name: str, by: int = 1) -> int:
+        """Advances a counter and returns its new value."""
+        conn.execute("UPDATE counters SET value = value + ? WHERE name = ?", (by, name))
+        return conn.execute("SELECT value FROM counters WHERE name = ?", (name,)).fetchone()[0]
+
+    # --- Reads ---
+    _SELECT_SENSORS = """
+        SELECT s.mac_address, s.loc_id, l.name, s.latitude, s.longitude,
+               s.agent_name, s.agent_seed, s.agent_port, s.rev, s.host_id
+        FROM sensors s JOIN locations l ON l.loc_id = s.loc_id
+    """
+
+    @staticmethod
+    def _row_to_entry(row) -> dict:
+        entry = {
+            "loc_id": row[1],
+            "name": row[2],
+            "latitude": row[3],
+            "longitude": row[4],
+            "agent_name": row[5],
+            "agent_seed": row[6],
+            "agent_port": row[7],
+        }
+        if row[9]:
+            entry["host_id"] = row[9]
+        return entry
+
+    def get(self, mac_address: str):
+        row = self._conn().execute(self._SELECT_SENSORS + " WHERE s.mac_address = ?", (mac_address,)).fetchone()
+        return self._row_to_entry(row) if row else None
+
+    def find_loc_id(self, location_name: str):
+        row = self._conn().execute("SELECT loc_id FROM locations WHERE name = ?", (location_name,)).fetchone()
+        return row[0] if row else None
+
+    def sensors_at(self, loc_id: str) -> dict:
+        rows = self._conn().execute(self._SELECT_SENSORS + " WHERE s.loc_id = ?", (loc_id,)).fetchall()
+        return {row[0]: self._row_to_entry(row) for row in rows}
+
+    def network_services(self) -> dict:
+        rows = self._conn().execute("SELECT key, value FROM services").fetchall()
+        return {key: json.loads(value) for key, value in rows}
+
+    def revision(self) -> int:
+        return self._conn().execute("SELECT value FROM counters WHERE name = 'revision'").fetchone()[0]
+
+    def changes_since(self, revision: int) -> tuple:
+        """
+        Returns (new_revision, changed_entries, network_services_or_None) for every
+        change committed after the given revision. Reads happen in one
+        transaction, so the result is a consistent point-in-time view.
+        """
+        conn = self._conn()
+        conn.execute("BEGIN")
+        try:
+            current = conn.execute("SELECT value FROM counters WHERE name = 'revision'").fetchone()[0]
+            rows = conn.execute(self._SELECT_SENSORS + " WHERE s.rev > ?", (revision,)).fetchall()
+            services_rev = conn.execute("SELECT value FROM counters WHERE name = 'services_rev'").fetchone()
+            services = None
+            if services_rev is not None and services_rev[0] > revision:
+                services = {key: json.loads(value) for key, value in conn.execute("SELECT key, value FROM services")}
+        finally:
+            conn.execute("COMMIT")
+        return current, {row[0]: self._row_to_entry(row) for row in rows}, services
+
+    def snapshot(self) -> dict:
+        _, entries, services = self.changes_since(0)
+        registry = {"_network_services": services or {}}
+        registry.update(entries)
+        return registry
+
+    def sensors_on_host(self, host_id: str) -> dict:
+        rows = self._conn().execute(self._SELECT_SENSORS + " WHERE s.host_id = ?", (host_id,)).fetchall()
+        return {row[0]: self._row_to_entry(row) for row in rows}
+
+    # --- Writes ---
+    def _assign_host(self, conn) -> str:
+        """Picks the current worker host, opening a new one once it is full."""
+        number = conn.execute("SELECT value FROM counters WHERE name = 'current_host'").fetchone()[0]
+        if number == 0:
+            number = self._bump(conn, "current_host")
+        assigned = conn.execute("SELECT COUNT(*) FROM sensors WHERE host_id = ?", (format_host_id(number),)).fetchone()[0]
+        if assigned >= self.host_capacity:
+            number = self._bump(conn, "current_host")
+        return format_host_id(number)
+
+    def _insert(self, conn, mac_address: str, location_name: str, latitude: float, longitude: float, agent_seed: str) -> dict:
+        """Inserts one device inside an open transaction and returns its entry."""
+        if conn.execute("SELECT 1 FROM sensors WHERE mac_address = ?", (mac_address,)).fetchone():
+            raise DuplicateDeviceError(mac_address)
+
+        row = conn.execute("SELECT loc_id FROM locations WHERE name = ?", (location_name,)).fetchone()
+        if row:
+            loc_id = row[0]
+        else:
+            loc_id = format_loc_id(self._bump(conn, "next_loc"))
+            conn.execute("INSERT INTO locations(loc_id, name) VALUES (?, ?)", (loc_id, location_name))
+
+        agent_number = self._bump(conn, "next_agent")
+        entry = {
+            "loc_id": loc_id,
+            "name": location_name,
+            "latitude": float(latitude),
+            "longitude": float(longitude),
+            "agent_name": f"worker_agent_{agent_number}",
+            "agent_seed": agent_seed,
+            "agent_port": AGENT_BASE_PORT + agent_number - 1,
+        }
+        if self.host_capacity > 0:
+            entry["host_id"] = self._assign_host(conn)
+        rev = self._bump(conn, "revision")
+        conn.execute(
+            "INSERT INTO sensors(mac_address, loc_id, latitude, longitude, agent_name, agent_seed, agent_port, rev, host_id) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (mac_address, loc_id, entry["latitude"], entry["longitude"],
+             entry["agent_name"], agent_seed, entry["agent_port"], rev, entry.get("host_id")),
+        )
+        return entry
+
+    def register_sensor(self, mac_address: str, location_name: str, latitude: float, longitude: float, agent_seed: str) -> dict:
+        """
+        Atomically registers a device, reusing the loc_id of a known location name.
+
+        Raises:
+            DuplicateDeviceError: if the MAC address is already registered.
+        """
+        conn = self._transaction()
+        try:
+            entry = self._insert(conn, mac_address, location_name, latitude, longitude, agent_seed)
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        return entry
+
+    def register_many(self, devices: list) -> list:
+        """Registers a whole batch of devices in a single transaction."""
+        results = []
+        conn = self._transaction()
+        try:
+            for device in devices:
+                try:
+                    entry = self._insert(conn, device["mac_address"], device["name"],
+                                         device["latitude"], device["longitude"], device["agent_seed"])
+                    results.append((entry, None))
+                except DuplicateDeviceError:
+                    results.append((None, "This device (MAC address) is already registered."))
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        return results
+
+    def set_network_service(self, key: str, value):
+        conn = self._transaction()
+        try:
+            conn.execute("INSERT OR REPLACE INTO services(key, value) VALUES (?, ?)", (key, json.dumps(value)))
+            rev = self._bump(conn, "revision")
+            conn.execute("INSERT OR REPLACE INTO counters(name, value) VALUES ('services_rev', ?)", (rev,))
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def import_json(self, path: str):
+        """One-off migration of a legacy sensor_registry.json into the database."""
+        with open(path, 'r') as f:
+            registry = json.load(f)
+
+        conn = self._transaction()
+        try:
+            rev = self._bump(conn, "revision")
+            max_loc, max_agent = 0, 0
+            for mac, cfg in registry.items():
+                if mac.startswith('_'):
+                    continue
+                conn.execute("INSERT OR IGNORE INTO locations(loc_id, name) VALUES (?, ?)", (cfg["loc_id"], cfg["name"]))
+                conn.execute(
+                    "INSERT OR IGNORE INTO sensors(mac_address, loc_id, latitude, longitude, agent_name, agent_seed, agent_port, rev) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (mac, cfg["loc_id"], cfg["latitude"], cfg["longitude"],
+                     cfg["agent_name"], cfg["agent_seed"], cfg["agent_port"], rev),
+                )
+                if cfg["loc_id"][3:].isdigit():
+                    max_loc = max(max_loc, int(cfg["loc_id"][3:]))
+                max_agent = max(max_agent, cfg["agent_port"] - AGENT_BASE_PORT + 1)
+            for key, value in registry.get("_network_services", {}).items():
+                conn.execute("INSERT OR REPLACE INTO services(key, value) VALUES (?, ?)", (key, json.dumps(value)))
+            conn.execute("INSERT OR REPLACE INTO counters(name, value) VALUES ('services_rev', ?)", (rev,))
+            conn.execute("UPDATE counters SET value = MAX(value, ?) WHERE name = 'next_loc'", (max_loc,))
+            conn.execute("UPDATE counters SET value = MAX(value, ?) WHERE name = 'next_agent'", (max_agent,))
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        print(f"[RegistryStore] Imported {len(registry) - 1} devices from {path}")
+
+
+class JSONRegistryStore(RegistryStore):
+    """
+    Legacy backend that keeps the whole registry in sensor_registry.json.
+    Every write rewrites the file, so it is only suitable for small deployments.
+    """
+
+    def __init__(self, path: str = SENSOR_REGISTRY_FILE, host_capacity: int = WORKER_HOST_CAPACITY):
+        self.path = path
+        self.host_capacity = host_capacity
+        self._lock = threading.Lock()
+
+    def snapshot(self) -> dict:
+        if not os.path.exists(self.path):
+            return {"_network_services": {}}
+        with open(self.path, 'r') as f:
+            return json.load(f)
+
+    def get(self, mac_address: str):
+        return self.snapshot().get(mac_address)
+
+    def find_loc_id(self, location_name: str):
+        for mac, cfg in self.snapshot().items():
+            if not mac.startswith('_') and cfg["name"] == location_name:
+                return cfg["loc_id"]
+        return None
+
+    def revision(self) -> int:
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return 0
+
+    def register_sensor(self, mac_address: str, location_name: str, latitude: float, longitude: float, agent_seed: str) -> dict:
+        with self._lock:
+            registry = self.snapshot()
+            entry = self._add(registry, mac_address, location_name, latitude, longitude, agent_seed, self.host_capacity)
+            self._write(registry)
+            return entry
+
+    def register_many(self, devices: list) -> list:
+        """Registers a whole batch of devices with a single rewrite of the file."""
+        results = []
+        with self._lock:
+            registry = self.snapshot()
+            for device in devices:
+                try:
+                    entry = self._add(registry, device["mac_address"], device["name"],
+                                      device["latitude"], device["longitude"], device["agent_seed"],
+                                      self.host_capacity)
+                    results.append((entry, None))
+                except DuplicateDeviceError:
+                    results.append((None, "This device (MAC address) is already registered."))
+            self._write(registry)
+        return results
+
+    @staticmethod
+    def _add(registry: dict, mac_address: str, location_name: str, latitude: float, longitude: float,
+             agent_seed: str, host_capacity: int = 0) -> dict:
+        """Adds one device to an in-memory registry dict and returns its entry."""
+        if mac_address in registry:
+            raise DuplicateDeviceError(mac_address)
+        devices = {k: v for k, v in registry.items() if not k.startswith('_')}
+        loc_id = next((v["loc_id"] for v in devices.values() if v["name"] == location_name), None)
+        if loc_id is None:
+            loc_id = format_loc_id(len({v["loc_id"] for v in devices.values()}) + 1)
+        entry = {
+            "loc_id": loc_id,
+            "name": location_name,
+            "latitude": float(latitude),
+            "longitude": float(longitude),
+            "agent_name": f"worker_agent_{len(devices) + 1}",
+            "agent_seed": agent_seed,
+            "agent_port": AGENT_BASE_PORT + len(devices),
+        }
+        if host_capacity > 0:
+            hosts = [int(v["host_id"].rsplit('_', 1)[1]) for v in devices.values() if v.get("host_id")]
+            number = max(hosts, default=1)
+            if hosts.count(number) >= host_capacity:
+                number += 1
+            entry["host_id"] = format_host_id(number)
+        registry[mac_address] = entry
+        return entry
+
+    def set_network_service(self, key: str, value):
+        with self._lock:
+            registry = self.snapshot()
+            registry.setdefault("_network_services", {})[key] = value
+            self._write(registry)
+
+    def _write(self, registry: dict):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(registry, f, indent=4)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    def export_json(self, path: str = SENSOR_REGISTRY_FILE):
+        if os.path.abspath(path) != os.path.abspath(self.path):
+            super().export_json(path)
+
+
+def open_registry_store(backend: str = REGISTRY_BACKEND) -> RegistryStore:
+    """Returns the registry backend selected by REGISTRY_BACKEND ('sqlite' or 'json')."""
+    if backend == "json":
+        return JSONRegistryStore(SENSOR_REGISTRY_FILE)
+    return SQLiteRegistryStore(REGISTRY_DB_FILE, legacy_json=SENSOR_REGISTRY_FILE)
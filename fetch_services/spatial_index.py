@@ -0,0 +1,119 @@
+import math
+import threading
+from collections import defaultdict
+
+from fetch_services.consensus.consensus_logic import haversine_distance
+from fetch_services.registry_cache import agent_address, agent_public_key
+
+# --- Tunable Parameters ---
+GRID_SIZE = 0.1                 # Cell size in degrees (~11 km of latitude)
+METERS_PER_DEGREE_LAT = 111_320.0
+
+
+class PeerIndex:
+    """
+    A grid index from cell -> registered sensors, kept in sync with a RegistryCache.
+
+    Each device is placed in a (lat, lon) cell of GRID_SIZE degrees and its agent
+    address is derived once when it is indexed. Lookups only touch the cells that
+    can contain a match, so the cost of a peer-group query depends on the local
+    density of sensors instead of the size of the whole registry.
+    """
+
+    def __init__(self, registry_cache=None, grid_size: float = GRID_SIZE):
+        self.grid_size = grid_size
+        self._lock = threading.Lock()
+        self._cells = defaultdict(set)  # cell -> {mac}
+        self._entries = {}              # mac -> (cell, latitude, longitude, address)
+        self._seeds = {}                # address -> agent seed, for public key lookups
+        if registry_cache is not None:
+            for mac, cfg in registry_cache.sensors().items():
+                self.upsert(mac, cfg)
+            registry_cache.subscribe(self._on_registry_change)
+
+    def cell_of(self, latitude: float, longitude: float) -> tuple:
+        """Returns the grid cell id containing a coordinate."""
+        return (math.floor(latitude / self.grid_size), math.floor(longitude / self.grid_size))
+
+    # --- Incremental maintenance ---
+    def upsert(self, mac_address: str, cfg: dict):
+        """Adds or moves a single device in the index."""
+        cell = self.cell_of(cfg["latitude"], cfg["longitude"])
+        entry = (cell, cfg["latitude"], cfg["longitude"], agent_address(cfg["agent_seed"]))
+        with self._lock:
+            previous = self._entries.get(mac_address)
+            if previous is not None and previous[0] != cell:
+                self._discard_from_cell(previous[0], mac_address)
+            self._entries[mac_address] = entry
+            self._cells[cell].add(mac_address)
+            self._seeds[entry[3]] = cfg["agent_seed"]
+
+    def remove(self, mac_address: str):
+        """Removes a single device from the index."""
+        with self._lock:
+            previous = self._entries.pop(mac_address, None)
+            if previous is not None:
+                self._discard_from_cell(previous[0], mac_address)
+                self._seeds.pop(previous[3], None)
+
+    def _discard_from_cell(self, cell: tuple, mac_address: str):
+        members = self._cells.get(cell)
+        if members is not None:
+            members.discard(mac_address)
+            if not members:
+                del self._cells[cell]
+
+    def _on_registry_change(self, old: dict, new: dict):
+        """Applies only the entries that changed between two registry snapshots."""
+        for mac, cfg in new.items():
+            if not mac.startswith('_') and old.get(mac) != cfg:
+                self.upsert(mac, cfg)
+        for mac in old:
+            if not mac.startswith('_') and mac not in new:
+                self.remove(mac)
+
+    # --- Queries ---
+    def address_of(self, mac_address: str):
+        """Returns the cached agent address of an indexed device, or None."""
+        entry = self._entries.get(mac_address)
+        return entry[3] if entry else None
+
+    def public_key_of(self, address: str):
+        """Returns the signing public key (hex) of an indexed agent address, or None."""
+        seed = self._seeds.get(address)
+        return agent_public_key(seed) if seed is not None else None
+
+    def peers_in_cell(self, location: dict) -> set:
+        """Returns the agent addresses of all devices in the same cell as location."""
+        cell = self.cell_of(location["latitude"], location["longitude"])
+        with self._lock:
+            return {self._entries[mac][3] for mac in self._cells.get(cell, ())}
+
+    def peers_near(self, location: dict, ring: int = 1) -> set:
+        """Returns the agent addresses of all devices in the (2*ring+1)^2 block of cells around location."""
+        row, col = self.cell_of(location["latitude"], location["longitude"])
+        peers = set()
+        with self._lock:
+            for d_row in range(-ring, ring + 1):
+                for d_col in range(-ring, ring + 1):
+                    for mac in self._cells.get((row + d_row, col + d_col), ()):
+                        peers.add(self._entries[mac][3])
+        return peers
+
+    def peers_within(self, location: dict, radius_m: float) -> set:
+        """Returns the agent addresses of all devices within radius_m metres of location."""
+        lat, lon = location["latitude"], location["longitude"]
+        # Cells are narrower in metres away from the equator, so size the search
+        # ring for the longitude direction, which is always the tighter one.
+        meters_per_cell = self.grid_size * METERS_PER_DEGREE_LAT * max(math.cos(math.radians(lat)), 1e-6)
+        ring = max(1, math.ceil(radius_m / meters_per_cell))
+        row, col = self.cell_of(lat, lon)
+        peers = set()
+        with self._lock:
+            for d_row in range(-ring, ring + 1):
+                for d_col in range(-ring, ring + 1):
+                    for mac in self._cells.get((row + d_row, col + d_col), ()):
+                        _, peer_lat, peer_lon, address = self._entries[mac]
+                        if haversine_distance(lat, lon, peer_lat, peer_lon) <= radius_m:
+                            peers.add(address)
+        return peers
@@ -0,0 +1,77 @@
+import asyncio
+import math
+
+# --- Tunable Parameters ---
+WHEEL_TICK = 0.5    # Seconds per slot; timeouts fire up to one tick late
+WHEEL_SLOTS = 128   # Slots per revolution (64 s at the default tick)
+
+
+class TimerWheel:
+    """
+    A hashed timer wheel for many short-lived timeouts.
+
+    Scheduling and cancelling are O(1) dictionary operations, and a single
+    background task advances the wheel one slot per tick and fires whatever
+    expires there, so thousands of pending consensus rounds cost one task and
+    no per-round asyncio timers. Timeouts longer than a revolution carry a
+    remaining-rounds count and stay in their slot until it reaches zero.
+
+    The task starts on the first schedule() call, on the running event loop,
+    and stops by itself when the wheel is empty.
+    """
+
+    def __init__(self, tick: float = WHEEL_TICK, slots: int = WHEEL_SLOTS):
+        self.tick = tick
+        self.slots = [dict() for _ in range(slots)]
+        self._slot_of = {}   # key -> slot index
+        self._cursor = 0
+        self._task = None
+
+    def __len__(self) -> int:
+        return len(self._slot_of)
+
+    def schedule(self, delay: float, key, callback):
+        """
+        Calls callback(key) after about delay seconds, unless cancel(key) is
+        called first. Scheduling an existing key again replaces its timer.
+        """
+        self.cancel(key)
+        ticks = max(1, math.ceil(delay / self.tick))
+        index = (self._cursor + ticks) % len(self.slots)
+        self.slots[index][key] = ((ticks - 1) // len(self.slots), callback)
+        self._slot_of[key] = index
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def cancel(self, key) -> bool:
+        """Drops a pending timer. Returns False if there was none."""
+        index = self._slot_of.pop(key, None)
+        if index is None:
+            return False
+        del self.slots[index][key]
+        return True
+
+    def _advance(self):
+        self._cursor = (self._cursor + 1) % len(self.slots)
+        slot = self.slots[self._cursor]
+        expired = []
+        for key, (rounds, callback) in list(slot.items()):
+            if rounds > 0:
+                slot[key] = (rounds - 1, callback)
+            else:
+                del slot[key]
+                del self._slot_of[key]
+                expired.append((key, callback))
+        for key, callback in expired:
+            try:
+                callback(key)
+            except Exception as e:
+                print(f"[TimerWheel] Timeout callback for {key!r} failed: {e}")
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        next_tick = loop.time()
+        while self._slot_of:
+            next_tick += self.tick
+            await asyncio.sleep(max(0.0, next_tick - loop.time()))
+            self._advance()
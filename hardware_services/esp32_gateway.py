@@ -1,96 +1,277 @@
 import paho.mqtt.client as mqtt
+import argparse
 import json
 import asyncio
 import sys
 import os
 import threading
-import queue
+import time
+import zlib
+import multiprocessing
 
 # --- Path Configuration ---
 PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.append(PROJECT_ROOT)
-SENSOR_REGISTRY_FILE = os.path.join(PROJECT_ROOT, "sensor_registry.json")
 
 # This absolute import will now work correctly with the updated schema
 from fetch_services.agents.schemas import SensorData
+from fetch_services.registry_cache import get_registry_cache, agent_address
+from hardware_services.local_broker import LocalClient
 
-if len(sys.argv) < 2:
-    print("Usage: python esp32_gateway.py <mac_address>")
-    sys.exit(1)
-
-MAC_ADDRESS = sys.argv[1]
-
-# --- Dynamically find the agent address from the shared config file ---
-try:
-    with open(SENSOR_REGISTRY_FILE, 'r') as f:
-        registry = json.load(f)
-        agent_config = registry[MAC_ADDRESS]
-        from uagents.crypto import Identity
-        AGENT_ADDRESS = Identity.from_seed(agent_config['agent_seed'], 0).address
-except (FileNotFoundError, KeyError):
-    print(f"Error: Could not find configuration for MAC address {MAC_ADDRESS}")
-    sys.exit(1)
+from uagents import Agent, Context
+from uagents_core.types import DeliveryStatus
 
 # --- MQTT and Agent Logic ---
-MQTT_BROKER = "broker.hivemq.com"
-MQTT_PORT = 1883
+# Set MQTT_BROKER=local to use the in-process broker stand-in (see local_broker.py).
+MQTT_BROKER = os.getenv("MQTT_BROKER", "broker.hivemq.com")
+MQTT_PORT = int(os.getenv("MQTT_PORT", "1883"))
 MQTT_TOPIC_PREFIX = "echonet/sensors"
 
-message_queue = queue.Queue()
+# Multiplexed gateway shards use one sender agent port each, from this base.
+MULTIPLEXED_GATEWAY_BASE_PORT = 8300
 
-from uagents import Agent, Context
+# --- Forwarding Parameters ---
+FORWARD_QUEUE_MAXSIZE = 10000   # Readings buffered between MQTT and the agent loop
+FORWARD_BATCH_SIZE = 256        # Readings sent concurrently per drain pass
+OVERFLOW_POLICY = "drop_oldest" # "drop_oldest", "drop_newest" or "block"
+METRICS_INTERVAL = 30.0         # Seconds between two queue metric reports
 
-# Use a dynamic port for each gateway's internal agent to prevent conflicts
-gateway_agent_port = 8100 + (hash(MAC_ADDRESS) % 100)
-
-sender_agent = Agent(
-    name=f"gateway_sender_{MAC_ADDRESS}", 
-    seed=f"{MAC_ADDRESS}_seed",
-    port=gateway_agent_port
-)
-
-@sender_agent.on_interval(period=0.1)
-async def process_message_queue(ctx: Context):
-    """Periodically checks the queue for new messages and forwards them."""
-    if not message_queue.empty():
-        destination, message = message_queue.get()
-        print(f"[{sender_agent.name}] Forwarding message from queue to {destination}")
-        await ctx.send(destination, message)
-
-def run_sender_agent():
-    """Function to run the agent's event loop."""
-    sender_agent.run()
-
-def on_connect(client, userdata, flags, rc, properties):
-    if rc == 0:
-        topic = f"{MQTT_TOPIC_PREFIX}/{MAC_ADDRESS}"
-        client.subscribe(topic)
-        print(f"Gateway for {MAC_ADDRESS} connected and subscribed to {topic}")
-    else:
-        print(f"Failed to connect, return code {rc}")
 
-def on_message(client, userdata, msg):
+def make_mqtt_client(client_id: str, broker: str = None):
+    """Returns a paho client, or a LocalClient when the broker is 'local'."""
+    if (broker or MQTT_BROKER) == "local":
+        return LocalClient(client_id)
+    return mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, client_id)
+
+
+def shard_of(mac_address: str, shard_count: int) -> int:
+    """Stable MAC -> shard assignment (Python's hash() is salted per process)."""
+    return zlib.crc32(mac_address.encode()) % shard_count
+
+
+class AgentRouter:
+    """
+    Cached MAC -> agent address map built from the shared registry.
+
+    Addresses are derived once per device; the map only drops entries whose
+    registry entry changed, so new registrations are routable without a restart.
+    """
+
+    def __init__(self):
+        self.registry_cache = get_registry_cache()
+        self._routes = {}
+        self.registry_cache.subscribe(self._on_registry_change)
+
+    def _on_registry_change(self, old, new):
+        for mac in list(self._routes):
+            if old.get(mac) != new.get(mac):
+                del self._routes[mac]
+
+    def address_for(self, mac_address: str):
+        """Returns the agent address of a registered device, or None."""
+        address = self._routes.get(mac_address)
+        if address is None:
+            cfg = self.registry_cache.get(mac_address)
+            if cfg is None or mac_address.startswith('_'):
+                return None
+            address = agent_address(cfg["agent_seed"])
+            self._routes[mac_address] = address
+        return address
+
+
+class ForwardingBridge:
+    """
+    Hands readings from the MQTT network thread to the sender agent's event loop.
+
+    The MQTT thread never touches the asyncio.Queue directly: each reading is
+    scheduled onto the agent loop with call_soon_threadsafe, and a drain task
+    wakes up as soon as something arrives and forwards everything queued (up to
+    FORWARD_BATCH_SIZE at a time) concurrently. The queue is bounded; when it is
+    full the overflow policy either drops the oldest or the newest reading, or
+    blocks the MQTT thread so the broker connection itself applies backpressure.
+    """
+
+    def __init__(self, maxsize: int = FORWARD_QUEUE_MAXSIZE, batch_size: int = FORWARD_BATCH_SIZE,
+                 policy: str = OVERFLOW_POLICY):
+        self.maxsize = maxsize
+        self.batch_size = batch_size
+        self.policy = policy
+        self.loop = None
+        self.queue = None
+        self.metrics = {"received": 0, "forwarded": 0, "dropped": 0, "failed": 0, "max_depth": 0}
+
+    def attach(self, loop: asyncio.AbstractEventLoop):
+        """Binds the bridge to the agent's running loop."""
+        self.queue = asyncio.Queue(maxsize=self.maxsize)
+        self.loop = loop
+
+    def submit(self, destination: str, message):
+        """Called from the MQTT thread for every routed reading."""
+        self.metrics["received"] += 1
+        if self.loop is None:
+            self.metrics["dropped"] += 1  # the agent loop is not up yet
+            return
+        if self.policy == "block":
+            asyncio.run_coroutine_threadsafe(self.queue.put((destination, message)), self.loop).result()
+            self._record_depth()
+        else:
+            self.loop.call_soon_threadsafe(self._put, (destination, message))
+
+    def _put(self, item):
+        """Runs on the agent loop."""
+        if self.queue.full():
+            self.metrics["dropped"] += 1
+            if self.policy == "drop_newest":
+                return
+            self.queue.get_nowait()  # drop_oldest: make room for the fresh reading
+        self.queue.put_nowait(item)
+        self._record_depth()
+
+    def _record_depth(self):
+        self.metrics["max_depth"] = max(self.metrics["max_depth"], self.queue.qsize())
+
+    def depth(self) -> int:
+        return self.queue.qsize() if self.queue is not None else 0
+
+    async def drain(self, ctx: Context):
+        """Forwards readings as soon as they arrive, in concurrent batches."""
+        while True:
+            batch = [await self.queue.get()]
+            while len(batch) < self.batch_size and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            results = await asyncio.gather(
+                *(ctx.send(destination, message) for destination, message in batch),
+                return_exceptions=True,
+            )
+            # ctx.send reports an undeliverable message in its MsgStatus rather than raising.
+            failures = sum(1 for r in results
+                           if isinstance(r, Exception) or getattr(r, "status", None) == DeliveryStatus.FAILED)
+            self.metrics["failed"] += failures
+            self.metrics["forwarded"] += len(batch) - failures
+
+
+class Gateway:
     """
-    This function is called by the MQTT client. It safely puts the message into the queue.
+    Bridges MQTT sensor topics to regional agents.
+
+    With a mac_address, the gateway serves that single device (the original
+    one-process-per-sensor mode). Without one, it subscribes to every sensor
+    topic with a single wildcard subscription and routes each payload to the
+    right agent through an AgentRouter; shard_index/shard_count let several
+    processes split the sensors between them by MAC hash.
     """
-    try:
-        payload = json.loads(msg.payload.decode())
-        # The gateway now expects the new, simplified SensorData format
-        sensor_data = SensorData(**payload)
-        message_queue.put((AGENT_ADDRESS, sensor_data))
-    except Exception as e:
-        print(f"Error processing message: {e}")
+
+    def __init__(self, mac_address: str = None, shard_index: int = 0, shard_count: int = 1,
+                 broker: str = None):
+        self.mac_address = mac_address
+        self.broker = broker or MQTT_BROKER
+        self.shard_index = shard_index
+        self.shard_count = shard_count
+        self.router = AgentRouter()
+        self.bridge = ForwardingBridge()
+
+        if mac_address:
+            self.topic = f"{MQTT_TOPIC_PREFIX}/{mac_address}"
+            name = f"gateway_sender_{mac_address}"
+            seed = f"{mac_address}_seed"
+            # Use a dynamic port for each gateway's internal agent to prevent conflicts
+            port = 8100 + (hash(mac_address) % 100)
+        else:
+            self.topic = f"{MQTT_TOPIC_PREFIX}/+"
+            name = f"gateway_sender_shard_{shard_index}"
+            seed = f"echonet_multiplexed_gateway_shard_{shard_index}_seed"
+            port = MULTIPLEXED_GATEWAY_BASE_PORT + shard_index
+        self.port = port
+
+        self.sender_agent = Agent(name=name, seed=seed, port=port)
+        self.sender_agent.on_event("startup")(self.start_forwarding)
+        self.sender_agent.on_interval(period=METRICS_INTERVAL)(self.report_metrics)
+        self._last_report = (time.monotonic(), 0)
+        self._drain_task = None
+
+    async def start_forwarding(self, ctx: Context):
+        """Attaches the MQTT bridge to the agent loop and starts the drain task."""
+        self.bridge.attach(asyncio.get_running_loop())
+        self._drain_task = asyncio.create_task(self.bridge.drain(ctx))
+
+    async def report_metrics(self, ctx: Context):
+        """Logs queue depth and forwarding throughput."""
+        now, forwarded = time.monotonic(), self.bridge.metrics["forwarded"]
+        last_time, last_forwarded = self._last_report
+        rate = (forwarded - last_forwarded) / max(now - last_time, 1e-9)
+        self._last_report = (now, forwarded)
+        ctx.logger.info(f"Queue depth={self.bridge.depth()} rate={rate:.1f} msg/s metrics={self.bridge.metrics}")
+
+    def run_sender_agent(self):
+        """Function to run the agent's event loop."""
+        self.sender_agent.run()
+
+    def on_connect(self, client, userdata, flags, rc, properties):
+        if rc == 0:
+            client.subscribe(self.topic)
+            print(f"Gateway {self.sender_agent.name} connected and subscribed to {self.topic}")
+        else:
+            print(f"Failed to connect, return code {rc}")
+
+    def on_message(self, client, userdata, msg):
+        """
+        This function is called by the MQTT client. It hands the message to the agent loop.
+        """
+        mac_address = msg.topic.rsplit('/', 1)[-1]
+        # Other shards own this device; skip it before paying for JSON decoding.
+        if self.shard_count > 1 and shard_of(mac_address, self.shard_count) != self.shard_index:
+            return
+        try:
+            payload = json.loads(msg.payload.decode())
+            # The gateway now expects the new, simplified SensorData format
+            sensor_data = SensorData(**payload)
+            destination = self.router.address_for(sensor_data.device_id)
+            if destination is None:
+                print(f"Dropping message from unregistered device {sensor_data.device_id}")
+                return
+            self.bridge.submit(destination, sensor_data)
+        except Exception as e:
+            print(f"Error processing message: {e}")
+
+    def run(self):
+        agent_thread = threading.Thread(target=self.run_sender_agent, daemon=True)
+        agent_thread.start()
+        print(f"Sender agent {self.sender_agent.name} is running in the background on port {self.port}.")
+
+        client_id = f"gateway_{self.mac_address}" if self.mac_address else f"gateway_shard_{self.shard_index}_of_{self.shard_count}"
+        print(f"Starting MQTT listener on {self.topic}...")
+        client = make_mqtt_client(client_id, self.broker)
+        client.on_connect = self.on_connect
+        client.on_message = self.on_message
+        client.connect(self.broker, MQTT_PORT, 60)
+        client.loop_forever()
+
+
+def run_shard(shard_index: int, shard_count: int):
+    Gateway(shard_index=shard_index, shard_count=shard_count).run()
+
 
 if __name__ == "__main__":
-    agent_thread = threading.Thread(target=run_sender_agent, daemon=True)
-    agent_thread.start()
-    
-    print(f"Sender agent for {MAC_ADDRESS} is running in the background on port {gateway_agent_port}.")
-    
-    print(f"Starting MQTT listener for MAC {MAC_ADDRESS}...")
-    client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, f"gateway_{MAC_ADDRESS}")
-    client.on_connect = on_connect
-    client.on_message = on_message
-    client.connect(MQTT_BROKER, MQTT_PORT, 60)
-    client.loop_forever()
+    parser = argparse.ArgumentParser(description="EchoNet MQTT -> agent gateway")
+    parser.add_argument("mac_address", nargs="?", help="Serve a single device (legacy per-sensor mode)")
+    parser.add_argument("--all", action="store_true", help="Serve every registered device from one process")
+    parser.add_argument("--shards", type=int, default=1, help="Worker processes to split devices across by MAC hash")
+    args = parser.parse_args()
 
+    if args.mac_address:
+        if get_registry_cache().get(args.mac_address) is None:
+            print(f"Error: Could not find configuration for MAC address {args.mac_address}")
+            sys.exit(1)
+        Gateway(mac_address=args.mac_address).run()
+    elif args.all:
+        if args.shards <= 1:
+            run_shard(0, 1)
+        else:
+            processes = [multiprocessing.Process(target=run_shard, args=(i, args.shards)) for i in range(args.shards)]
+            for p in processes:
+                p.start()
+            for p in processes:
+                p.join()
+    else:
+        parser.print_usage()
+        sys.exit(1)
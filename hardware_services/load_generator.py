@@ -0,0 +1,224 @@
+import argparse
+import asyncio
+import csv
+import itertools
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+# --- Path Configuration ---
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(PROJECT_ROOT)
+
+from fetch_services.registry_cache import get_registry_cache
+from hardware_services.esp32_gateway import MQTT_PORT, MQTT_TOPIC_PREFIX, make_mqtt_client
+
+STREAM_DATA_FILE = os.path.join(PROJECT_ROOT, "hardware_services", "stream_data.csv")
+NOISE_EVENT_PATTERN = re.compile(r'\(noise_event (\S+) (\S+) "([^"]+)" (\d+\.?\d*)\)')
+REPORT_INTERVAL = 5.0
+
+
+# --- Sensor populations ---
+def synthetic_macs(count: int, rng: random.Random) -> list:
+    """Deterministic, locally administered MAC addresses."""
+    macs = set()
+    while len(macs) < count:
+        octets = [0x02] + [rng.randrange(256) for _ in range(5)]
+        macs.add(":".join(f"{o:02X}" for o in octets))
+    return sorted(macs)
+
+def registry_macs() -> list:
+    return sorted(get_registry_cache().sensors())
+
+
+# --- Event sources ---
+def synthetic_events(macs: list, rate: float, arrival: str, selection: str, rng: random.Random):
+    """
+    Yields (delay_before_event, mac, timestamp, decibel) forever.
+
+    The aggregate rate is shared by all sensors; 'arrival' sets the spacing
+    between events (constant, poisson or uniform jitter) and 'selection' which
+    sensor produces each one (uniform, or zipf for a few very chatty sensors).
+    """
+    mean_gap = 1.0 / rate
+    if selection == "zipf":
+        weights = list(itertools.accumulate(1.0 / (i + 1) for i in range(len(macs))))
+    for i in itertools.count():
+        if arrival == "poisson":
+            gap = rng.expovariate(rate)
+        elif arrival == "uniform":
+            gap = rng.uniform(0, 2 * mean_gap)
+        else:
+            gap = mean_gap
+        if selection == "zipf":
+            mac = rng.choices(macs, cum_weights=weights)[0]
+        elif selection == "round_robin":
+            mac = macs[i % len(macs)]
+        else:
+            mac = rng.choice(macs)
+        yield gap, mac, None, rng.uniform(20.0, 95.0)
+
+def read_trace(path: str) -> list:
+    """
+    Reads a recorded trace as [(unix_time, mac, decibel)], sorted by time.
+
+    Supports the stream intercepter's CSV (value, mac_address, timestamp) and
+    noise_event atoms from a knowledge graph (.metta), whose loc_ids are mapped
+    back to a registered MAC at that location when possible.
+    """
+    events = []
+    if path.endswith(".metta"):
+        mac_for_loc = {}
+        for mac, cfg in get_registry_cache().sensors().items():
+            mac_for_loc.setdefault(cfg["loc_id"], mac)
+        with open(path, 'r') as f:
+            for line in f:
+                match = NOISE_EVENT_PATTERN.match(line.strip())
+                if match:
+                    _, loc_id, timestamp, db = match.groups()
+                    events.append((datetime.fromisoformat(timestamp).timestamp(), mac_for_loc.get(loc_id, loc_id), float(db)))
+    else:
+        with open(path, 'r', newline='') as f:
+            for row in csv.reader(f):
+                if len(row) < 3 or row[0] == "value":
+                    continue
+                value, mac, timestamp = row[:3]
+                events.append((datetime.fromisoformat(timestamp).timestamp(), mac, float(value)))
+    events.sort()
+    return events
+
+def replay_events(trace: list, speedup: float, loops: int, restamp: bool):
+    """Yields the trace with its original spacing divided by speedup (0 = as fast as possible)."""
+    if not trace:
+        return  # looping an empty trace forever would never yield
+    for _ in range(loops) if loops > 0 else itertools.count():
+        previous = trace[0][0]
+        for ts, mac, db in trace:
+            gap = (ts - previous) / speedup if speedup > 0 else 0.0
+            previous = ts
+            timestamp = None if restamp else datetime.fromtimestamp(ts, tz=timezone.utc).isoformat()
+            yield gap, mac, timestamp, db
+
+
+# --- Publisher ---
+class LoadGenerator:
+    """
+    Publishes sensor readings at a target rate from a single asyncio task.
+
+    One scheduler walks a global timeline instead of running a thread (and an
+    MQTT connection) per sensor, so the cost depends on the message rate, not
+    on how many sensors are simulated. Readings go out over a small pool of
+    MQTT connections, or straight into the in-process LocalBroker.
+    """
+
+    def __init__(self, events, broker: str, connections: int = 4, duration: float = 0.0, max_events: int = 0):
+        self.events = events
+        self.duration = duration
+        self.max_events = max_events
+        self.clients = []
+        for i in range(max(1, connections)):
+            client = make_mqtt_client(f"echonet_loadgen_{os.getpid()}_{i}", broker)
+            client.connect(broker, MQTT_PORT, 60)
+            client.loop_start()
+            self.clients.append(client)
+        self.sent = 0
+        self.max_lag = 0.0
+
+    def publish(self, mac: str, timestamp: str, decibel: float):
+        # Same payload as esp32_simulator.py, i.e. the SensorData format.
+        payload = {
+            "device_id": mac,
+            "timestamp": timestamp or datetime.now(timezone.utc).isoformat(),
+            "decibel": decibel,
+        }
+        client = self.clients[self.sent % len(self.clients)]
+        client.publish(f"{MQTT_TOPIC_PREFIX}/{mac}", json.dumps(payload))
+        self.sent += 1
+
+    async def run(self) -> dict:
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        due = start
+        last_report, last_sent = start, 0
+        for gap, mac, timestamp, decibel in self.events:
+            due += gap
+            now = loop.time()
+            if due > now:
+                await asyncio.sleep(due - now)
+            else:
+                self.max_lag = max(self.max_lag, now - due)
+                if self.sent % 1000 == 0:
+                    await asyncio.sleep(0)  # keep the loop responsive when behind
+            self.publish(mac, timestamp, decibel)
+
+            now = loop.time()
+            if now - last_report >= REPORT_INTERVAL:
+                print(f"[LoadGen] sent={self.sent} rate={(self.sent - last_sent) / (now - last_report):.0f}/s lag={self.max_lag * 1000:.1f}ms")
+                last_report, last_sent = now, self.sent
+            if (self.duration and now - start >= self.duration) or (self.max_events and self.sent >= self.max_events):
+                break
+
+        elapsed = loop.time() - start
+        for client in self.clients:
+            client.loop_stop()
+        return {"sent": self.sent, "elapsed_s": elapsed, "rate": self.sent / elapsed if elapsed else 0.0,
+                "max_lag_ms": self.max_lag * 1000}
+
+
+def build_events(args, rng: random.Random):
+    if args.replay:
+        trace = read_trace(args.replay)
+        if not trace:
+            sys.exit(f"[LoadGen] No readings in {args.replay}; nothing to replay.")
+        print(f"[LoadGen] Replaying {len(trace)} readings from {args.replay} at x{args.speedup}")
+        return replay_events(trace, args.speedup, args.loops, args.restamp)
+    if args.sensors:
+        # The gateway drops readings from unregistered devices, so these only load MQTT and the gateway.
+        macs = synthetic_macs(args.sensors, rng)
+        print(f"[LoadGen] Simulating {len(macs)} unregistered sensors: readings stop at the gateway.")
+    else:
+        macs = registry_macs()
+        if not macs:
+            sys.exit("[LoadGen] No registered sensors; register devices first or pass --sensors N.")
+    print(f"[LoadGen] Simulating {len(macs)} sensors at {args.rate} msg/s ({args.arrival}, {args.selection})")
+    return synthetic_events(macs, args.rate, args.arrival, args.selection, rng)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="EchoNet sensor load generator")
+    parser.add_argument("--sensors", type=int, default=0,
+                        help="Simulate this many unregistered sensors instead of the registered ones (gateway load only)")
+    parser.add_argument("--rate", type=float, default=1000.0, help="Aggregate readings per second")
+    parser.add_argument("--arrival", choices=["constant", "poisson", "uniform"], default="poisson")
+    parser.add_argument("--selection", choices=["uniform", "zipf", "round_robin"], default="uniform")
+    parser.add_argument("--replay", nargs="?", const=STREAM_DATA_FILE, help="Replay a trace (stream_data.csv or a .metta knowledge graph)")
+    parser.add_argument("--speedup", type=float, default=1.0, help="Replay speed factor; 0 replays as fast as possible")
+    parser.add_argument("--loops", type=int, default=1, help="Times to replay the trace; 0 loops forever")
+    parser.add_argument("--restamp", action="store_true", help="Use the current time instead of the recorded timestamps")
+    parser.add_argument("--broker", default=os.getenv("MQTT_BROKER", "broker.hivemq.com"), help="MQTT host, or 'local' for the in-process broker")
+    parser.add_argument("--connections", type=int, default=4, help="MQTT connections to spread publishing over")
+    parser.add_argument("--with-gateway", action="store_true", help="Also run a multiplexed gateway in this process")
+    parser.add_argument("--duration", type=float, default=60.0, help="Seconds to run; 0 runs until the source is exhausted")
+    parser.add_argument("--max-events", type=int, default=0)
+    parser.add_argument("--seed", type=int, default=42, help="RNG seed, for reproducible runs")
+    parser.add_argument("--report", help="Write the final summary as JSON to this file")
+    args = parser.parse_args()
+
+    if args.with_gateway:
+        from hardware_services.esp32_gateway import Gateway
+        gateway = Gateway(broker=args.broker)
+        threading.Thread(target=gateway.run, daemon=True).start()
+        time.sleep(1.0)  # let the gateway subscribe before publishing
+
+    generator = LoadGenerator(build_events(args, random.Random(args.seed)), args.broker,
+                              connections=args.connections, duration=args.duration, max_events=args.max_events)
+    summary = asyncio.run(generator.run())
+    print(f"[LoadGen] Done: {summary}")
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump(summary, f, indent=2)
@@ -0,0 +1,121 @@
+import queue
+import threading
+from collections import namedtuple
+
+# Minimal stand-in for paho's MQTTMessage: the gateway only reads topic and payload.
+LocalMessage = namedtuple("LocalMessage", ["topic", "payload"])
+
+
+def topic_matches(pattern: str, topic: str) -> bool:
+    """MQTT topic filter matching with '+' (one level) and '#' (all remaining levels)."""
+    pattern_levels = pattern.split('/')
+    topic_levels = topic.split('/')
+    for i, level in enumerate(pattern_levels):
+        if level == '#':
+            return True
+        if i >= len(topic_levels):
+            return False
+        if level != '+' and level != topic_levels[i]:
+            return False
+    return len(pattern_levels) == len(topic_levels)
+
+
+class LocalBroker:
+    """
+    An in-process MQTT broker stand-in for offline, reproducible load tests.
+
+    Publishing is a function call: the message is matched against every
+    subscription and put on the subscribing client's inbox, which that
+    client's network thread delivers to on_message, just like paho does.
+    Exact-topic subscriptions are looked up in a dict; only wildcard filters
+    are scanned, so per-sensor and wildcard gateways both stay cheap.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._exact = {}     # topic -> set of clients
+        self._wildcard = []  # [(pattern, client)]
+        self.published = 0
+
+    def subscribe(self, client, pattern: str):
+        with self._lock:
+            if '+' in pattern or '#' in pattern:
+                self._wildcard.append((pattern, client))
+            else:
+                self._exact.setdefault(pattern, set()).add(client)
+
+    def unsubscribe_all(self, client):
+        with self._lock:
+            self._wildcard = [(p, c) for p, c in self._wildcard if c is not client]
+            for clients in self._exact.values():
+                clients.discard(client)
+
+    def publish(self, topic: str, payload: bytes):
+        self.published += 1
+        message = LocalMessage(topic, payload)
+        with self._lock:
+            targets = set(self._exact.get(topic, ()))
+            targets.update(c for p, c in self._wildcard if topic_matches(p, topic))
+        for client in targets:
+            client._deliver(message)
+
+
+# A process-wide default broker, so a generator and a gateway started in the
+# same process find each other without passing the broker around.
+DEFAULT_BROKER = LocalBroker()
+
+
+class LocalClient:
+    """
+    Implements the subset of paho.mqtt.client.Client used by the gateway and
+    the load generator, on top of a LocalBroker.
+    """
+
+    def __init__(self, client_id: str = "", broker: LocalBroker = DEFAULT_BROKER):
+        self.client_id = client_id
+        self.broker = broker
+        self.on_connect = None
+        self.on_message = None
+        self._inbox = queue.Queue()
+        self._thread = None
+        self._stopped = threading.Event()
+
+    # --- paho-compatible API ---
+    def connect(self, host: str = "local", port: int = 0, keepalive: int = 60):
+        if self.on_connect:
+            self.on_connect(self, None, {}, 0, None)
+        return 0
+
+    def subscribe(self, topic: str, qos: int = 0):
+        self.broker.subscribe(self, topic)
+
+    def publish(self, topic: str, payload=None, qos: int = 0, retain: bool = False):
+        if isinstance(payload, str):
+            payload = payload.encode()
+        self.broker.publish(topic, payload)
+
+    def loop_forever(self):
+        while not self._stopped.is_set():
+            message = self._inbox.get()
+            if message is None:
+                break
+            if self.on_message:
+                self.on_message(self, None, message)
+
+    def loop_start(self):
+        self._thread = threading.Thread(target=self.loop_forever, daemon=True)
+        self._thread.start()
+
+    def loop_stop(self):
+        self._stopped.set()
+        self._inbox.put(None)
+        if self._thread is not None:
+            self._thread.join()
+
+    def disconnect(self):
+        self.broker.unsubscribe_all(self)
+        self.loop_stop()
+
+    # --- Broker side ---
+    def _deliver(self, message: LocalMessage):
+        self._inbox.put(message)
@@ -1,9 +1,11 @@
 from flask import Flask, request, jsonify, render_template
 from flask_cors import CORS
+import csv
+import io
 import json
-import subprocess
 import os
 import sys
+import threading
 from mnemonic import Mnemonic
 import numpy as np
 from web3 import Web3
@@ -16,6 +18,9 @@ PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.append(PROJECT_ROOT)
 SENSOR_REGISTRY_FILE = os.path.join(PROJECT_ROOT, "sensor_registry.json")
 
+from fetch_services.registry_store import open_registry_store, DuplicateDeviceError
+from payment_services.provisioner import Provisioner, launch_device
+
 try:
     from config.settings import ETHEREUM_NODE_URL, ECHONET_STAKING_CONTRACT_ADDRESS, CONTRACT_OWNER_PRIVATE_KEY
 except ImportError:
@@ -39,18 +44,36 @@ staking_contract = w3.eth.contract(address=ECHONET_STAKING_CONTRACT_ADDRESS, abi
 print(f"Connected to blockchain. Contract Owner Address: {owner_account.address}")
 
 
-def read_registry():
-    """Safely reads the shared sensor registry file."""
-    if not os.path.exists(SENSOR_REGISTRY_FILE):
-        # If the file doesn't exist, start with a default structure.
-        return {"_network_services": {}}
-    with open(SENSOR_REGISTRY_FILE, 'r') as f:
-        return json.load(f)
+# --- Registry Storage ---
+# Registrations are committed to the registry store (SQLite by default). The
+# legacy sensor_registry.json is kept as an export for tools that still read
+# it, and is rewritten at most once per REGISTRY_EXPORT_DELAY seconds.
+registry_store = open_registry_store()
+REGISTRY_EXPORT_DELAY = 2.0
+_export_timer = None
+_export_lock = threading.Lock()
 
-def write_registry(registry):
-    """Safely writes to the shared sensor registry file."""
-    with open(SENSOR_REGISTRY_FILE, 'w') as f:
-        json.dump(registry, f, indent=4)
+def _export_registry():
+    global _export_timer
+    with _export_lock:
+        _export_timer = None
+    try:
+        registry_store.export_json(SENSOR_REGISTRY_FILE)
+    except OSError as e:
+        print(f"[API] Failed to export registry JSON: {e}")
+
+def schedule_registry_export():
+    """Coalesces registry changes into one JSON export after a short delay."""
+    global _export_timer
+    with _export_lock:
+        if _export_timer is None:
+            _export_timer = threading.Timer(REGISTRY_EXPORT_DELAY, _export_registry)
+            _export_timer.daemon = True
+            _export_timer.start()
+
+# Agents and gateways for bulk registrations are launched in the background.
+provisioner = Provisioner()
+MAX_BULK_DEVICES = 50000
 
 @app.route('/')
 def index():
@@ -65,67 +88,38 @@ def register_sensor():
     """
     data = request.json
     mac_address = data.get('mac_address')
-    
-    registry = read_registry()
-    if mac_address in registry:
-        return jsonify({"status": "error", "message": "This device (MAC address) is already registered."}), 409
 
     # --- Section 1.A: Manage the Sensor Registry ---
 
     # 1. Standardize the location name as per the prompt.
     location_name = f"{data.get('area').strip()}, {data.get('sector_no').strip()}, {data.get('city').strip()}"
-    
-    # 2. Check for existing locations to reuse the location ID (loc_id).
-    loc_id = None
-    # Create a dictionary of existing location names and their corresponding IDs.
-    # We must exclude the '_network_services' key from this check.
-    existing_locations = {v['name']: v['loc_id'] for k, v in registry.items() if not k.startswith('_')}
-    
-    if location_name in existing_locations:
-        loc_id = existing_locations[location_name]
-        print(f"[API] Reusing existing location ID '{loc_id}' for '{location_name}'")
-    else:
-        # 3. If it's a new location, generate a new, unique, sequential ID.
-        new_id_num = len(existing_locations) + 1
-        loc_id = f"LOC{str(new_id_num).zfill(3)}" # e.g., LOC001, LOC002
-        print(f"[API] Creating new location ID '{loc_id}' for '{location_name}'")
 
     # --- Section 1.B: Launch the Worker Agent ---
-    
-    # 4. Generate a new, unique identity for the worker agent.
-    # We count only the actual devices, not the network services entry.
-    agent_count = len({k: v for k, v in registry.items() if not k.startswith('_')})
-    agent_name = f"worker_agent_{agent_count + 1}"
-    new_port = 8010 + agent_count # Use a different port range for workers to avoid conflicts
+
+    # 2. Generate a new, unique identity for the worker agent.
     new_seed = Mnemonic("english").generate(strength=128)
-    
-    # 5. Add the complete new entry to the registry.
-    registry[mac_address] = {
-        "loc_id": loc_id,
-        "name": location_name,
-        "latitude": float(data.get('latitude')),
-        "longitude": float(data.get('longitude')),
-        "agent_name": agent_name,
-        "agent_seed": new_seed,
-        "agent_port": new_port
-    }
-    write_registry(registry)
-
-    # 6. Launch the new worker agent and its dedicated gateway process.
-    python_executable = sys.executable
+
+    # 3. Add the complete new entry to the registry in one transaction. The store
+    # reuses the loc_id of a known location name, or allocates the next one, and
+    # assigns the agent name and port from monotonic counters.
     try:
-        # Construct absolute paths to the scripts to be launched.
-        agent_script_path = os.path.join(PROJECT_ROOT, "fetch_services", "agents", "regional_agent.py")
-        gateway_script_path = os.path.join(PROJECT_ROOT, "hardware_services", "esp32_gateway.py")
+        entry = registry_store.register_sensor(
+            mac_address, location_name,
+            float(data.get('latitude')), float(data.get('longitude')),
+            new_seed,
+        )
+    except DuplicateDeviceError:
+        return jsonify({"status": "error", "message": "This device (MAC address) is already registered."}), 409
+    schedule_registry_export()
+
+    agent_name = entry["agent_name"]
+    print(f"[API] Registered {mac_address} at location ID '{entry['loc_id']}' for '{location_name}'")
 
-        # The agent and gateway are started with only the MAC address.
-        # They will use this MAC to look up their full configuration in the registry.
+    # 4. Launch the device's gateway and place its agent in a worker host
+    # (or launch a dedicated agent process when worker hosts are disabled).
+    try:
         print(f"Launching agent: {agent_name} for MAC: {mac_address}")
-        subprocess.Popen([python_executable, agent_script_path, mac_address])
-        
-        print(f"Launching gateway for MAC: {mac_address}")
-        subprocess.Popen([python_executable, gateway_script_path, mac_address])
-        
+        launch_device(mac_address, entry)
     except Exception as e:
         return jsonify({"status": "error", "message": f"Failed to launch processes: {e}"}), 500
 
@@ -134,6 +128,101 @@ def register_sensor():
         "message": f"Agent '{agent_name}' for device {mac_address} registered and launched successfully."
     })
 
+def parse_bulk_devices(req) -> list:
+    """Reads a device list from a JSON array or a CSV body with a header row."""
+    if req.mimetype in ("text/csv", "application/csv") or req.args.get("format") == "csv":
+        return list(csv.DictReader(io.StringIO(req.get_data(as_text=True))))
+    data = req.get_json(silent=True)
+    if isinstance(data, dict):
+        data = data.get("devices")
+    if not isinstance(data, list):
+        raise ValueError("Expected a JSON array of devices or a CSV body.")
+    return data
+
+def validate_device(device) -> tuple:
+    """
+    Validates one bulk registration row, using the same fields as /register.
+
+    Returns:
+        (normalized_device, None) if the row is valid, otherwise (None, error message).
+    """
+    if not isinstance(device, dict):
+        return None, "Device must be an object."
+    mac_address = str(device.get('mac_address') or '').strip()
+    if not mac_address:
+        return None, "MAC address is required."
+    try:
+        fields = [str(device[key]).strip() for key in ('area', 'sector_no', 'city')]
+        latitude, longitude = float(device['latitude']), float(device['longitude'])
+    except (KeyError, TypeError, ValueError):
+        return None, "area, sector_no, city, latitude and longitude are required."
+    if not all(fields):
+        return None, "area, sector_no and city must not be empty."
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        return None, "Latitude/longitude out of range."
+    return {
+        "mac_address": mac_address,
+        "name": ", ".join(fields),
+        "latitude": latitude,
+        "longitude": longitude,
+    }, None
+
+@app.route('/register/bulk', methods=['POST'])
+def register_sensors_bulk():
+    """
+    Registers many sensors in one call. Accepts a JSON array (or {"devices": [...]})
+    or a CSV file with the same columns as /register. All valid devices are
+    committed in a single registry transaction; their agents and gateways are
+    then provisioned in the background in batches.
+    """
+    try:
+        devices = parse_bulk_devices(request)
+    except (ValueError, csv.Error) as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    if len(devices) > MAX_BULK_DEVICES:
+        return jsonify({"status": "error", "message": f"At most {MAX_BULK_DEVICES} devices per request."}), 413
+
+    # 1. Validate every row and reject duplicate MACs within the request itself.
+    results = [None] * len(devices)
+    to_register, positions, seen = [], [], set()
+    mnemonic = Mnemonic("english")
+    for i, device in enumerate(devices):
+        normalized, error = validate_device(device)
+        if normalized and normalized["mac_address"] in seen:
+            normalized, error = None, "Duplicate MAC address in request."
+        if error:
+            mac = device.get('mac_address') if isinstance(device, dict) else None
+            results[i] = {"mac_address": mac, "status": "error", "message": error}
+            continue
+        seen.add(normalized["mac_address"])
+        normalized["agent_seed"] = mnemonic.generate(strength=128)
+        to_register.append(normalized)
+        positions.append(i)
+
+    # 2. Assign IDs and commit all valid devices in one transaction.
+    registered = []
+    for i, device, (entry, error) in zip(positions, to_register, registry_store.register_many(to_register)):
+        if error:
+            results[i] = {"mac_address": device["mac_address"], "status": "error", "message": error}
+        else:
+            results[i] = {"mac_address": device["mac_address"], "status": "registered",
+                          "loc_id": entry["loc_id"], "agent_name": entry["agent_name"],
+                          "host_id": entry.get("host_id")}
+            registered.append((device["mac_address"], entry))
+
+    # 3. Hand the new devices to the background provisioner.
+    if registered:
+        schedule_registry_export()
+        provisioner.schedule(registered)
+
+    return jsonify({
+        "status": "success",
+        "registered": len(registered),
+        "failed": len(devices) - len(registered),
+        "provisioning_queued": provisioner.pending(),
+        "results": results,
+    })
+
 @app.route('/request-slash', methods=['POST'])
 def request_slash():
     data = request.json
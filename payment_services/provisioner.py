@@ -0,0 +1,147 @@
+import os
+import sys
+import time
+import queue
+import socket
+import subprocess
+import threading
+
+from fetch_services.registry_store import host_port
+
+try:
+    from config.settings import GATEWAY_MODE, GATEWAY_SHARDS
+except ImportError:
+    GATEWAY_MODE = "multiplexed"
+    GATEWAY_SHARDS = 1
+
+# --- Path Configuration ---
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+AGENT_SCRIPT_PATH = os.path.join(PROJECT_ROOT, "fetch_services", "agents", "regional_agent.py")
+WORKER_HOST_SCRIPT_PATH = os.path.join(PROJECT_ROOT, "fetch_services", "agents", "worker_host.py")
+GATEWAY_SCRIPT_PATH = os.path.join(PROJECT_ROOT, "hardware_services", "esp32_gateway.py")
+
+# Port of the first multiplexed gateway shard (see esp32_gateway.py).
+MULTIPLEXED_GATEWAY_PORT = 8300
+
+# --- Tunable Parameters ---
+PROVISION_BATCH_SIZE = 50      # Devices launched per batch
+PROVISION_BATCH_INTERVAL = 1.0  # Seconds between two batches
+
+
+class Provisioner:
+    """
+    Launches worker agents and gateways for registered devices in the background.
+
+    Registration only enqueues MAC addresses; a single thread drains the queue
+    in batches of PROVISION_BATCH_SIZE and pauses between batches, so onboarding
+    thousands of devices does not fork thousands of processes at once or hold
+    up the HTTP response.
+    """
+
+    def __init__(self, batch_size: int = PROVISION_BATCH_SIZE, batch_interval: float = PROVISION_BATCH_INTERVAL):
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="provisioner", daemon=True)
+        self._thread.start()
+
+    def schedule(self, devices: list):
+        """Queues (mac_address, registry_entry) pairs for provisioning and returns immediately."""
+        for device in devices:
+            self._queue.put(device)
+
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def _next_batch(self) -> list:
+        batch = [self._queue.get()]  # blocks until there is work
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            print(f"[Provisioner] Launching {len(batch)} device(s), {self.pending()} still queued")
+            for mac, entry in batch:
+                try:
+                    launch_device(mac, entry)
+                except Exception as e:
+                    print(f"[Provisioner] Failed to launch processes for {mac}: {e}")
+            time.sleep(self.batch_interval)
+
+
+# --- Worker hosts ---
+# Host processes started by this API, so a host is never launched twice.
+_HOST_PROCESSES = {}
+_HOST_LOCK = threading.Lock()
+
+def _port_in_use(port: int) -> bool:
+    try:
+        with socket.create_connection(("127.0.0.1", port), timeout=0.2):
+            return True
+    except OSError:
+        return False
+
+def ensure_worker_host(host_id: str) -> bool:
+    """
+    Makes sure the worker host process for host_id is running.
+    A running host picks up newly assigned devices from the registry by itself.
+
+    Returns:
+        True if a new host process was started.
+    """
+    with _HOST_LOCK:
+        process = _HOST_PROCESSES.get(host_id)
+        if process is not None and process.poll() is None:
+            return False
+        # A host started before this API process (re)started still owns its port.
+        if process is None and _port_in_use(host_port(host_id)):
+            return False
+        print(f"[Provisioner] Launching worker host {host_id} on port {host_port(host_id)}")
+        _HOST_PROCESSES[host_id] = subprocess.Popen([sys.executable, WORKER_HOST_SCRIPT_PATH, host_id])
+        return True
+
+# --- Gateway ---
+_GATEWAY_PROCESS = None
+
+def ensure_multiplexed_gateway() -> bool:
+    """
+    Makes sure the shared gateway for all sensors is running. It routes new
+    devices by itself once they appear in the registry.
+
+    Returns:
+        True if a new gateway process was started.
+    """
+    global _GATEWAY_PROCESS
+    with _HOST_LOCK:
+        if _GATEWAY_PROCESS is not None and _GATEWAY_PROCESS.poll() is None:
+            return False
+        if _GATEWAY_PROCESS is None and _port_in_use(MULTIPLEXED_GATEWAY_PORT):
+            return False
+        print(f"[Provisioner] Launching multiplexed gateway with {GATEWAY_SHARDS} shard(s)")
+        _GATEWAY_PROCESS = subprocess.Popen(
+            [sys.executable, GATEWAY_SCRIPT_PATH, "--all", "--shards", str(GATEWAY_SHARDS)]
+        )
+        return True
+
+def launch_device(mac_address: str, entry: dict):
+    """
+    Starts what a newly registered device needs: a gateway route, plus either a
+    place in its worker host or, without a host assignment, a dedicated agent.
+    """
+    python_executable = sys.executable
+    # The agent and gateway are started with only the MAC address.
+    # They will use this MAC to look up their full configuration in the registry.
+    if entry.get("host_id"):
+        ensure_worker_host(entry["host_id"])
+    else:
+        subprocess.Popen([python_executable, AGENT_SCRIPT_PATH, mac_address])
+
+    if GATEWAY_MODE == "multiplexed":
+        ensure_multiplexed_gateway()
+    else:
+        subprocess.Popen([python_executable, GATEWAY_SCRIPT_PATH, mac_address])
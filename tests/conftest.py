@@ -0,0 +1,7 @@
+import os
+import sys
+
+# --- Path Configuration ---
+# The services import each other from the project root, as they do when run as scripts.
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(PROJECT_ROOT)
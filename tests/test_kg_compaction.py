@@ -0,0 +1,95 @@
+import math
+from datetime import datetime, timedelta, timezone
+
+from fetch_services.kg_compaction import SUMMARY_ATOM, GraphCompactor, Rollup, is_night
+
+DAY = 24 * 3600.0
+START = datetime(2026, 1, 1, tzinfo=timezone.utc)
+NOW = (START + timedelta(days=60)).timestamp()
+HEADER = "; EchoNet knowledge graph\n(location LOC001 \"Main Street\" 12.97 77.59)\n"
+
+
+def event(event_id: str, moment: datetime, db: float, loc_id: str = "LOC001") -> str:
+    return f'(noise_event {event_id} {loc_id} "{moment.isoformat()}" {db})\n'
+
+
+def summaries(text: str) -> dict:
+    """Every location's summaries merged into one Rollup."""
+    rollups = {}
+    for line in text.splitlines():
+        match = SUMMARY_ATOM.match(line)
+        if match:
+            rollups.setdefault(match.group(2), Rollup()).merge(Rollup.from_atom(*match.groups()[3:]))
+    return rollups
+
+
+def readings(count: int) -> list:
+    """(moment, db) pairs spread over the first 50 days, with levels that do not round nicely."""
+    return [(START + timedelta(minutes=97 * i), 35.0 + (i * 7.3) % 55) for i in range(count)]
+
+
+def expected(pairs: list) -> Rollup:
+    rollup = Rollup()
+    for moment, db in pairs:
+        rollup.add(db, is_night(moment))
+    return rollup
+
+
+def assert_same(actual: Rollup, wanted: Rollup):
+    assert actual.count == wanted.count
+    assert actual.night_count == wanted.night_count
+    assert actual.maximum == wanted.maximum
+    assert math.isclose(actual.mean, wanted.mean, rel_tol=1e-12)
+    assert math.isclose(actual.leq, wanted.leq, rel_tol=1e-12)
+    assert math.isclose(actual.night_mean, wanted.night_mean, rel_tol=1e-12)
+
+
+def test_old_events_are_rolled_up_and_recent_ones_kept():
+    old, recent = START + timedelta(days=1, hours=2, minutes=10), START + timedelta(days=59, hours=23)
+    text = HEADER + event("N001", old, 60.0) + event("N002", old + timedelta(minutes=5), 70.0) + event("N003", recent, 50.0)
+
+    compacted, stats = GraphCompactor(raw_horizon=7 * DAY, hourly_horizon=90 * DAY)(text, NOW)
+
+    assert stats["rolled_up"] == 2 and stats["retained"] == 1 and stats["summaries"] == 1
+    assert compacted.startswith(HEADER)
+    assert event("N003", recent, 50.0) in compacted
+    assert "N001" not in compacted and "N002" not in compacted
+    assert_same(summaries(compacted)["LOC001"], expected([(old, 60.0), (old + timedelta(minutes=5), 70.0)]))
+
+
+def test_repeated_atoms_in_the_text_are_merged():
+    moment = START + timedelta(days=2)
+    text = HEADER + event("N001", moment, 65.0) + event("N002", moment, 65.0)
+
+    compacted, stats = GraphCompactor(raw_horizon=7 * DAY)(text, NOW)
+
+    assert stats["duplicates"] == 1
+    assert summaries(compacted)["LOC001"].count == 1
+
+
+def test_recompaction_is_exact():
+    pairs = readings(700)
+    compactor = GraphCompactor(raw_horizon=7 * DAY, hourly_horizon=20 * DAY)
+    text, chunk = HEADER, 70
+    # Events arrive in ten batches and the graph is compacted after each, as the Notary does.
+    for index in range(0, len(pairs), chunk):
+        text += "".join(event(f"N{i:04d}", *pairs[i]) for i in range(index, index + chunk))
+        text, _ = compactor(text, NOW)
+    for _ in range(3):
+        text, _ = compactor(text, NOW)
+
+    assert_same(summaries(text)["LOC001"], expected(pairs))
+
+
+def test_late_events_are_added_to_their_period():
+    compactor = GraphCompactor(raw_horizon=7 * DAY, hourly_horizon=20 * DAY)
+    hourly, daily = START + timedelta(days=45, hours=5), START + timedelta(days=3, hours=5)
+    text, _ = compactor(HEADER + event("N001", hourly, 55.0) + event("N002", daily, 55.0), NOW)
+
+    # Distinct readings from the same location, an hour earlier, published after the compaction.
+    late = [(hourly - timedelta(hours=1), 80.0), (daily - timedelta(hours=1), 80.0)]
+    text += event("N003", *late[0]) + event("N004", *late[1])
+    text, stats = compactor(text, NOW)
+
+    assert stats["duplicates"] == 0 and stats["rolled_up"] == 2
+    assert_same(summaries(text)["LOC001"], expected([(hourly, 55.0), (daily, 55.0)] + late))
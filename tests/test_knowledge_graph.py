@@ -0,0 +1,60 @@
+import asyncio
+
+from fetch_services.knowledge_graph import KnowledgeGraphWriter, LocalGraphStore
+
+
+def fact(event_id: str) -> str:
+    return f'(noise_event {event_id} LOC001 "2026-01-01T12:00:00+00:00" 70.0)\n'
+
+
+def head_segment(store: LocalGraphStore, writer: KnowledgeGraphWriter) -> str:
+    return store._read(writer.manifest["segments"][-1]["name"])
+
+
+def test_recovery_skips_only_the_facts_the_last_flush_published(tmp_path):
+    store = LocalGraphStore(str(tmp_path))
+
+    async def scenario():
+        writer = KnowledgeGraphWriter(store, interval=3600)
+        await writer.start()
+        writer.append(fact("N001"))
+        writer.append(fact("N002"))
+        assert await writer.flush() == 2
+        # N003 arrived while that flush was in flight, then the Notary crashed before
+        # recording N001 and N002 as published: all three come back on restart.
+        published = []
+        restarted = KnowledgeGraphWriter(store, interval=3600, on_flush=published.append)
+        recovered = await restarted.start(pending=[fact("N001"), fact("N002"), fact("N003")])
+        remaining = len(restarted)
+        await restarted.flush()
+        await restarted.close()
+        await writer.close()
+        return recovered, remaining, published, head_segment(store, restarted)
+
+    recovered, remaining, published, content = asyncio.run(scenario())
+
+    assert recovered == 3
+    assert remaining == 1
+    assert published == [2, 1]
+    assert content == fact("N001") + fact("N002") + fact("N003")
+
+
+def test_recovery_republishes_facts_missing_from_the_segment(tmp_path):
+    store = LocalGraphStore(str(tmp_path))
+
+    async def scenario():
+        writer = KnowledgeGraphWriter(store, interval=3600)
+        await writer.start()
+        writer.append(fact("N001"))
+        await writer.flush()
+        await writer.close()
+        restarted = KnowledgeGraphWriter(store, interval=3600)
+        await restarted.start(pending=[fact("N002")])
+        remaining = len(restarted)
+        await restarted.close()
+        return remaining, head_segment(store, restarted)
+
+    remaining, content = asyncio.run(scenario())
+
+    assert remaining == 1
+    assert content == fact("N001") + fact("N002")
@@ -0,0 +1,62 @@
+import asyncio
+import functools
+from types import SimpleNamespace
+
+from uagents_core.types import DeliveryStatus, MsgStatus
+
+from fetch_services.agents import regional_agent
+from fetch_services.agents.regional_agent import RegionalWorker
+from fetch_services.outbox import Outbox, Sink
+
+NOTARY = "agent1qnotary"
+EVENT = {
+    "raw_data": {"device_id": "00:1A:2B:3C:4D:5E", "timestamp": "2026-01-01T12:00:00+00:00", "decibel": 72.5},
+    "location": {"latitude": 12.97, "longitude": 77.59},
+}
+
+
+class StubContext:
+    """Answers ctx.send with the given delivery statuses in turn, like uagents does instead of raising."""
+
+    def __init__(self, *statuses):
+        self.statuses = list(statuses)
+        self.sent = []
+
+    async def send(self, destination, message):
+        self.sent.append((destination, message))
+        status = self.statuses.pop(0) if len(self.statuses) > 1 else self.statuses[0]
+        return MsgStatus(status=status, detail="stub", destination=destination, endpoint="", session=None)
+
+
+def notary_sink(ctx):
+    return functools.partial(RegionalWorker.send_facts, SimpleNamespace(ctx=ctx))
+
+
+def test_send_facts_reports_failed_deliveries(monkeypatch):
+    monkeypatch.setattr(regional_agent, "NOTARY_AGENT_ADDRESS", NOTARY)
+    ctx = StubContext(DeliveryStatus.FAILED, DeliveryStatus.DELIVERED)
+
+    results = asyncio.run(notary_sink(ctx)([{"payload": EVENT}, {"payload": EVENT}]))
+
+    assert isinstance(results[0], Exception)
+    assert results[1] is None
+    assert [destination for destination, _ in ctx.sent] == [NOTARY, NOTARY]
+
+
+def test_outbox_retries_facts_the_notary_did_not_receive(monkeypatch, tmp_path):
+    monkeypatch.setattr(regional_agent, "NOTARY_AGENT_ADDRESS", NOTARY)
+    ctx = StubContext(DeliveryStatus.FAILED, DeliveryStatus.FAILED, DeliveryStatus.DELIVERED)
+
+    async def deliver():
+        outbox = Outbox(str(tmp_path / "outbox.jsonl"), sinks=[Sink("notary", notary_sink(ctx), backoff=0.01)])
+        outbox.start()
+        outbox.put(EVENT)
+        for _ in range(100):
+            if not len(outbox):
+                break
+            await asyncio.sleep(0.01)
+        await outbox.stop()
+        return len(outbox)
+
+    assert asyncio.run(deliver()) == 0
+    assert len(ctx.sent) == 3
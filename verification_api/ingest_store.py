@@ -0,0 +1,291 @@
+import os
+import json
+import math
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, deque
+from datetime import datetime, timezone
+
+# --- Path Configuration ---
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+try:
+    from config.settings import INGEST_DATA_DIR, INGEST_QUEUE_MAX, INGEST_COMMIT_MAX, INGEST_COMMIT_LINGER
+except ImportError:
+    INGEST_DATA_DIR = os.path.join(PROJECT_ROOT, "ingest_data")
+    INGEST_QUEUE_MAX = 100000
+    INGEST_COMMIT_MAX = 5000
+    INGEST_COMMIT_LINGER = 0.005
+
+# Location partition: packets are indexed by the grid cell of their coordinates.
+CELL_SIZE_DEG = 0.1
+# Day partitions the writer keeps open; older ones are closed until written to again.
+OPEN_PARTITIONS = 3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY,
+    received_at REAL NOT NULL,
+    ts REAL,
+    timestamp TEXT,
+    cell TEXT,
+    device_id TEXT,
+    event TEXT,
+    decibel REAL,
+    confidence REAL,
+    latitude REAL,
+    longitude REAL,
+    validated INTEGER,
+    orchestrator_address TEXT,
+    validator_addresses TEXT,
+    raw_data_ipfs_link TEXT
+);
+CREATE INDEX IF NOT EXISTS events_by_cell ON events (cell, ts);
+-- One row per reading: a packet delivered (or committed) twice is stored once.
+CREATE UNIQUE INDEX IF NOT EXISTS events_by_reading ON events (device_id, ts);
+"""
+
+INSERT = """
+INSERT OR IGNORE INTO events (received_at, ts, timestamp, cell, device_id, event, decibel, confidence,
+                    latitude, longitude, validated, orchestrator_address, validator_addresses, raw_data_ipfs_link)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+
+class InvalidPacket(ValueError):
+    """A packet that cannot be stored; the API answers 400."""
+
+
+def cell_of(latitude, longitude) -> str:
+    """The location partition key of a coordinate, e.g. '-338:1512'."""
+    if latitude is None or longitude is None:
+        return None
+    return f"{math.floor(latitude / CELL_SIZE_DEG)}:{math.floor(longitude / CELL_SIZE_DEG)}"
+
+
+def _number(value, field: str):
+    if value is None:
+        return None
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+        raise InvalidPacket(f"'{field}' must be a number, got {value!r}")
+    return float(value)
+
+
+def to_row(packet: dict, received_at: float) -> tuple:
+    """
+    Flattens one EnrichedData packet into (day partition, events row).
+
+    Raises:
+        InvalidPacket: If a field has the wrong type.
+    """
+    timestamp = packet.get("timestamp")
+    try:
+        moment = datetime.fromisoformat(timestamp)
+        if moment.tzinfo is None:
+            moment = moment.replace(tzinfo=timezone.utc)
+    except (TypeError, ValueError):
+        moment = datetime.fromtimestamp(received_at, timezone.utc)
+    location = packet.get("location") or {}
+    if not isinstance(location, dict):
+        raise InvalidPacket(f"'location' must be an object, got {location!r}")
+    latitude = _number(location.get("latitude"), "location.latitude")
+    longitude = _number(location.get("longitude"), "location.longitude")
+    for field in ("device_id", "event", "orchestrator_address", "raw_data_ipfs_link"):
+        if packet.get(field) is not None and not isinstance(packet[field], str):
+            raise InvalidPacket(f"'{field}' must be a string, got {packet[field]!r}")
+    validators = packet.get("validator_addresses") or []
+    if not isinstance(validators, list):
+        raise InvalidPacket(f"'validator_addresses' must be a list, got {validators!r}")
+    day = moment.astimezone(timezone.utc).strftime("%Y-%m-%d")
+    return day, (
+        received_at, moment.timestamp(), timestamp if isinstance(timestamp, str) else None, cell_of(latitude, longitude),
+        packet.get("device_id"), packet.get("event"), _number(packet.get("decibel"), "decibel"),
+        _number(packet.get("confidence"), "confidence"),
+        latitude, longitude, int(bool(packet.get("validated"))), packet.get("orchestrator_address"),
+        json.dumps(validators), packet.get("raw_data_ipfs_link"),
+    )
+
+
+class PendingWrite:
+    """
+    A batch of packets waiting for the writer; wait() returns once it is committed.
+
+    The packets are flattened into rows on construction, on the request's own
+    thread, so a malformed packet is refused there and never reaches a group
+    commit shared with other requests.
+    """
+
+    __slots__ = ("packets", "received_at", "rows", "_done", "error")
+
+    def __init__(self, packets: list):
+        self.packets = packets
+        self.received_at = time.time()
+        self.rows = [to_row(packet, self.received_at) for packet in packets]
+        self._done = threading.Event()
+        self.error = None
+
+    def wait(self, timeout: float = None) -> bool:
+        """True once the batch is committed; raises if the commit failed."""
+        if not self._done.wait(timeout):
+            return False
+        if self.error is not None:
+            raise self.error
+        return True
+
+    def finish(self, error: Exception = None):
+        self.error = error
+        self._done.set()
+
+
+class IngestStore:
+    """
+    Append-only storage for ingested EnrichedData packets.
+
+    Packets are partitioned by day (of their reading timestamp, UTC): each day
+    is its own SQLite database in WAL mode under root, with the rows indexed by
+    location cell and by device. Old days can be archived or deleted as whole
+    files without touching the current one.
+
+    A single writer thread owns the connections. Request threads hand it
+    batches through a bounded queue; it drains everything queued (up to
+    commit_max packets, lingering commit_linger seconds for more) and commits
+    it as one transaction per partition, so the cost of a commit is shared by
+    every request in it. When max_queued packets are already waiting, submit()
+    refuses the batch and the API answers 503 instead of buffering without bound.
+
+    Inserts ignore readings (device, timestamp) already stored, so a group
+    that failed halfway through its partitions can be written again safely.
+    If a group commit fails, each of its batches is retried on its own, so a
+    failure only reaches the requests it belongs to.
+    """
+
+    def __init__(self, root: str = INGEST_DATA_DIR, max_queued: int = INGEST_QUEUE_MAX,
+                 commit_max: int = INGEST_COMMIT_MAX, commit_linger: float = INGEST_COMMIT_LINGER):
+        self.root = root
+        self.max_queued = max_queued
+        self.commit_max = commit_max
+        self.commit_linger = commit_linger
+        os.makedirs(root, exist_ok=True)
+
+        self._lock = threading.Condition()
+        self._queue = deque()  # PendingWrite batches, oldest first
+        self._queued = 0       # packets across the queued batches
+        self._connections = OrderedDict() # day -> sqlite3.Connection, most recently used last; writer thread only
+        self._closed = False
+        self.written = 0
+        self.commits = 0
+        self.rejected = 0
+
+        self._writer = threading.Thread(target=self._run, name="ingest-writer", daemon=True)
+        self._writer.start()
+
+    # --- Request side ---
+    def submit(self, packets: list):
+        """
+        Queues packets for the next group commit.
+
+        Returns:
+            A PendingWrite to wait() on, or None if the queue is full.
+
+        Raises:
+            InvalidPacket: If a packet cannot be stored; nothing is queued.
+        """
+        pending = PendingWrite(packets)
+        with self._lock:
+            if self._closed or self._queued + len(packets) > self.max_queued:
+                self.rejected += len(packets)
+                return None
+            self._queue.append(pending)
+            self._queued += len(packets)
+            self._lock.notify()
+        return pending
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"queued": self._queued, "max_queued": self.max_queued, "written": self.written,
+                    "commits": self.commits, "rejected": self.rejected,
+                    "partitions": sorted(name[len("events-"):-len(".db")] for name in os.listdir(self.root)
+                                         if name.startswith("events-") and name.endswith(".db"))}
+
+    def close(self):
+        """Commits everything already queued, then stops the writer."""
+        with self._lock:
+            self._closed = True
+            self._lock.notify()
+        self._writer.join()
+
+    # --- Writer thread ---
+    def _connection(self, day: str) -> sqlite3.Connection:
+        connection = self._connections.get(day)
+        if connection is not None:
+            self._connections.move_to_end(day)
+        else:
+            connection = sqlite3.connect(os.path.join(self.root, f"events-{day}.db"))
+            connection.execute("PRAGMA journal_mode=WAL")
+            # In WAL mode NORMAL only syncs at checkpoints: a commit survives a crash of
+            # this process, and the last few can be lost to a power failure.
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.executescript(SCHEMA)
+            self._connections[day] = connection
+            # Timestamps come from clients: keep only the recently used days open.
+            while len(self._connections) > OPEN_PARTITIONS:
+                _, stale = self._connections.popitem(last=False)
+                stale.close()
+        return connection
+
+    def _take_batches(self) -> list:
+        """Blocks until there is work, then takes up to commit_max packets' worth of batches."""
+        with self._lock:
+            while not self._queue and not self._closed:
+                self._lock.wait()
+            if not self._queue:
+                return []
+            if self._queued < self.commit_max and not self._closed:
+                # Let concurrent requests join this commit.
+                self._lock.wait(self.commit_linger)
+            batches, taken = [], 0
+            while self._queue and (not batches or taken + len(self._queue[0].packets) <= self.commit_max):
+                batch = self._queue.popleft()
+                batches.append(batch)
+                taken += len(batch.packets)
+            self._queued -= taken
+            return batches
+
+    def _commit(self, batches: list):
+        partitions = {}
+        for batch in batches:
+            for day, row in batch.rows:
+                partitions.setdefault(day, []).append(row)
+        written = 0
+        for day, rows in partitions.items():
+            connection = self._connection(day)
+            with connection:
+                before = connection.total_changes
+                connection.executemany(INSERT, rows)
+                written += connection.total_changes - before
+        with self._lock:
+            self.written += written
+            self.commits += 1
+
+    def _run(self):
+        while True:
+            batches = self._take_batches()
+            if not batches:
+                break
+            try:
+                self._commit(batches)
+                for batch in batches:
+                    batch.finish()
+                continue
+            except Exception as e:
+                print(f"[IngestStore] Commit of {sum(len(b.packets) for b in batches)} packets failed: {e}")
+            # Retry each request's batch alone, so only the failing ones see an error.
+            for batch in batches:
+                try:
+                    self._commit([batch])
+                    batch.finish()
+                except Exception as e:
+                    batch.finish(e)
+        for connection in self._connections.values():
+            connection.close()
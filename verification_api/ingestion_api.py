@@ -1,3 +1,4 @@
+import sys
 import os
 from flask import Flask, request, jsonify
 import json
@@ -7,29 +8,71 @@ import json
 PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.append(PROJECT_ROOT)
 
+from verification_api.ingest_store import IngestStore, InvalidPacket
+
+# Seconds a request waits for its packets to be committed before giving up.
+COMMIT_TIMEOUT = 10.0
+
 
 app = Flask(__name__)
+# Every validated packet is persisted here (see ingest_store.py).
+store = IngestStore()
+
+
+def store_packets(packets: list):
+    """Hands packets to the store and waits for their group commit; returns the HTTP response."""
+    try:
+        pending = store.submit(packets)
+    except InvalidPacket as e:
+        return jsonify({"status": "error", "message": f"Invalid packet: {e}"}), 400
+    if pending is None:
+        # Backpressure: the writer is behind. Agents retry with backoff (see fetch_services/outbox.py).
+        response = jsonify({"status": "busy", "message": "Ingestion queue is full, retry later."})
+        response.headers["Retry-After"] = "1"
+        return response, 503
+    try:
+        if not pending.wait(COMMIT_TIMEOUT):
+            return jsonify({"status": "error", "message": "Timed out waiting for the packets to be stored."}), 503
+    except Exception as e:
+        return jsonify({"status": "error", "message": f"Failed to store packets: {e}"}), 500
+    return jsonify({"status": "ACK ✅", "message": "Data ingested successfully.", "accepted": len(packets)})
 
 @app.route('/ingest', methods=['POST'])
 def ingest_packet():
     """
     This endpoint acts as the final destination for validated data from the agent network.
-    It receives an EnrichedData packet, logs it, and sends back an acknowledgment.
+    It receives an EnrichedData packet, stores it, and sends back an acknowledgment.
     """
-    data = request.json
-    print("\n✅ Received validated data packet from agent network:")
-    print(json.dumps(data, indent=2))
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({"status": "error", "message": "Expected a JSON packet."}), 400
+    return store_packets([data])
 
-    # In a real system, this is where you would save the data to a database
-    # or forward it into the next stage of your processing pipeline (e.g., a real Fluence service).
+@app.route('/ingest/bulk', methods=['POST'])
+def ingest_bulk():
+    """
+    Bulk variant of /ingest for agents that batch their deliveries.
+    Accepts a JSON array of EnrichedData packets, or newline-delimited JSON
+    with Content-Type application/x-ndjson, and acknowledges them together.
+    """
+    if request.mimetype == "application/x-ndjson":
+        try:
+            packets = [json.loads(line) for line in request.get_data().splitlines() if line.strip()]
+        except json.JSONDecodeError as e:
+            return jsonify({"status": "error", "message": f"Invalid NDJSON: {e}"}), 400
+    else:
+        packets = request.get_json(silent=True)
+    if not isinstance(packets, list) or not all(isinstance(packet, dict) for packet in packets):
+        return jsonify({"status": "error", "message": "Expected a list of packets."}), 400
+    return store_packets(packets)
 
-    return jsonify({"status": "ACK ✅", "message": "Data ingested successfully."})
+@app.route('/ingest/stats', methods=['GET'])
+def ingest_stats():
+    """Queue depth, rows written and day partitions of the store."""
+    return jsonify(store.stats())
 
 if __name__ == '__main__':
     # Running on port 5001 to avoid conflict with the main API orchestrator
     print("Starting Data Ingestion API server on http://127.0.0.1:5001")
-    app.run(host='0.0.0.0', port=5001, debug=True)
-
-
-    
-
+    # threaded: requests wait on the shared group commit concurrently.
+    app.run(host='0.0.0.0', port=5001, threaded=True)